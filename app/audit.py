@@ -0,0 +1,235 @@
+"""登录审计事件流：每次登录（成功或失败）一条记录，用于安全审计和容量规划
+
+事件包含时间、路由、提供商、用户 id、客户端 IP、结果和本次请求各阶段耗时（毫秒）。
+记录时只放进后台任务队列（app.jobs），由队列批量写入，不阻塞请求；队列满时直接丢弃
+（background_jobs_total{kind="login_audit",outcome="rejected"}）。
+
+存储由 AUDIT_BACKEND 决定，只追加不修改：
+    mongo  capped 集合 login_audit，写满 AUDIT_COLLECTION_MAX_BYTES 后自动覆盖最旧的记录
+    file   本地替身：NDJSON 文件，超过 AUDIT_FILE_MAX_BYTES 时轮转，保留 AUDIT_FILE_BACKUPS 个旧文件；
+           只适合单进程，多个 worker 同时轮转会互相覆盖
+导出接口 GET /admin/audit/export 用游标（或逐行读文件）流式输出，内存占用与记录数无关。
+"""
+import json
+import logging
+import os
+from itertools import islice
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Iterator
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pymongo import ASCENDING
+from pymongo.errors import CollectionInvalid
+from starlette.concurrency import run_in_threadpool
+
+from app.config import (
+    AUDIT_BACKEND,
+    AUDIT_COLLECTION_MAX_BYTES,
+    AUDIT_FILE_PATH,
+    AUDIT_FILE_MAX_BYTES,
+    AUDIT_FILE_BACKUPS,
+    BULK_BATCH_SIZE,
+    DATABASE_NAME,
+    MONGODB_URL,
+)
+from app.db import get_client
+from app.jobs import job_queue
+from app.metrics import current_spans
+from app.ratelimit import client_ip
+
+AUDIT_COLLECTION = "login_audit"
+
+
+class MongoAuditSink:
+    def _collection(self):
+        return get_client()[DATABASE_NAME][AUDIT_COLLECTION]
+
+    async def create_collection(self):
+        database = get_client()[DATABASE_NAME]
+        if MONGODB_URL and MONGODB_URL.startswith("mongomock://"):
+            # mongomock 不支持 capped 集合，本地压测时用普通集合
+            logging.debug("Using an uncapped login_audit collection with mongomock")
+        elif AUDIT_COLLECTION not in await database.list_collection_names():
+            try:
+                await database.create_collection(AUDIT_COLLECTION, capped=True, size=AUDIT_COLLECTION_MAX_BYTES)
+                logging.info("Created capped collection %s (%s bytes)", AUDIT_COLLECTION, AUDIT_COLLECTION_MAX_BYTES)
+            except CollectionInvalid:
+                # 其他 worker 已经创建
+                pass
+        await self._collection().create_index([("at", ASCENDING)], name="at")
+
+    async def write(self, events: list[dict[str, Any]]):
+        await self._collection().insert_many(events, ordered=False)
+
+    async def export(self, query: dict[str, Any]) -> AsyncIterator[dict[str, Any]]:
+        cursor = self._collection().find(query, {"_id": 0}, batch_size=BULK_BATCH_SIZE).sort("at", ASCENDING)
+        async for event in cursor:
+            yield event
+
+
+class FileAuditSink:
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    async def create_collection(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _append(self, data: bytes):
+        try:
+            if os.path.getsize(self.path) + len(data) > self.max_bytes:
+                self._rotate()
+        except FileNotFoundError:
+            pass
+        # 一批事件一次 write，O_APPEND 保证不会写到别人的内容中间
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+    async def write(self, events: list[dict[str, Any]]):
+        # 时间存成带时区的 ISO 8601 字符串，导出时解析回 datetime 再比较
+        data = "".join(json.dumps({**event, "at": event["at"].isoformat()}) + "\n" for event in events).encode()
+        await run_in_threadpool(self._append, data)
+
+    def _lines(self) -> Iterator[str]:
+        # 从最旧的轮转文件读到当前文件
+        paths = [f"{self.path}.{index}" for index in range(self.backups, 0, -1)] + [self.path]
+        for path in paths:
+            try:
+                with open(path) as f:
+                    yield from f
+            except FileNotFoundError:
+                continue
+
+    async def export(self, query: dict[str, Any]) -> AsyncIterator[dict[str, Any]]:
+        lines = self._lines()
+        while True:
+            # 每次在线程池里读一批行，不阻塞事件循环
+            batch = await run_in_threadpool(lambda: list(islice(lines, BULK_BATCH_SIZE)))
+            if not batch:
+                return
+            for line in batch:
+                event = json.loads(line)
+                event["at"] = datetime.fromisoformat(event["at"])
+                if _matches(event, query):
+                    yield event
+
+
+def _matches(event: dict[str, Any], query: dict[str, Any]) -> bool:
+    for field, condition in query.items():
+        value = event.get(field)
+        if isinstance(condition, dict):
+            if "$gte" in condition and (value is None or value < condition["$gte"]):
+                return False
+            if "$lt" in condition and (value is None or value >= condition["$lt"]):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def parse_time(value: str, name: str) -> datetime:
+    """解析导出接口的 since/until：不带时区的时间按 UTC 处理，统一换算成 UTC 的 aware datetime"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO 8601 datetime")
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def format_time(value: datetime) -> str:
+    # pymongo 读回的是不带时区的 UTC 时间
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+
+
+def build_audit_sink():
+    sinks = {
+        "mongo": MongoAuditSink,
+        "file": lambda: FileAuditSink(AUDIT_FILE_PATH, AUDIT_FILE_MAX_BYTES, AUDIT_FILE_BACKUPS),
+    }
+    logging.info("Login audit backend: %s", AUDIT_BACKEND)
+    return sinks[AUDIT_BACKEND]()
+
+
+audit_sink = build_audit_sink()
+
+
+async def write_login_events(events: list[dict[str, Any]]):
+    await audit_sink.write(events)
+    logging.debug("Wrote %s login audit events", len(events))
+
+
+job_queue.register("login_audit", write_login_events)
+
+
+def record_login(
+    request: Request,
+    outcome: str,
+    provider: str | None = None,
+    user_id: Any = None,
+) -> bool:
+    """在请求结束前调用，阶段耗时取自本请求已记录的 span；返回事件是否进入队列"""
+    return job_queue.submit("login_audit", {
+        "at": datetime.now(timezone.utc),
+        "route": request.url.path,
+        "provider": provider,
+        "user_id": str(user_id) if user_id is not None else None,
+        "ip": client_ip(request) if request.client else None,
+        "outcome": outcome,
+        "stages_ms": current_spans(),
+    })
+
+
+async def audit_password_login(request: Request):
+    """挂在 /auth/jwt 路由上：成功登录由 UserManager.on_after_login 记录（需要用户 id），失败在这里记录"""
+    try:
+        yield
+    except HTTPException as e:
+        if request.url.path.endswith("/login"):
+            # fastapi-users 的 detail 是 ErrorCode 枚举，例如 LOGIN_BAD_CREDENTIALS
+            record_login(request, str(getattr(e.detail, "value", e.detail)).lower())
+        raise
+
+
+def get_audit_router() -> APIRouter:
+    # app.auth 导入了本模块（记录密码登录），这里延迟导入避免循环依赖
+    from app.auth import fastapi_users
+
+    router = APIRouter(dependencies=[Depends(fastapi_users.current_user(active=True, superuser=True))])
+
+    @router.get("/export")
+    async def export_audit_events(
+        since: str | None = None,
+        until: str | None = None,
+        provider: str | None = None,
+        user_id: str | None = None,
+        outcome: str | None = None,
+    ):
+        query: dict[str, Any] = {}
+        if since or until:
+            query["at"] = {}
+            if since:
+                query["at"]["$gte"] = parse_time(since, "since")
+            if until:
+                query["at"]["$lt"] = parse_time(until, "until")
+        for field, value in (("provider", provider), ("user_id", user_id), ("outcome", outcome)):
+            if value is not None:
+                query[field] = value
+
+        async def lines():
+            async for event in audit_sink.export(query):
+                yield json.dumps({**event, "at": format_time(event["at"])}, default=str) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return router
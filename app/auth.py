@@ -1,48 +1,70 @@
-from fastapi import Depends, HTTPException
-from httpx_oauth.clients.google import GoogleOAuth2
-from app.models import User, UserCreate, UserUpdate, UserRead
-from app.config import GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, SECRET_KEY
-from app.db import get_user_db
+from fastapi import APIRouter, Body, Cookie, Depends, HTTPException, Response
+from fastapi.responses import JSONResponse
+from app.models import OAuthAccount, TokenUser, User, UserCreate, UserRead
+from app.config import (
+    SECRET_KEY,
+    JWT_LIFETIME_SECONDS,
+    JWT_CLAIMS_ONLY,
+    REFRESH_TOKEN_LIFETIME_SECONDS,
+    COOKIE_SECURE,
+    OAUTH_LOGIN_DEADLINE_SECONDS,
+    OAUTH_LAST_LOGIN_RESOLUTION_SECONDS,
+)
+from app.db import get_user_db, get_users_collection
 from fastapi_users import FastAPIUsers
 from fastapi_users.authentication import AuthenticationBackend, BearerTransport, JWTStrategy
-from fastapi_users.manager import BaseUserManager, UserManagerDependency
+from fastapi_users.manager import BaseUserManager
 from fastapi_users.db import BeanieUserDatabase
+from fastapi_users.password import PasswordHelper
+from fastapi_users.router.common import ErrorCode
 from beanie import PydanticObjectId
-from httpx import AsyncClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 import logging
-import secrets
+from datetime import datetime, timedelta, timezone
 from typing import Any  # 添加这行
-from app.oauth_clients import linkedin_oauth_client, facebook_oauth_client
-
-class CustomGoogleOAuth2(GoogleOAuth2):
-    async def get_id_email(self, token: str):
-        async with AsyncClient() as client:
-            response = await client.get(
-                "https://www.googleapis.com/oauth2/v2/userinfo",
-                headers={"Authorization": f"Bearer {token}"},
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            logging.debug(f"Raw Google user info: {data}")
-            
-            return {
-                "id": data.get("id"),
-                "email": data.get("email"),
-                "given_name": data.get("given_name"),
-                "family_name": data.get("family_name"),
-                "picture": data.get("picture")
-            }
-
-# OAuth client configuration
-google_oauth_client = CustomGoogleOAuth2(GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET,
-                                   scopes=["openid", "email", "profile"])
+from app.cache import user_cache, cache_user, invalidate_user
+from app.providers import OAuthProvider, get_provider
+from app.resilience import ProviderError, login_deadline
+from app.hashing import hash_password, verify_and_update_password
+from app.jwt_strategy import CachedJWTStrategy
+from app.metrics import track_stage
+from app.singleflight import SingleFlight
+from app.jobs import job_queue
+from app.audit import record_login
+from fastapi_users import exceptions
+from app.refresh_tokens import RefreshTokenError, issue_refresh_token, rotate_refresh_token, revoke_refresh_token
+
+class RefreshBearerTransport(BearerTransport):
+    """登录响应中同时返回 refresh token"""
+
+    async def get_login_response(self, token: str):
+        claims = jwt_strategy.decode(token)
+        refresh_token = await issue_refresh_token(claims["sub"])
+        return JSONResponse({"access_token": token, "token_type": "bearer", "refresh_token": refresh_token})
+
 
 # JWT strategy
-bearer_transport = BearerTransport(tokenUrl="auth/jwt/login")
+bearer_transport = RefreshBearerTransport(tokenUrl="auth/jwt/login")
+
+# 进程级单例，token 解析缓存随之共享
+jwt_strategy = CachedJWTStrategy(secret=SECRET_KEY, lifetime_seconds=JWT_LIFETIME_SECONDS, profile_claims=JWT_CLAIMS_ONLY)
 
 def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=SECRET_KEY, lifetime_seconds=3600)
+    return jwt_strategy
+
+# OAuth-only 用户没有密码，这个值不是任何合法的哈希格式，无法用于密码登录
+OAUTH_UNUSABLE_PASSWORD = "!oauth"
+
+
+class OAuthAwarePasswordHelper(PasswordHelper):
+    def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        if hashed_password == OAUTH_UNUSABLE_PASSWORD:
+            return False, None
+        return super().verify_and_update(plain_password, hashed_password)
+
+
+password_helper = OAuthAwarePasswordHelper()
 
 auth_backend = AuthenticationBackend(
     name="jwt",
@@ -50,70 +72,269 @@ auth_backend = AuthenticationBackend(
     get_strategy=get_jwt_strategy,
 )
 
+# 进行中的相同查询合并为一次，跨请求共享（UserManager 每个请求新建一个）
+user_loads = SingleFlight("user_load")
+user_upserts = SingleFlight("oauth_user_upsert")
+
+async def write_profile_syncs(syncs: list[tuple[PydanticObjectId, dict[str, Any]]]):
+    """后台批量写入资料变更；同一用户的多次变更合并为一次更新，后提交的值覆盖先提交的"""
+    merged: dict[PydanticObjectId, dict[str, Any]] = {}
+    for user_id, changes in syncs:
+        merged.setdefault(user_id, {}).update(changes)
+    await get_users_collection().bulk_write(
+        [UpdateOne({"_id": user_id}, {"$set": changes}) for user_id, changes in merged.items()],
+        ordered=False,
+    )
+    logging.debug("Synced OAuth profiles for %s users", len(merged))
+
+
+job_queue.register("profile_sync", write_profile_syncs)
+
+
+def identity_match(oauth_name: str, account_id: str) -> dict[str, Any]:
+    """oauth_accounts 的查询条件：$elemMatch 保证两个条件落在同一个关联账号上，走 oauth_identity 索引"""
+    return {"$elemMatch": {"provider": oauth_name, "account_id": account_id}}
+
+
+async def write_last_logins(logins: list[tuple[PydanticObjectId, str, str, datetime]]):
+    """后台批量更新关联账号的 last_login；同一账号只保留最新的时间，$max 保证不会被旧值覆盖"""
+    latest: dict[tuple[PydanticObjectId, str, str], datetime] = {}
+    for user_id, oauth_name, account_id, at in logins:
+        key = (user_id, oauth_name, account_id)
+        latest[key] = max(at, latest.get(key, at))
+    await get_users_collection().bulk_write(
+        [
+            UpdateOne(
+                {"_id": user_id, "oauth_accounts": identity_match(oauth_name, account_id)},
+                {"$max": {"oauth_accounts.$.last_login": at}},
+            )
+            for (user_id, oauth_name, account_id), at in latest.items()
+        ],
+        ordered=False,
+    )
+    logging.debug("Updated last login for %s OAuth accounts", len(latest))
+
+
+job_queue.register("oauth_last_login", write_last_logins)
+
+
+def _last_login_is_stale(account: OAuthAccount, now: datetime) -> bool:
+    if account.last_login is None:
+        return True
+    # MongoDB 读出的时间不带时区，按 UTC 处理
+    last_login = account.last_login if account.last_login.tzinfo else account.last_login.replace(tzinfo=timezone.utc)
+    return now - last_login >= timedelta(seconds=OAUTH_LAST_LOGIN_RESOLUTION_SECONDS)
+
+
 class UserManager(BaseUserManager[User, PydanticObjectId]):
     reset_password_token_secret = SECRET_KEY
     verification_token_secret = SECRET_KEY
 
-    async def create(self, user_create: UserCreate):
-        logging.debug(f"Attempting to create user: {user_create}")
+    async def get(self, id: PydanticObjectId) -> User:
+        user = user_cache.get(id)
+        if user is not None:
+            return user
+        # 缓存未命中时，同一用户的并发请求只查询一次数据库
+        load = super().get
+        user = await user_loads.do(id, lambda: load(id))
+        cache_user(user)
+        return user
+
+    async def _update(self, user: User, update_dict: dict[str, Any]) -> User:
+        invalidate_user(user.id)
+        password = update_dict.get("password")
+        if password is not None:
+            await self.validate_password(password, user)
+            update_dict = {k: v for k, v in update_dict.items() if k != "password"}
+            update_dict["hashed_password"] = await hash_password(self.password_helper, password)
+        user = await super()._update(user, update_dict)
+        cache_user(user)
+        return user
+
+    async def on_after_login(self, user: User, request=None, response=None) -> None:
+        # 密码登录和 fastapi-users 自带的 OAuth 路由登录成功后调用
+        if request is not None:
+            record_login(request, "success", user_id=user.id)
+
+    async def delete(self, user: User, request=None) -> None:
+        invalidate_user(user.id)
+        await super().delete(user, request)
+
+    async def authenticate(self, credentials) -> User | None:
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # 仍然计算一次哈希以避免时序攻击
+            await hash_password(self.password_helper, credentials.password)
+            return None
+
+        verified, updated_password_hash = await verify_and_update_password(
+            self.password_helper, credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
+        return user
+
+    async def create(self, user_create: UserCreate, safe: bool = False, request=None):
+        with track_stage("user_create"):
+            return await self._create(user_create)
+
+    async def _create(self, user_create: UserCreate):
+        logging.debug("Attempting to create user: %s", user_create.email)
         try:
             user_dict = user_create.dict()
             if "password" in user_dict:
-                hashed_password = self.password_helper.hash(user_dict["password"])
+                hashed_password = await hash_password(self.password_helper, user_dict["password"])
                 user_dict["hashed_password"] = hashed_password
                 del user_dict["password"]
             user = await self.user_db.create(user_dict)
-            logging.debug(f"User created: {user.dict()}")
+            cache_user(user)
+            logging.debug("User created: %s", user.id)
             return user
+        except HTTPException:
+            raise
         except Exception as e:
-            logging.error(f"Error creating user: {str(e)}", exc_info=True)
+            logging.error("Error creating user: %s", e, exc_info=True)
             raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}")
 
-    async def oauth_callback(self, oauth_name: str, access_token: str, account_id: str, account_email: str, expires_at: int | None = None) -> User:
-        logging.debug(f"OAuth callback for {oauth_name}: email={account_email}, id={account_id}")
-        try:
-            user = await self.get_by_email(account_email)
-            if user is None:
-                # 为 OAuth 用户创建一个随机密码
-                random_password = secrets.token_urlsafe(32)
-                user_data = {
-                    "email": account_email,
-                    "password": random_password,
-                    "oauth_provider": oauth_name
-                }
-
-                # 获取额外的用户信息
-                if oauth_name == "google":
-                    user_info = await google_oauth_client.get_id_email(access_token)
-                    user_data.update({
-                        "first_name": user_info.get("given_name"),
-                        "last_name": user_info.get("family_name"),
-                        "picture": user_info.get("picture")
-                    })
-                elif oauth_name == "linkedin":
-                    user_info = await linkedin_oauth_client.get_id_email(access_token)
-                    user_data.update({
-                        "first_name": user_info.get("given_name"),
-                        "last_name": user_info.get("family_name"),
-                        "picture": user_info.get("picture")
-                    })
-                elif oauth_name == "facebook":
-                    user_info = await facebook_oauth_client.get_id_email(access_token)
-                    user_data.update({
-                        "first_name": user_info.get("first_name"),
-                        "last_name": user_info.get("last_name"),
-                        "picture": user_info.get("picture", {}).get("data", {}).get("url")
-                    })
-
-                user = await self.create(UserCreate(**user_data))
-            else:
-                # 更新现有用户的 OAuth 提供商
-                user.oauth_provider = oauth_name
-                await user.save()
+    async def upsert_oauth_user(self, oauth_name: str, profile: dict[str, Any]) -> User:
+        """按提供商身份（provider + account_id）查找 OAuth 用户，找不到时按 email 查找并关联，再找不到则创建
+
+        同一账号的并发登录（双击、客户端重试）合并为一次，也避免了并发 upsert
+        在唯一索引上的重复键冲突。
+        """
+        account_id = profile.get("account_id")
+        email = profile.get("email")
+        if not account_id and not email:
+            raise ValueError("Neither account id nor email found in user data")
+        key = (oauth_name, str(account_id)) if account_id else (oauth_name, email)
+        return await user_upserts.do(key, lambda: self._upsert_oauth_user(oauth_name, profile))
 
+    async def _upsert_oauth_user(self, oauth_name: str, profile: dict[str, Any]) -> User:
+        account_id = str(profile["account_id"]) if profile.get("account_id") else None
+        email = profile.get("email")
+        fields = {
+            "first_name": profile.get("first_name"),
+            "last_name": profile.get("last_name"),
+            "picture": profile.get("picture"),
+        }
+        collection = get_users_collection()
+        now = datetime.now(timezone.utc)
+
+        # 老用户（绝大多数登录）按提供商身份只读一次，不依赖 email（Facebook 可能不返回）
+        document = await collection.find_one({"oauth_accounts": identity_match(oauth_name, account_id)}) if account_id else None
+        if document is not None:
+            user = User.model_validate(document)
+            changes = {f: v for f, v in fields.items() if getattr(user, f) != v}
+            await self._sync_profile(user, changes)
+            account = next(a for a in user.oauth_accounts if a.provider == oauth_name and a.account_id == account_id)
+            if _last_login_is_stale(account, now):
+                # last_login 只是近似值，队列满时跳过，下次登录再记
+                job_queue.submit("oauth_last_login", (user.id, oauth_name, account_id, now))
+            user = user.model_copy(update=changes)
+            cache_user(user)
             return user
+
+        if not email:
+            raise ValueError("Email not found in user data")
+        account = OAuthAccount(provider=oauth_name, account_id=account_id, last_login=now) if account_id else None
+        document = await collection.find_one({"email": email})
+        if document is not None:
+            user = User.model_validate(document)
+            changes = {f: v for f, v in fields.items() if getattr(user, f) != v}
+            if user.oauth_provider is None:
+                changes["oauth_provider"] = oauth_name
+            if account is None:
+                await self._sync_profile(user, changes)
+                user = user.model_copy(update=changes)
+            else:
+                # 已有用户第一次用这个提供商账号登录：同步关联，之后的登录按身份查找；
+                # 其他进程已经关联过时条件不匹配，不会重复追加
+                update: dict[str, Any] = {"$push": {"oauth_accounts": account.model_dump()}}
+                if changes:
+                    update["$set"] = changes
+                try:
+                    await collection.update_one(
+                        {"_id": user.id, "oauth_accounts": {"$not": identity_match(oauth_name, account_id)}}, update,
+                    )
+                except DuplicateKeyError:
+                    raise ValueError(f"{oauth_name} account {account_id} is linked to another user")
+                user = user.model_copy(update={**changes, "oauth_accounts": [*user.oauth_accounts, account]})
+                logging.info("Linked %s account to existing user %s", oauth_name, user.id)
+            cache_user(user)
+            return user
+
+        # 新用户需要同步插入才能拿到 id 签发 JWT；
+        # 新用户不再对随机密码做哈希，直接写入不可用的密码标记
+        document = await collection.find_one_and_update(
+            {"email": email},
+            {
+                "$set": fields,
+                "$setOnInsert": {
+                    "hashed_password": OAUTH_UNUSABLE_PASSWORD,
+                    "is_active": True,
+                    "is_superuser": False,
+                    "is_verified": False,
+                    "oauth_provider": oauth_name,
+                    "oauth_accounts": [account.model_dump()] if account else [],
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        user = User.model_validate(document)
+        logging.info("OAuth user upserted: %s", user.id)
+        cache_user(user)
+        return user
+
+    async def _sync_profile(self, user: User, changes: dict[str, Any]):
+        """资料有变化时只把变化的字段交给后台队列写入；队列满或未启动时同步写入，不丢资料"""
+        if changes and not job_queue.submit("profile_sync", (user.id, changes)):
+            await get_users_collection().update_one({"_id": user.id}, {"$set": changes})
+
+    async def oauth_associate_callback(
+        self,
+        user: User,
+        oauth_name: str,
+        access_token: str,
+        account_id: str,
+        account_email: str,
+        expires_at: int | None = None,
+        refresh_token: str | None = None,
+        request=None,
+    ) -> User:
+        """已登录用户关联另一个提供商账号；只保存提供商身份，不保存提供商的 token"""
+        account = OAuthAccount(provider=oauth_name, account_id=str(account_id), last_login=datetime.now(timezone.utc))
+        try:
+            result = await get_users_collection().update_one(
+                {"_id": user.id, "oauth_accounts": {"$not": identity_match(oauth_name, account.account_id)}},
+                {"$push": {"oauth_accounts": account.model_dump()}},
+            )
+        except DuplicateKeyError:
+            # oauth_identity 唯一索引：这个提供商账号已经关联到其他用户
+            raise HTTPException(status_code=400, detail=ErrorCode.OAUTH_USER_ALREADY_EXISTS)
+        if result.modified_count:
+            user = user.model_copy(update={"oauth_accounts": [*user.oauth_accounts, account]})
+            cache_user(user)
+            logging.info("Linked %s account to user %s", oauth_name, user.id)
+        return user
+
+    async def oauth_callback(self, oauth_name: str, access_token: str, account_id: str, account_email: str, expires_at: int | None = None, *args, **kwargs) -> User:
+        logging.debug("OAuth callback for %s: id=%s", oauth_name, account_id)
+        try:
+            with track_stage("oauth_callback", oauth_name):
+                with login_deadline(OAUTH_LOGIN_DEADLINE_SECONDS):
+                    profile = await get_provider(oauth_name).get_profile({"access_token": access_token})
+                profile["account_id"] = profile.get("account_id") or account_id
+                profile["email"] = profile.get("email") or account_email
+                return await self.upsert_oauth_user(oauth_name, profile)
+        except ProviderError as e:
+            logging.warning("OAuth provider %s failed in oauth_callback: %s", oauth_name, e)
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
         except Exception as e:
-            logging.error(f"Error in oauth_callback: {str(e)}", exc_info=True)
+            logging.error("Error in oauth_callback: %s", e, exc_info=True)
             raise HTTPException(status_code=500, detail=f"Failed to process OAuth callback: {str(e)}")
 
     def parse_id(self, value: Any) -> PydanticObjectId:
@@ -125,51 +346,191 @@ class UserManager(BaseUserManager[User, PydanticObjectId]):
             raise ValueError(f"Cannot cast {value} to PydanticObjectId")
 
 async def get_user_manager(user_db: BeanieUserDatabase = Depends(get_user_db)):
-    yield UserManager(user_db)
+    yield UserManager(user_db, password_helper)
 
 fastapi_users = FastAPIUsers[User, PydanticObjectId](get_user_manager, [auth_backend])
 
+
+async def complete_oauth_login(provider: OAuthProvider, code: str, user_manager: UserManager) -> tuple[str, str, PydanticObjectId]:
+    """统一的 OAuth 回调流程：换取 token、获取资料、写入用户、签发 JWT 和 refresh token，同时返回用户 id
+
+    对提供商的两次调用共享 OAUTH_LOGIN_DEADLINE_SECONDS，超时或熔断时抛出 ProviderError。
+    """
+    with login_deadline(OAUTH_LOGIN_DEADLINE_SECONDS):
+        with track_stage("token_exchange", provider.name):
+            token = await provider.get_access_token(code)
+        logging.debug("Received %s token", provider.name)
+
+        with track_stage("profile_fetch", provider.name):
+            profile = await provider.get_profile(token)
+    logging.info("Received %s user data for account %s", provider.name, profile.get("account_id"))
+
+    with track_stage("user_upsert", provider.name):
+        user = await user_manager.upsert_oauth_user(provider.name, profile)
+    with track_stage("jwt_sign", provider.name):
+        # 这个 token 会放进 /auth-success 的查询串，不带用户资料
+        access_token = await jwt_strategy.write_token(user, profile_claims=False)
+        refresh_token = await issue_refresh_token(user.id)
+    # 头像预取不影响本次响应，交给后台队列；队列满时直接放弃
+    if user.picture:
+        job_queue.submit("avatar_prefetch", (str(user.id), user.picture))
+    return access_token, refresh_token, user.id
+
+
+REFRESH_COOKIE_NAME = "refresh_token"
+REFRESH_COOKIE_PATH = "/auth/jwt"
+
+
+def set_refresh_cookie(response: Response, refresh_token: str):
+    """浏览器登录（OAuth 回调）的 refresh token：HttpOnly，只发往 /auth/jwt 下的 refresh/revoke"""
+    response.set_cookie(
+        REFRESH_COOKIE_NAME,
+        refresh_token,
+        max_age=REFRESH_TOKEN_LIFETIME_SECONDS,
+        path=REFRESH_COOKIE_PATH,
+        secure=COOKIE_SECURE,
+        httponly=True,
+        samesite="strict",
+    )
+
+
+def get_refresh_router():
+    """用 refresh token 换取新的 access token，不再走完整的 OAuth 流程
+
+    refresh token 可以放在请求体里（密码登录的 JSON 响应拿到的），也可以来自 OAuth 登录设置的
+    cookie；用 cookie 时轮换后的新 token 同样写回 cookie，不出现在响应体中。
+    """
+    router = APIRouter()
+
+    @router.post("/refresh")
+    async def refresh(
+        response: Response,
+        refresh_token: str | None = Body(None, embed=True),
+        refresh_cookie: str | None = Cookie(None, alias=REFRESH_COOKIE_NAME),
+        user_manager: UserManager = Depends(get_user_manager),
+    ):
+        token = refresh_token or refresh_cookie
+        if not token:
+            raise HTTPException(status_code=401, detail="Invalid refresh token")
+        try:
+            user_id, new_refresh_token = await rotate_refresh_token(token)
+            user = await user_manager.get(user_manager.parse_id(user_id))
+        except (RefreshTokenError, exceptions.UserNotExists, ValueError):
+            raise HTTPException(status_code=401, detail="Invalid refresh token")
+        if not user.is_active:
+            raise HTTPException(status_code=401, detail="Invalid refresh token")
+        access_token = await jwt_strategy.write_token(user)
+        if refresh_token is None:
+            set_refresh_cookie(response, new_refresh_token)
+            return {"access_token": access_token, "token_type": "bearer"}
+        return {"access_token": access_token, "token_type": "bearer", "refresh_token": new_refresh_token}
+
+    @router.post("/revoke", status_code=204)
+    async def revoke(
+        response: Response,
+        refresh_token: str | None = Body(None, embed=True),
+        refresh_cookie: str | None = Cookie(None, alias=REFRESH_COOKIE_NAME),
+    ):
+        token = refresh_token or refresh_cookie
+        if token:
+            await revoke_refresh_token(token)
+        response.delete_cookie(REFRESH_COOKIE_NAME, path=REFRESH_COOKIE_PATH, secure=COOKIE_SECURE, httponly=True, samesite="strict")
+
+    return router
+
 current_active_user = fastapi_users.current_user(active=True)
 
+
+async def current_active_token_user(
+    token: str | None = Depends(bearer_transport.scheme),
+    user_manager: UserManager = Depends(get_user_manager),
+) -> TokenUser | User:
+    """claims-only 认证：token 带用户资料时直接用 claims 构造用户，不查询数据库
+
+    OAuth 回调签发的 token 不带资料，这时按 sub 经 user_cache 加载用户。
+    """
+    claims = jwt_strategy.decode(token) if token else None
+    if claims is None:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if claims.get("email") is None:
+        user = await jwt_strategy.read_token(token, user_manager)
+        if user is None or not user.is_active:
+            raise HTTPException(status_code=401, detail="Unauthorized")
+        return user
+    if not claims.get("is_active", True):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    try:
+        return TokenUser(id=claims["sub"], **{k: claims.get(k) for k in TokenUser.model_fields if k != "id"})
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+
+# 只读接口使用的依赖，JWT_CLAIMS_ONLY 开启时跳过数据库加载
+read_only_user = current_active_token_user if JWT_CLAIMS_ONLY else current_active_user
+
 # OAuth routes
 def get_oauth_router():
     return fastapi_users.get_oauth_router(
-        oauth_client=google_oauth_client,
+        oauth_client=get_provider("google").client,
         backend=auth_backend,
         state_secret=SECRET_KEY,
     )
 
 def get_linkedin_oauth_router():
     return fastapi_users.get_oauth_router(
-        oauth_client=linkedin_oauth_client,
+        oauth_client=get_provider("linkedin").client,
         backend=auth_backend,
         state_secret=SECRET_KEY,
     )
 
-def get_oauth_associate_router():
+class AssociateOAuthClient:
+    """给 fastapi-users 关联路由用的客户端适配器
+
+    路由构建时只读取 name，不会创建 httpx_oauth 客户端（第一次请求时才创建）。换 token 和
+    获取资料都经过 OAuthProvider，与登录回调共用容错层和统一的资料格式；get_id_email 按
+    fastapi-users 的约定返回 (account_id, email)。
+    """
+
+    def __init__(self, provider: OAuthProvider):
+        self.provider = provider
+        self.name = provider.name
+
+    async def get_authorization_url(self, redirect_uri: str, state: str | None = None, scope: list[str] | None = None):
+        return await self.provider.client.get_authorization_url(redirect_uri, state, scope)
+
+    async def get_access_token(self, code: str, redirect_uri: str, code_verifier: str | None = None):
+        try:
+            with login_deadline(OAUTH_LOGIN_DEADLINE_SECONDS):
+                return await self.provider.get_access_token(code, redirect_uri, code_verifier)
+        except ProviderError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+    async def get_id_email(self, token: str) -> tuple[str, str | None]:
+        try:
+            with login_deadline(OAUTH_LOGIN_DEADLINE_SECONDS):
+                profile = await self.provider.get_profile({"access_token": token})
+        except ProviderError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+        return str(profile["account_id"]), profile.get("email")
+
+
+def get_oauth_associate_router(provider_name: str = "google"):
+    """已登录用户把提供商账号关联到自己：GET /authorize 返回授权地址，/callback 写入 oauth_accounts"""
     return fastapi_users.get_oauth_associate_router(
-        oauth_client=google_oauth_client,
+        oauth_client=AssociateOAuthClient(get_provider(provider_name)),
         user_schema=UserRead,
         state_secret=SECRET_KEY,
     )
 
 def get_linkedin_oauth_associate_router():
-    return fastapi_users.get_oauth_associate_router(
-        oauth_client=linkedin_oauth_client,
-        user_schema=UserRead,
-        state_secret=SECRET_KEY,
-    )
+    return get_oauth_associate_router("linkedin")
 
 def get_facebook_oauth_router():
     return fastapi_users.get_oauth_router(
-        oauth_client=facebook_oauth_client,
+        oauth_client=get_provider("facebook").client,
         backend=auth_backend,
         state_secret=SECRET_KEY,
     )
 
 def get_facebook_oauth_associate_router():
-    return fastapi_users.get_oauth_associate_router(
-        oauth_client=facebook_oauth_client,
-        user_schema=UserRead,
-        state_secret=SECRET_KEY,
-    )
\ No newline at end of file
+    return get_oauth_associate_router("facebook")
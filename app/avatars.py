@@ -0,0 +1,229 @@
+"""头像代理：第一次请求时从提供商下载，之后从本地内容寻址缓存返回
+
+磁盘布局（AVATAR_CACHE_DIR 下，多个 worker 共享）：
+    blobs/<sha256 前两位>/<sha256>   图片内容，按内容哈希命名，相同图片只存一份
+    users/<user_id>.json           用户当前头像 URL 对应的 blob 哈希和 Content-Type
+
+blob 的 mtime 作为最近访问时间，缓存总大小超过 AVATAR_CACHE_MAX_BYTES 时从最久未访问
+的开始删除。Facebook 的头像 URL 会过期，下载失败时仍然返回该用户上一次缓存的图片。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+from fastapi_users import exceptions
+from starlette.concurrency import run_in_threadpool
+
+from app.auth import UserManager, get_user_manager
+from app.config import (
+    AVATAR_CACHE_DIR,
+    AVATAR_CACHE_MAX_BYTES,
+    AVATAR_MAX_IMAGE_BYTES,
+    AVATAR_MAX_REDIRECTS,
+    AVATAR_BROWSER_MAX_AGE_SECONDS,
+    OAUTH_MOCK_BASE_URL,
+)
+from app.http_client import get_http_client
+from app.jobs import job_queue
+from app.metrics import track_stage
+from app.singleflight import SingleFlight
+
+# 淘汰时一次删到上限的 90%，避免每次写入都触发目录扫描
+EVICT_TARGET_RATIO = 0.9
+
+
+class AvatarError(Exception):
+    pass
+
+
+class AvatarCache:
+    def __init__(self, directory: str, max_bytes: int, max_image_bytes: int, max_redirects: int = AVATAR_MAX_REDIRECTS):
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.index_dir = os.path.join(directory, "users")
+        self.max_bytes = max_bytes
+        self.max_image_bytes = max_image_bytes
+        self.max_redirects = max_redirects
+        # 本进程估算的缓存大小；其他 worker 的写入在下一次扫描目录时才会计入
+        self._size: int | None = None
+        self._downloads = SingleFlight("avatar_fetch")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _index_path(self, user_id: str) -> str:
+        return os.path.join(self.index_dir, f"{user_id}.json")
+
+    # 以下同步方法都在线程池里执行，不阻塞事件循环
+
+    def _lookup(self, user_id: str, url: str | None) -> tuple[str, os.stat_result, dict[str, Any]] | None:
+        """url 为 None 时不校验 URL，用于上游失败时返回旧图片"""
+        try:
+            with open(self._index_path(user_id)) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if url is not None and entry.get("url") != url:
+            return None
+        path = self._blob_path(entry["digest"])
+        try:
+            # 更新 mtime 作为 LRU 的访问时间
+            os.utime(path)
+            return path, os.stat(path), entry
+        except FileNotFoundError:
+            return None
+
+    def _store(self, user_id: str, url: str, content: bytes, content_type: str) -> tuple[str, os.stat_result, dict[str, Any]]:
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            self._write_atomic(path, content)
+            if self._size is not None:
+                self._size += len(content)
+        entry = {"url": url, "digest": digest, "content_type": content_type}
+        self._write_atomic(self._index_path(user_id), json.dumps(entry).encode())
+        if self._size is None or self._size > self.max_bytes:
+            self._evict(keep=path)
+        return path, os.stat(path), entry
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # 每次写入独立的临时文件：同一进程内并发写同一路径的协程/线程也不会互相覆盖
+        f = tempfile.NamedTemporaryFile(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp", delete=False)
+        try:
+            with f:
+                f.write(data)
+            os.replace(f.name, path)
+        except OSError:
+            os.unlink(f.name)
+            raise
+
+    def _evict(self, keep: str):
+        blobs = []
+        for prefix in os.scandir(self.blob_dir):
+            if not prefix.is_dir():
+                continue
+            for blob in os.scandir(prefix.path):
+                if blob.name.endswith(".tmp"):
+                    continue
+                stat = blob.stat()
+                blobs.append((stat.st_mtime, stat.st_size, blob.path))
+        self._size = sum(size for _, size, _ in blobs)
+        if self._size <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        evicted = 0
+        for _, size, path in sorted(blobs):
+            if self._size <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+            evicted += 1
+        logging.info("Evicted %s avatars, cache size is now %s bytes", evicted, self._size)
+
+    def _check_url(self, url: str):
+        if url.startswith("https://"):
+            return
+        if OAUTH_MOCK_BASE_URL and url.startswith(f"{OAUTH_MOCK_BASE_URL}/"):
+            return
+        raise AvatarError(f"Refusing to fetch avatar from non-https URL: {url}")
+
+    async def _download(self, url: str) -> tuple[bytes, str]:
+        # 不让 httpx 自动跟随重定向：每一跳都要重新过 _check_url，否则 https 地址可以跳到内网 http 地址
+        with track_stage("avatar_fetch"):
+            for _ in range(self.max_redirects + 1):
+                self._check_url(url)
+                async with get_http_client().stream("GET", url, follow_redirects=False) as response:
+                    if response.is_redirect:
+                        url = str(response.url.join(response.headers["location"]))
+                        continue
+                    return await self._read_image(response)
+        raise AvatarError(f"Avatar fetch exceeded {self.max_redirects} redirects")
+
+    async def _read_image(self, response) -> tuple[bytes, str]:
+        if response.status_code != 200:
+            raise AvatarError(f"Avatar fetch returned {response.status_code}")
+        content_type = response.headers.get("content-type", "").split(";")[0].strip()
+        if not content_type.startswith("image/"):
+            raise AvatarError(f"Avatar has unexpected content type {content_type!r}")
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if size > self.max_image_bytes:
+                raise AvatarError(f"Avatar exceeds {self.max_image_bytes} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks), content_type
+
+    async def fetch(self, url: str) -> tuple[bytes, str]:
+        """同一个 URL 的并发首次请求共用一次上游下载"""
+        return await self._downloads.do(url, lambda: self._download(url))
+
+    async def get(self, user_id: str, url: str) -> tuple[str, os.stat_result, dict[str, Any]]:
+        cached = await run_in_threadpool(self._lookup, user_id, url)
+        if cached is not None:
+            return cached
+        try:
+            content, content_type = await self.fetch(url)
+        except Exception as e:
+            stale = await run_in_threadpool(self._lookup, user_id, None)
+            if stale is None:
+                raise AvatarError(str(e)) from e
+            logging.warning("Avatar fetch failed for user %s, serving cached copy: %s", user_id, e)
+            return stale
+        return await run_in_threadpool(self._store, user_id, url, content, content_type)
+
+
+avatar_cache = AvatarCache(AVATAR_CACHE_DIR, AVATAR_CACHE_MAX_BYTES, AVATAR_MAX_IMAGE_BYTES)
+
+
+async def prefetch_avatars(jobs: list[tuple[str, str]]):
+    """登录后在后台把头像拉进缓存，第一次访问 /avatars 时不用等上游下载"""
+    latest = dict(jobs)  # 同一用户只保留最后一次提交的 URL
+    results = await asyncio.gather(*(avatar_cache.get(user_id, url) for user_id, url in latest.items()), return_exceptions=True)
+    failed = sum(1 for result in results if isinstance(result, Exception))
+    if failed:
+        logging.info("Avatar prefetch failed for %s of %s users", failed, len(latest))
+
+
+job_queue.register("avatar_prefetch", prefetch_avatars)
+
+
+def get_avatar_router() -> APIRouter:
+    router = APIRouter()
+
+    @router.get("/{user_id}")
+    async def avatar(user_id: str, request: Request, user_manager: UserManager = Depends(get_user_manager)):
+        try:
+            user = await user_manager.get(user_manager.parse_id(user_id))
+        except (ValueError, exceptions.UserNotExists):
+            raise HTTPException(status_code=404, detail="User not found")
+        if not user.picture:
+            raise HTTPException(status_code=404, detail="User has no avatar")
+        try:
+            path, stat, entry = await avatar_cache.get(str(user.id), user.picture)
+        except AvatarError as e:
+            logging.warning("Avatar unavailable for user %s: %s", user.id, e)
+            raise HTTPException(status_code=502, detail="Avatar unavailable")
+
+        # ETag 就是内容哈希，图片不变时浏览器重新验证只拿到 304
+        etag = f'"{entry["digest"]}"'
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={AVATAR_BROWSER_MAX_AGE_SECONDS}"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        # 服务器支持 http.response.pathsend 扩展时 FileResponse 直接 sendfile，否则分块读取
+        return FileResponse(path, media_type=entry["content_type"], headers=headers, stat_result=stat)
+
+    return router
@@ -0,0 +1,242 @@
+"""批量导入/导出 users 集合（NDJSON）
+
+命令行:
+    python -m app.bulk import users.ndjson [--on-duplicate skip|update] [--batch-size N]
+    python -m app.bulk export users.ndjson [--fields email,first_name,...]
+
+导入的每一行是一个用户 JSON 对象，按 UserImport 校验；密码必须已经是哈希值（hashed_password），
+没有 hashed_password 的用户视为 OAuth-only 用户。被拒绝的行计入 invalid，
+前 MAX_REPORTED_REJECTIONS 行的行号和原因放在 rejected 里返回。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import AsyncIterable, AsyncIterator, Iterable
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pymongo import UpdateOne
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from app.auth import OAUTH_UNUSABLE_PASSWORD, fastapi_users
+from app.cache import invalidate_user
+from app.config import BULK_BATCH_SIZE
+from app.db import get_users_collection
+from app.metrics import track_stage
+from app.models import UserImport
+
+DUPLICATE_KEY_ERROR = 11000
+MAX_REPORTED_REJECTIONS = 100
+USER_FIELDS = (
+    "email", "hashed_password", "first_name", "last_name", "picture", "oauth_provider",
+    "is_active", "is_superuser", "is_verified",
+)
+EXPORT_FIELDS = tuple(field for field in USER_FIELDS if field != "hashed_password")
+# 新用户缺省字段；已有用户只更新导入行中出现的字段
+INSERT_DEFAULTS = {
+    "hashed_password": OAUTH_UNUSABLE_PASSWORD,
+    "is_active": True,
+    "is_superuser": False,
+    "is_verified": False,
+    # 与 User 模型一致：没有关联的提供商账号（mongomock 不支持 partialFilterExpression，
+    # 缺少这个字段的文档会在 oauth_identity 唯一索引上互相冲突）
+    "oauth_accounts": [],
+}
+
+
+class InvalidEncoding(ValueError):
+    """上传内容不是 UTF-8，整个导入在这一行中止"""
+
+    def __init__(self, line: int):
+        super().__init__(f"Line {line} is not valid UTF-8")
+        self.line = line
+
+
+def parse_user(line: str) -> dict:
+    """把一行解析成待写入的字段，不合法时抛 ValueError 并说明原因"""
+    try:
+        data = json.loads(line)
+    except ValueError:
+        raise ValueError("not valid JSON")
+    if not isinstance(data, dict):
+        raise ValueError("not a JSON object")
+    if "password" in data:
+        # 明文密码需要逐个哈希，批量导入不接受
+        raise ValueError("plaintext password is not accepted, use hashed_password")
+    try:
+        user = UserImport.model_validate(data)
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()))
+    # 只写入行中出现的字段，已有用户的其他字段保持不变
+    return user.model_dump(include=set(USER_FIELDS), exclude_unset=True)
+
+
+async def _invalidate_cached_users(batch: list[dict]):
+    # 缓存按 id 存放，导入按 email 写入：先查出受影响用户的 id 再逐个淘汰
+    cursor = get_users_collection().find({"email": {"$in": [doc["email"] for doc in batch]}}, {"_id": 1})
+    async for document in cursor:
+        invalidate_user(document["_id"])
+
+
+async def _write_batch(batch: list[dict], on_duplicate: str, stats: dict):
+    collection = get_users_collection()
+    try:
+        if on_duplicate == "update":
+            requests = [
+                UpdateOne(
+                    {"email": doc["email"]},
+                    {"$set": doc, "$setOnInsert": {k: v for k, v in INSERT_DEFAULTS.items() if k not in doc}},
+                    upsert=True,
+                )
+                for doc in batch
+            ]
+            result = await collection.bulk_write(requests, ordered=False)
+            stats["inserted"] += result.upserted_count
+            stats["updated"] += result.modified_count
+        else:
+            result = await collection.insert_many([{**INSERT_DEFAULTS, **doc} for doc in batch], ordered=False)
+            stats["inserted"] += len(result.inserted_ids)
+    except BulkWriteError as e:
+        details = e.details
+        duplicates = sum(1 for error in details.get("writeErrors", []) if error.get("code") == DUPLICATE_KEY_ERROR)
+        if duplicates != len(details.get("writeErrors", [])):
+            raise
+        stats["inserted"] += details.get("nInserted", 0) + details.get("nUpserted", 0)
+        stats["updated"] += details.get("nModified", 0)
+        stats["duplicates"] += duplicates
+    finally:
+        if on_duplicate == "update":
+            # 只有 update 模式会改写已有用户；skip 模式下已存在的用户保持原样，新插入的不在缓存里
+            await _invalidate_cached_users(batch)
+
+
+async def import_users(lines: AsyncIterable[str] | Iterable[str], on_duplicate: str = "skip", batch_size: int = BULK_BATCH_SIZE) -> dict:
+    """按批写入用户，ordered=False 让重复的 email 不影响同批其他文档"""
+    if on_duplicate not in ("skip", "update"):
+        raise ValueError(f"Unknown on_duplicate mode: {on_duplicate}")
+    stats = {"inserted": 0, "updated": 0, "duplicates": 0, "invalid": 0, "rejected": []}
+    started_at = time.perf_counter()
+    batch: list[dict] = []
+
+    async def lines_iter():
+        if hasattr(lines, "__aiter__"):
+            async for line in lines:
+                yield line
+        else:
+            for line in lines:
+                yield line
+
+    with track_stage("bulk_import"):
+        line_number = 0
+        async for line in lines_iter():
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                document = parse_user(line)
+            except ValueError as e:
+                stats["invalid"] += 1
+                if len(stats["rejected"]) < MAX_REPORTED_REJECTIONS:
+                    stats["rejected"].append({"line": line_number, "error": str(e)})
+                continue
+            batch.append(document)
+            if len(batch) >= batch_size:
+                await _write_batch(batch, on_duplicate, stats)
+                batch = []
+        if batch:
+            await _write_batch(batch, on_duplicate, stats)
+
+    elapsed = time.perf_counter() - started_at
+    stats["seconds"] = round(elapsed, 3)
+    stats["users_per_second"] = round((stats["inserted"] + stats["updated"]) / elapsed, 1) if elapsed else 0.0
+    logging.info("Bulk import finished: %s", stats)
+    return stats
+
+
+async def export_users(fields: Iterable[str] = EXPORT_FIELDS, query: dict | None = None) -> AsyncIterator[str]:
+    """游标流式导出，只取需要的字段，内存占用与总数无关"""
+    projection = {field: 1 for field in fields if field in USER_FIELDS}
+    projection["_id"] = 1
+    cursor = get_users_collection().find(query or {}, projection, batch_size=BULK_BATCH_SIZE)
+    async for document in cursor:
+        document["id"] = str(document.pop("_id"))
+        yield json.dumps(document, default=str) + "\n"
+
+
+def _decode_line(line: bytes, line_number: int) -> str:
+    try:
+        return line.decode()
+    except UnicodeDecodeError:
+        raise InvalidEncoding(line_number)
+
+
+async def _request_lines(request: Request) -> AsyncIterator[str]:
+    buffer = b""
+    line_number = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield _decode_line(line, line_number)
+    if buffer:
+        yield _decode_line(buffer, line_number + 1)
+
+
+def get_admin_users_router() -> APIRouter:
+    router = APIRouter(dependencies=[Depends(fastapi_users.current_user(active=True, superuser=True))])
+
+    @router.post("/import")
+    async def import_users_endpoint(request: Request, on_duplicate: str = Query("skip", pattern="^(skip|update)$")):
+        try:
+            return await import_users(_request_lines(request), on_duplicate)
+        except InvalidEncoding as e:
+            # 之前已经写入的批次保留，重新导入时用 on_duplicate 处理
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @router.get("/export")
+    async def export_users_endpoint(fields: str | None = None):
+        selected = fields.split(",") if fields else EXPORT_FIELDS
+        if "hashed_password" in selected:
+            raise HTTPException(status_code=400, detail="hashed_password cannot be exported over HTTP")
+        return StreamingResponse(export_users(selected), media_type="application/x-ndjson")
+
+    return router
+
+
+async def _main(args):
+    from app.db import init_db, close_db
+
+    # 确保唯一 email 索引已经存在，重复检测依赖它
+    await init_db()
+    try:
+        if args.command == "import":
+            with open(args.path) as f:
+                stats = await import_users(f, args.on_duplicate, args.batch_size)
+            print(json.dumps(stats))
+        else:
+            fields = args.fields.split(",") if args.fields else EXPORT_FIELDS
+            count = 0
+            with open(args.path, "w") as f:
+                async for line in export_users(fields):
+                    f.write(line)
+                    count += 1
+            print(f"Exported {count} users to {args.path}")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import/export of the users collection (NDJSON)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--on-duplicate", choices=["skip", "update"], default="skip")
+    import_parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--fields", help="Comma-separated fields, default all except hashed_password")
+    asyncio.run(_main(parser.parse_args()))
@@ -1,22 +1,256 @@
+import ipaddress
 import os
+import tempfile
+from dataclasses import dataclass, field, fields
 from dotenv import load_dotenv
 
 load_dotenv()
 
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
-GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
-SECRET_KEY = os.getenv("SECRET_KEY")
-MONGODB_URL = os.getenv("MONGODB_URL")
-DATABASE_NAME = os.getenv("DATABASE_NAME", "fastapi_oauth_db")
+_TRUE_VALUES = ("1", "true", "yes")
 
-# 添加调试输出
-print(f"MONGODB_URL: {MONGODB_URL}")
-print(f"DATABASE_NAME: {DATABASE_NAME}")
 
-LINKEDIN_CLIENT_ID = os.getenv("LINKEDIN_CLIENT_ID")
-LINKEDIN_CLIENT_SECRET = os.getenv("LINKEDIN_CLIENT_SECRET")
+def _parse_sample_rates(value: str) -> dict[str, float]:
+    return {
+        name.strip(): float(rate)
+        for name, rate in (item.split("=", 1) for item in value.split(",") if "=" in item)
+    }
 
-FACEBOOK_CLIENT_ID = os.getenv("FACEBOOK_CLIENT_ID")
-FACEBOOK_CLIENT_SECRET = os.getenv("FACEBOOK_CLIENT_SECRET")
 
-# 移除 Twitter 相关配置
\ No newline at end of file
+@dataclass(frozen=True)
+class Settings:
+    """进程启动时从环境变量读取并校验一次的配置
+
+    字段名与环境变量同名，类型注解决定解析方式；其他模块仍然可以用
+    `from app.config import MONGODB_URL` 的方式读取（见模块底部的 __getattr__）。
+    """
+
+    GOOGLE_CLIENT_ID: str | None = None
+    GOOGLE_CLIENT_SECRET: str | None = None
+    LINKEDIN_CLIENT_ID: str | None = None
+    LINKEDIN_CLIENT_SECRET: str | None = None
+    FACEBOOK_CLIENT_ID: str | None = None
+    FACEBOOK_CLIENT_SECRET: str | None = None
+    SECRET_KEY: str | None = None
+    APP_BASE_URL: str = "http://localhost:8000"
+    MONGODB_URL: str | None = None
+    DATABASE_NAME: str = "fastapi_oauth_db"
+
+    # MongoDB 连接池配置
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 0
+    MONGODB_MAX_IDLE_TIME_MS: int = 300000
+
+    # 密码哈希线程/进程池配置，HASH_EXECUTOR 为 thread 或 process
+    HASH_EXECUTOR: str = "thread"
+    HASH_MAX_WORKERS: int = field(default_factory=lambda: os.cpu_count() or 1)
+    HASH_MAX_QUEUE: int = 100
+
+    # JWT 配置：默认 access token 只包含 sub/aud/exp，用户资料按 sub 从 user_cache 或数据库读取。
+    # JWT_CLAIMS_ONLY 开启后，响应体里签发的 token 还带用户资料，只读接口直接使用 claims 不查数据库；
+    # OAuth 回调放在 URL 里的 token 始终不带资料，只读接口遇到它时回退到按 sub 加载用户
+    JWT_LIFETIME_SECONDS: int = 3600
+    JWT_CACHE_MAX_SIZE: int = 10000
+    JWT_CACHE_TTL_SECONDS: float = 300
+    JWT_CLAIMS_ONLY: bool = False
+    REFRESH_TOKEN_LIFETIME_SECONDS: int = 14 * 24 * 3600
+    REFRESH_TOKEN_MAX_LIFETIME_SECONDS: int = 90 * 24 * 3600
+    # OAuth 登录后 refresh token 放在 HttpOnly cookie 里（只发往 /auth/jwt），不出现在 URL 中；
+    # 本地用 http 调试时可以把 COOKIE_SECURE 设为 false
+    COOKIE_SECURE: bool = True
+
+    # 日志配置，LOG_SAMPLE_RATES 格式为 "logger名=比例,..."，例如 "app.routes.protected=0.01"
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_SAMPLE_RATES: dict[str, float] = field(default_factory=lambda: {"app.routes.protected": 0.01})
+
+    # 超过该耗时的请求会记录各阶段 span
+    SLOW_REQUEST_SECONDS: float = 1.0
+
+    # 批量导入/导出每批的文档数
+    BULK_BATCH_SIZE: int = 1000
+
+    # GET /users 列表接口：每页条数上限和单次查询的服务端超时
+    USER_LIST_DEFAULT_LIMIT: int = 50
+    USER_LIST_MAX_LIMIT: int = 500
+    USER_LIST_MAX_TIME_MS: int = 2000
+
+    # 登录后的后台任务队列（资料同步、登录审计、头像预取）：容量、每批最多任务数、
+    # 凑批最长等待时间，以及关闭时处理剩余任务的最长时间
+    JOB_QUEUE_SIZE: int = 10000
+    JOB_BATCH_SIZE: int = 100
+    JOB_FLUSH_INTERVAL_SECONDS: float = 0.05
+    JOB_DRAIN_TIMEOUT_SECONDS: float = 10
+
+    # 关联的提供商账号的 last_login 精度：距上次记录超过该秒数才更新，0 表示每次登录都写
+    OAUTH_LAST_LOGIN_RESOLUTION_SECONDS: float = 300
+
+    # 登录审计事件：mongo 写入 capped 集合，file 为本地替身（按大小轮转的 NDJSON 文件）
+    AUDIT_BACKEND: str = "mongo"
+    AUDIT_COLLECTION_MAX_BYTES: int = 512 * 1024 * 1024
+    AUDIT_FILE_PATH: str = field(default_factory=lambda: os.path.join(tempfile.gettempdir(), "login-audit", "events.ndjson"))
+    AUDIT_FILE_MAX_BYTES: int = 64 * 1024 * 1024
+    AUDIT_FILE_BACKUPS: int = 5
+
+    # 已认证用户缓存配置
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 60
+
+    # OAuth state：signed 为无状态签名；memory（单进程）和 mongo（多进程共享）额外保证一次性使用
+    OAUTH_STATE_BACKEND: str = "signed"
+    OAUTH_STATE_TTL_SECONDS: int = 600
+
+    # 设置后所有 OAuth 提供商都指向本地模拟服务（见 benchmarks/mock_provider.py）
+    OAUTH_MOCK_BASE_URL: str | None = None
+
+    # OpenID Connect：从 id_token 读取用户资料，省掉 userinfo 请求
+    OIDC_ID_TOKEN_ENABLED: bool = True
+    OIDC_CACHE_TTL_SECONDS: float = 3600
+    OIDC_REFRESH_MIN_INTERVAL_SECONDS: float = 60
+
+    # 对外 HTTP 调用（OAuth 提供商）的连接池配置
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30
+    HTTP_TIMEOUT: float = 10
+    HTTP_CONNECT_TIMEOUT: float = 5
+    HTTP2_ENABLED: bool = False
+
+    # 调用 OAuth 提供商的容错：一次登录内所有提供商调用共享 OAUTH_LOGIN_DEADLINE_SECONDS，
+    # 单次调用不超过 PROVIDER_CALL_TIMEOUT_SECONDS；幂等调用失败后按指数退避加随机抖动重试
+    OAUTH_LOGIN_DEADLINE_SECONDS: float = 10
+    PROVIDER_CALL_TIMEOUT_SECONDS: float = 4
+    PROVIDER_MAX_RETRIES: int = 2
+    PROVIDER_RETRY_BASE_DELAY_SECONDS: float = 0.1
+    # 连续失败达到阈值后熔断，PROVIDER_BREAKER_RESET_SECONDS 内直接失败，之后放一个探测请求
+    PROVIDER_BREAKER_FAILURE_THRESHOLD: int = 5
+    PROVIDER_BREAKER_RESET_SECONDS: float = 30
+    # 大于 0 时，userinfo 请求超过这个时间还没返回就再发一个，取先成功的结果
+    PROVIDER_HEDGE_DELAY_SECONDS: float = 0
+
+    # 登录相关接口的限流：令牌桶按 IP 和 email 计数（速率为每秒补充的令牌数），
+    # RATE_LIMIT_BACKEND 为 memory（单进程）或 mongo（多 worker/多节点共享）
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_IP_RATE: float = 1.0
+    RATE_LIMIT_IP_BURST: int = 30
+    RATE_LIMIT_EMAIL_RATE: float = 0.1
+    RATE_LIMIT_EMAIL_BURST: int = 5
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    # 部署在反向代理后面时，代理的地址或网段（逗号分隔，例如 "10.0.0.0/8,127.0.0.1"）。
+    # 连接来自这些地址时，限流和审计用 X-Forwarded-For 中从右往左第一个不受信任的地址作为客户端 IP；
+    # 为空时只使用连接地址，客户端自己发送的 X-Forwarded-For 不起作用
+    TRUSTED_PROXIES: tuple[str, ...] = ()
+    # 每类路由同时处理的请求上限，超出直接返回 503，而不是排队
+    OAUTH_MAX_CONCURRENCY: int = 200
+    PASSWORD_MAX_CONCURRENCY: int = 50
+
+    # 头像代理缓存：按内容哈希存放在本地目录，总大小超过上限时按最近访问时间淘汰
+    AVATAR_CACHE_DIR: str = field(default_factory=lambda: os.path.join(tempfile.gettempdir(), "avatar-cache"))
+    AVATAR_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    AVATAR_MAX_IMAGE_BYTES: int = 5 * 1024 * 1024
+    AVATAR_BROWSER_MAX_AGE_SECONDS: int = 7 * 24 * 3600
+    # 下载头像时最多跟随的重定向次数，每一跳都重新校验 URL
+    AVATAR_MAX_REDIRECTS: int = 3
+
+    # 生产启动入口（python -m app.server）：worker 数默认等于 CPU 核数，
+    # Motor/httpx 连接池按上面的配置在每个 worker 内单独创建
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    WEB_CONCURRENCY: int = field(default_factory=lambda: os.cpu_count() or 1)
+    # 收到 SIGTERM 后先让 /health/ready 返回 503 的时间，再停止接受新连接
+    DRAIN_DELAY_SECONDS: float = 0
+    GRACEFUL_TIMEOUT_SECONDS: float = 30
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        values = {}
+        errors = []
+        for f in fields(cls):
+            raw = os.getenv(f.name)
+            if raw is None:
+                continue
+            try:
+                values[f.name] = _parse(f.type, raw)
+            except ValueError:
+                errors.append(f"{f.name}={raw!r} is not a valid {getattr(f.type, '__name__', f.type)}")
+        if errors:
+            raise ValueError("Invalid configuration: " + "; ".join(errors))
+        if "LOG_LEVEL" in values:
+            values["LOG_LEVEL"] = values["LOG_LEVEL"].upper()
+        settings = cls(**values)
+        settings.validate()
+        return settings
+
+    def validate(self):
+        errors = []
+        if self.HASH_EXECUTOR not in ("thread", "process"):
+            errors.append(f"HASH_EXECUTOR must be thread or process, got {self.HASH_EXECUTOR!r}")
+        if self.OAUTH_STATE_BACKEND not in ("signed", "memory", "mongo"):
+            errors.append(f"OAUTH_STATE_BACKEND must be signed, memory or mongo, got {self.OAUTH_STATE_BACKEND!r}")
+        if self.AUDIT_BACKEND not in ("mongo", "file"):
+            errors.append(f"AUDIT_BACKEND must be mongo or file, got {self.AUDIT_BACKEND!r}")
+        if self.RATE_LIMIT_BACKEND not in ("memory", "mongo"):
+            errors.append(f"RATE_LIMIT_BACKEND must be memory or mongo, got {self.RATE_LIMIT_BACKEND!r}")
+        if self.MONGODB_MIN_POOL_SIZE > self.MONGODB_MAX_POOL_SIZE:
+            errors.append("MONGODB_MIN_POOL_SIZE must not exceed MONGODB_MAX_POOL_SIZE")
+        if self.USER_LIST_DEFAULT_LIMIT > self.USER_LIST_MAX_LIMIT:
+            errors.append("USER_LIST_DEFAULT_LIMIT must not exceed USER_LIST_MAX_LIMIT")
+        if self.REFRESH_TOKEN_LIFETIME_SECONDS > self.REFRESH_TOKEN_MAX_LIFETIME_SECONDS:
+            errors.append("REFRESH_TOKEN_LIFETIME_SECONDS must not exceed REFRESH_TOKEN_MAX_LIFETIME_SECONDS")
+        for name in ("HASH_MAX_WORKERS", "WEB_CONCURRENCY", "AVATAR_CACHE_MAX_BYTES", "AVATAR_MAX_IMAGE_BYTES",
+                     "RATE_LIMIT_IP_RATE", "RATE_LIMIT_IP_BURST", "RATE_LIMIT_EMAIL_RATE", "RATE_LIMIT_EMAIL_BURST",
+                     "RATE_LIMIT_MAX_KEYS", "OAUTH_MAX_CONCURRENCY", "PASSWORD_MAX_CONCURRENCY", "JWT_LIFETIME_SECONDS", "BULK_BATCH_SIZE", "LOG_QUEUE_SIZE", "HTTP_MAX_CONNECTIONS",
+                     "OAUTH_LOGIN_DEADLINE_SECONDS", "PROVIDER_CALL_TIMEOUT_SECONDS", "PROVIDER_BREAKER_FAILURE_THRESHOLD",
+                     "PROVIDER_BREAKER_RESET_SECONDS", "USER_LIST_DEFAULT_LIMIT", "USER_LIST_MAX_LIMIT", "USER_LIST_MAX_TIME_MS",
+                     "JOB_QUEUE_SIZE", "JOB_BATCH_SIZE", "JOB_DRAIN_TIMEOUT_SECONDS",
+                     "AUDIT_COLLECTION_MAX_BYTES", "AUDIT_FILE_MAX_BYTES", "AUDIT_FILE_BACKUPS"):
+            if getattr(self, name) <= 0:
+                errors.append(f"{name} must be positive")
+        for name in ("PROVIDER_MAX_RETRIES", "PROVIDER_RETRY_BASE_DELAY_SECONDS", "PROVIDER_HEDGE_DELAY_SECONDS",
+                     "JOB_FLUSH_INTERVAL_SECONDS", "OAUTH_LAST_LOGIN_RESOLUTION_SECONDS", "AVATAR_MAX_REDIRECTS"):
+            if getattr(self, name) < 0:
+                errors.append(f"{name} must not be negative")
+        for proxy in self.TRUSTED_PROXIES:
+            try:
+                ipaddress.ip_network(proxy, strict=False)
+            except ValueError:
+                errors.append(f"TRUSTED_PROXIES entry {proxy!r} is not an IP address or network")
+        for name, rate in self.LOG_SAMPLE_RATES.items():
+            if not 0 <= rate <= 1:
+                errors.append(f"LOG_SAMPLE_RATES rate for {name} must be between 0 and 1")
+        if errors:
+            raise ValueError("Invalid configuration: " + "; ".join(errors))
+
+    def provider_configured(self, name: str) -> bool:
+        """只有配置了 client id 的 OAuth 提供商才会被注册"""
+        return bool(getattr(self, f"{name.upper()}_CLIENT_ID", None))
+
+
+def _parse(annotation, raw: str):
+    if annotation is bool:
+        return raw.lower() in _TRUE_VALUES
+    if annotation is int:
+        return int(raw)
+    if annotation is float:
+        return float(raw)
+    if annotation == dict[str, float]:
+        return _parse_sample_rates(raw)
+    if annotation == tuple[str, ...]:
+        return tuple(item.strip() for item in raw.split(",") if item.strip())
+    if annotation is str:
+        return raw
+    if annotation == str | None:
+        # 空字符串与未设置等价
+        return raw or None
+    raise ValueError(annotation)
+
+
+settings = Settings.from_env()
+
+
+def __getattr__(name: str):
+    # 兼容旧的模块级常量写法：from app.config import MONGODB_URL
+    try:
+        return getattr(settings, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
@@ -2,23 +2,73 @@ from beanie import init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient
 from fastapi_users.db import BeanieUserDatabase
 from app.models import User
-from app.config import MONGODB_URL, DATABASE_NAME
+from app.config import (
+    MONGODB_URL,
+    DATABASE_NAME,
+    MONGODB_MAX_POOL_SIZE,
+    MONGODB_MIN_POOL_SIZE,
+    MONGODB_MAX_IDLE_TIME_MS,
+)
+from app.metrics import track_stage
 import logging
 
+# 进程级共享的 Motor 客户端，由 startup/shutdown 事件管理
+_client: AsyncIOMotorClient | None = None
+_beanie_initialized = False
+
+
+def get_client() -> AsyncIOMotorClient:
+    global _client
+    if _client is None and MONGODB_URL and MONGODB_URL.startswith("mongomock://"):
+        # 本地压测用的进程内存储，需要安装 mongomock-motor
+        from mongomock_motor import AsyncMongoMockClient
+        _client = AsyncMongoMockClient()
+        logging.warning("Using in-process mongomock user store")
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            MONGODB_URL,
+            maxPoolSize=MONGODB_MAX_POOL_SIZE,
+            minPoolSize=MONGODB_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS,
+        )
+    return _client
+
+
 async def init_db():
+    global _beanie_initialized
+    if _beanie_initialized:
+        return
     try:
-        client = AsyncIOMotorClient(MONGODB_URL)
+        client = get_client()
         await init_beanie(database=client[DATABASE_NAME], document_models=[User])
-        logging.info(f"Database '{DATABASE_NAME}' initialized successfully")
+        _beanie_initialized = True
+        logging.info("Database '%s' initialized successfully", DATABASE_NAME)
     except Exception as e:
-        logging.error(f"Failed to initialize database: {str(e)}")
+        logging.error("Failed to initialize database: %s", e)
         raise
 
+
+def get_users_collection():
+    """返回 users 集合的原生 Motor 句柄，用于需要原子操作的场景"""
+    return get_client()[DATABASE_NAME][User.Settings.name]
+
+
+async def close_db():
+    global _client, _beanie_initialized
+    if _client is not None:
+        _client.close()
+        _client = None
+        _beanie_initialized = False
+        logging.info("MongoDB client closed")
+
+
 async def get_user_db():
     try:
-        client = AsyncIOMotorClient(MONGODB_URL)
-        await init_beanie(database=client[DATABASE_NAME], document_models=[User])
+        # Beanie 只在启动时初始化一次，这里直接复用
+        with track_stage("get_user_db"):
+            if not _beanie_initialized:
+                await init_db()
         yield BeanieUserDatabase(User)
     except Exception as e:
-        logging.error(f"Failed to get user database: {str(e)}")
-        raise
\ No newline at end of file
+        logging.error("Failed to get user database: %s", e)
+        raise
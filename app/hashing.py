@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from app.config import HASH_EXECUTOR, HASH_MAX_WORKERS, HASH_MAX_QUEUE
+from app.metrics import HASH_QUEUE_WAIT, HASH_REJECTED, track_stage
+
+# 密码哈希/校验在独立的线程或进程池中执行，避免阻塞事件循环
+_executor: Executor | None = None
+_semaphore: asyncio.Semaphore | None = None
+_waiting = 0
+
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if HASH_EXECUTOR == "process":
+            # 进程池依赖 multiprocessing，只在选用时才导入
+            from concurrent.futures import ProcessPoolExecutor
+
+            _executor = ProcessPoolExecutor(max_workers=HASH_MAX_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=HASH_MAX_WORKERS, thread_name_prefix="password-hash")
+        logging.info("Password hashing pool started: %s x %s", HASH_EXECUTOR, HASH_MAX_WORKERS)
+    return _executor
+
+
+def shutdown_executor():
+    global _executor, _semaphore
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+        _semaphore = None
+
+
+def _call(helper, method: str, *args):
+    return getattr(helper, method)(*args)
+
+
+async def _run(helper, method: str, *args):
+    global _semaphore, _waiting
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(HASH_MAX_WORKERS)
+
+    # 排队的请求超过上限时直接拒绝，而不是无限制地堆积
+    if _waiting >= HASH_MAX_QUEUE:
+        HASH_REJECTED.inc()
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+    _waiting += 1
+    queued_at = time.perf_counter()
+    try:
+        await _semaphore.acquire()
+    finally:
+        _waiting -= 1
+    try:
+        started_at = time.perf_counter()
+        HASH_QUEUE_WAIT.observe(started_at - queued_at)
+        with track_stage(f"password_{method}"):
+            result = await asyncio.get_running_loop().run_in_executor(get_executor(), _call, helper, method, *args)
+        return result
+    finally:
+        _semaphore.release()
+
+
+async def hash_password(helper, password: str) -> str:
+    return await _run(helper, "hash", password)
+
+
+async def verify_and_update_password(helper, password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return await _run(helper, "verify_and_update", password, hashed_password)
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.db import get_client
+
+# 就绪检查 Mongo 的超时时间，避免探针请求堆积
+READY_PING_TIMEOUT_SECONDS = 1.0
+
+_ready = False
+_draining = False
+
+
+def mark_ready():
+    global _ready
+    _ready = True
+
+
+def mark_draining():
+    """收到停止信号后调用，之后 /health/ready 返回 503，让负载均衡摘掉本 worker"""
+    global _draining
+    if not _draining:
+        logging.info("Worker is draining, readiness probe now fails")
+    _draining = True
+
+
+def is_draining() -> bool:
+    return _draining
+
+
+def get_health_router() -> APIRouter:
+    router = APIRouter()
+
+    @router.get("/live")
+    async def liveness():
+        # 只要事件循环还能处理请求就算存活，不检查任何依赖
+        return {"status": "ok"}
+
+    @router.get("/ready")
+    async def readiness():
+        if _draining:
+            return JSONResponse({"status": "draining"}, status_code=503)
+        if not _ready:
+            return JSONResponse({"status": "starting"}, status_code=503)
+        try:
+            await asyncio.wait_for(get_client().server_info(), READY_PING_TIMEOUT_SECONDS)
+        except Exception as e:
+            logging.warning("Readiness check failed: %s", e)
+            return JSONResponse({"status": "unavailable", "detail": "database"}, status_code=503)
+        return {"status": "ok"}
+
+    return router
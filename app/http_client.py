@@ -0,0 +1,55 @@
+import contextlib
+import logging
+
+import httpx
+
+from app.config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP2_ENABLED,
+)
+
+try:
+    import h2  # noqa: F401
+    _h2_available = True
+except ImportError:
+    _h2_available = False
+
+# 进程级共享的 httpx 客户端，复用 TCP/TLS 连接
+_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        http2 = HTTP2_ENABLED and _h2_available
+        if HTTP2_ENABLED and not _h2_available:
+            logging.warning("HTTP/2 requested but 'h2' is not installed, falling back to HTTP/1.1 keep-alive")
+        _client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logging.info("HTTP client closed")
+
+
+class SharedHTTPClientMixin:
+    """让 httpx_oauth 客户端使用共享连接池，而不是每次调用新建 AsyncClient"""
+
+    def get_httpx_client(self):
+        return contextlib.nullcontext(get_http_client())
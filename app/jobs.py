@@ -0,0 +1,118 @@
+"""进程内后台任务队列：把登录后不影响响应的写操作移出回调路径
+
+任务按 kind 分发给注册的处理函数，一次处理同一 kind 的一批任务（合并为一次批量写）。
+队列有容量上限，满了 submit() 返回 False，由调用方决定丢弃还是同步执行。
+只有一个消费协程，同一用户的任务按提交顺序执行。关闭时先处理完队列中剩余的任务，
+最多等待 JOB_DRAIN_TIMEOUT_SECONDS。任务只存在内存里，进程崩溃会丢失，不要放必须
+落盘的写入。
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable
+
+from app.config import JOB_QUEUE_SIZE, JOB_BATCH_SIZE, JOB_FLUSH_INTERVAL_SECONDS, JOB_DRAIN_TIMEOUT_SECONDS
+from app.metrics import JOB_EVENTS, JOB_QUEUE_DEPTH
+
+BatchHandler = Callable[[list[Any]], Awaitable[None]]
+
+
+class JobQueue:
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._handlers: dict[str, BatchHandler] = {}
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._closing = False
+        self._idle = False
+
+    def register(self, kind: str, handler: BatchHandler):
+        self._handlers[kind] = handler
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._closing
+
+    def start(self):
+        # 队列要在事件循环里创建，所以放在 startup 事件中
+        self._queue = asyncio.Queue(self.max_size)
+        self._closing = False
+        self._worker = asyncio.create_task(self._run())
+        logging.info("Background job queue started (capacity %s)", self.max_size)
+
+    def submit(self, kind: str, payload: Any) -> bool:
+        if kind not in self._handlers:
+            # 处理函数所在模块没有被导入（例如命令行脚本），按队列不可用处理
+            logging.warning("No handler registered for job kind %r", kind)
+            return False
+        if not self.running:
+            JOB_EVENTS.labels(kind=kind, outcome="rejected").inc()
+            return False
+        try:
+            self._queue.put_nowait((kind, payload))
+        except asyncio.QueueFull:
+            JOB_EVENTS.labels(kind=kind, outcome="rejected").inc()
+            logging.warning("Job queue is full, rejected %s job", kind)
+            return False
+        JOB_EVENTS.labels(kind=kind, outcome="submitted").inc()
+        JOB_QUEUE_DEPTH.inc()
+        return True
+
+    async def _next_batch(self) -> list[tuple[str, Any]]:
+        self._idle = True
+        try:
+            batch = [await self._queue.get()]
+        finally:
+            self._idle = False
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or self._closing:
+                # 关闭时不再等待，只取走已经在队列里的任务
+                if self._queue.empty():
+                    break
+                batch.append(self._queue.get_nowait())
+                continue
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while not (self._closing and self._queue.empty()):
+            batch = await self._next_batch()
+            JOB_QUEUE_DEPTH.dec(len(batch))
+            by_kind: dict[str, list[Any]] = defaultdict(list)
+            for kind, payload in batch:
+                by_kind[kind].append(payload)
+            for kind, payloads in by_kind.items():
+                try:
+                    await self._handlers[kind](payloads)
+                    JOB_EVENTS.labels(kind=kind, outcome="done").inc(len(payloads))
+                except Exception as e:
+                    # 任务失败不重试，下一次登录会重新提交
+                    JOB_EVENTS.labels(kind=kind, outcome="failed").inc(len(payloads))
+                    logging.error("Background %s batch of %s failed: %s", kind, len(payloads), e, exc_info=True)
+
+    async def stop(self, timeout: float = JOB_DRAIN_TIMEOUT_SECONDS):
+        if self._worker is None:
+            return
+        self._closing = True
+        if self._idle and self._queue.empty():
+            # 消费协程空闲、阻塞在 get() 上时直接取消；正在处理的批次会先写完
+            self._worker.cancel()
+        try:
+            await asyncio.wait_for(self._worker, timeout)
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            logging.error("Job queue drain timed out, dropping %s jobs", self._queue.qsize())
+        self._worker = None
+        logging.info("Background job queue stopped")
+
+
+job_queue = JobQueue(JOB_QUEUE_SIZE, JOB_BATCH_SIZE, JOB_FLUSH_INTERVAL_SECONDS)
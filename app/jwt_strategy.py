@@ -0,0 +1,83 @@
+import time
+from typing import Any
+
+import jwt
+from fastapi_users import exceptions
+from fastapi_users.authentication import JWTStrategy
+from fastapi_users.jwt import decode_jwt, generate_jwt
+
+from app.cache import TTLCache
+from app.config import JWT_CACHE_MAX_SIZE, JWT_CACHE_TTL_SECONDS
+
+# claims-only 模式下写入 token 的用户字段，只读接口直接从这里读取，不访问数据库
+PROFILE_CLAIMS = ("email", "first_name", "last_name", "picture", "oauth_provider", "linked_providers", "is_active")
+
+
+class CachedJWTStrategy(JWTStrategy):
+    """缓存已验证 token 的 claims，重复请求不必再次校验签名和解析"""
+
+    def __init__(self, *args, profile_claims: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profile_claims = profile_claims
+        self.token_cache = TTLCache(JWT_CACHE_MAX_SIZE, JWT_CACHE_TTL_SECONDS)
+        # 已登出的 token，保留到 exp；只在本进程内生效，多 worker 时其他进程仍接受到 exp 为止
+        self.logged_out = TTLCache(JWT_CACHE_MAX_SIZE, JWT_CACHE_TTL_SECONDS)
+
+    def decode(self, token: str) -> dict[str, Any] | None:
+        if self.logged_out.get(token) is not None:
+            return None
+        claims = self.token_cache.get(token)
+        if claims is not None:
+            # 缓存的 TTL 不会超过 exp，这里再检查一次以防时钟边界
+            if claims.get("exp", float("inf")) > time.time():
+                return claims
+            self.token_cache.invalidate(token)
+            return None
+        try:
+            claims = decode_jwt(token, self.decode_key, self.token_audience, algorithms=[self.algorithm])
+        except jwt.PyJWTError:
+            return None
+
+        ttl = self._ttl_until_exp(claims, self.token_cache.ttl_seconds)
+        if ttl > 0:
+            self.token_cache.set(token, claims, ttl_seconds=ttl)
+        return claims
+
+    @staticmethod
+    def _ttl_until_exp(claims: dict[str, Any], ttl: float) -> float:
+        if "exp" in claims:
+            ttl = min(ttl, claims["exp"] - time.time())
+        return ttl
+
+    async def destroy_token(self, token: str, user) -> None:
+        """/auth/jwt/logout：移出 claims 缓存，并在本进程内拒绝这个 token 直到 exp"""
+        claims = self.decode(token)
+        self.token_cache.invalidate(token)
+        if claims is not None:
+            ttl = self._ttl_until_exp(claims, self.lifetime_seconds or self.logged_out.ttl_seconds)
+            if ttl > 0:
+                self.logged_out.set(token, True, ttl_seconds=ttl)
+
+    async def read_token(self, token: str | None, user_manager):
+        if token is None:
+            return None
+        claims = self.decode(token)
+        if claims is None or claims.get("sub") is None:
+            return None
+        try:
+            parsed_id = user_manager.parse_id(claims["sub"])
+            return await user_manager.get(parsed_id)
+        except (exceptions.UserNotExists, exceptions.InvalidID):
+            return None
+
+    async def write_token(self, user, profile_claims: bool | None = None) -> str:
+        """profile_claims 默认跟随 JWT_CLAIMS_ONLY
+
+        会放进 URL 的 token（OAuth 回调重定向到 /auth-success）必须传 False：查询串会进入浏览器历史
+        和访问日志，只能有 sub/aud/exp。只在响应体里返回的 token 才带用户资料。
+        """
+        data = {"sub": str(user.id), "aud": self.token_audience}
+        if self.profile_claims if profile_claims is None else profile_claims:
+            for field in PROFILE_CLAIMS:
+                data[field] = getattr(user, field, None)
+        return generate_jwt(data, self.encode_key, self.lifetime_seconds, algorithm=self.algorithm)
@@ -0,0 +1,106 @@
+import logging
+import logging.handlers
+import queue
+import random
+import re
+
+from app.config import LOG_LEVEL, LOG_QUEUE_SIZE, LOG_SAMPLE_RATES
+
+# 日志中的令牌和个人信息在输出前统一脱敏
+_REDACT_PATTERNS = [
+    (re.compile(r"(access_token|refresh_token|id_token|code|state)=([^&\s'\"]+)"), r"\1=[REDACTED]"),
+    (re.compile(r"(Bearer\s+)[A-Za-z0-9\-._~+/]+=*"), r"\1[REDACTED]"),
+    (re.compile(r"eyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+"), "[REDACTED_JWT]"),
+    (re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}"), "[REDACTED_EMAIL]"),
+]
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def redact(message: str) -> str:
+    for pattern, replacement in _REDACT_PATTERNS:
+        message = pattern.sub(replacement, message)
+    return message
+
+
+class RedactingFilter(logging.Filter):
+    def __init__(self, merge_args: bool = True):
+        super().__init__()
+        self.merge_args = merge_args
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.merge_args:
+            # 只有真正要输出的记录才会走到这里，此时才格式化参数
+            record.msg = redact(record.getMessage())
+            record.args = None
+        elif isinstance(record.args, tuple):
+            # 保留参数结构，供依赖 record.args 的格式化器（如 uvicorn 访问日志）使用
+            record.args = tuple(redact(arg) if isinstance(arg, str) else arg for arg in record.args)
+        return True
+
+
+class SampledLogger(logging.LoggerAdapter):
+    """按比例采样的 logger，用于高频路由
+
+    在创建 LogRecord 之前就决定是否丢弃，被采样掉的调用几乎没有开销。
+    WARNING 及以上级别总是输出。
+    """
+
+    def __init__(self, logger: logging.Logger, rate: float):
+        super().__init__(logger, {})
+        self.rate = rate
+
+    def isEnabledFor(self, level: int) -> bool:
+        if level < logging.WARNING and random.random() >= self.rate:
+            return False
+        return self.logger.isEnabledFor(level)
+
+    def process(self, msg, kwargs):
+        return msg, kwargs
+
+
+def get_sampled_logger(name: str) -> SampledLogger:
+    return SampledLogger(logging.getLogger(name), LOG_SAMPLE_RATES.get(name, 1.0))
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃日志，而不是阻塞请求"""
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def setup_logging():
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RedactingFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    # 实际的 I/O 在后台线程中完成
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    # uvicorn 的访问日志有自己的 handler，单独加上脱敏（/auth-success 的查询参数里有 token）
+    access_logger = logging.getLogger("uvicorn.access")
+    if not any(isinstance(f, RedactingFilter) for f in access_logger.filters):
+        access_logger.addFilter(RedactingFilter(merge_args=False))
+
+
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
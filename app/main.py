@@ -1,168 +1,217 @@
 from fastapi import FastAPI, Depends, APIRouter, Request, HTTPException
-from fastapi.responses import RedirectResponse, HTMLResponse
-from .auth import fastapi_users, current_active_user, google_oauth_client, get_user_manager, UserManager, auth_backend, get_linkedin_oauth_router, get_linkedin_oauth_associate_router, get_facebook_oauth_router, get_facebook_oauth_associate_router
+from fastapi.responses import RedirectResponse, Response
+from .auth import fastapi_users, read_only_user, get_user_manager, UserManager, auth_backend, complete_oauth_login, get_refresh_router, get_oauth_associate_router, set_refresh_cookie
 from .models import User, UserCreate, UserRead, UserUpdate
-from .config import SECRET_KEY, MONGODB_URL, DATABASE_NAME
-from .db import init_db
-from .oauth_clients import linkedin_oauth_client, facebook_oauth_client
-
+from .config import DATABASE_NAME
+from .db import init_db, close_db, get_client
+from .providers import OAuthProvider, providers, get_provider
+from .config import OIDC_ID_TOKEN_ENABLED
+from .state import state_store, MongoStateBackend, STATE_COOKIE_NAME, new_nonce, set_state_cookie, clear_state_cookie
+from .resilience import ProviderError
+from .ratelimit import admission_control, rate_limiter, MongoRateLimitBackend
+from .refresh_tokens import create_indexes as create_refresh_token_indexes
+from .bulk import get_admin_users_router
+from .user_listing import get_users_listing_router
+from .avatars import get_avatar_router
+from .health import get_health_router, mark_ready, mark_draining
+from .pages import render_auth_success, render_auth_error, auth_success_script
+from .http_client import get_http_client, close_http_client
+from .hashing import shutdown_executor
+from .jobs import job_queue
+from .audit import audit_sink, audit_password_login, get_audit_router, record_login
+from .metrics import metrics_middleware, render_metrics, track_stage
+from .logging_config import setup_logging, shutdown_logging, get_sampled_logger
+
+import asyncio
 import logging
-import secrets
-import httpx
-import json
+from urllib.parse import urlencode
 
-# 修改日志级别，去掉心跳日志
-logging.basicConfig(level=logging.INFO)
+# 非阻塞的队列日志，带脱敏和按路由采样
+setup_logging()
 logger = logging.getLogger(__name__)
+protected_route_logger = get_sampled_logger("app.routes.protected")
 
 app = FastAPI()
-
-from motor.motor_asyncio import AsyncIOMotorClient
-from .config import MONGODB_URL, DATABASE_NAME
+app.middleware("http")(metrics_middleware)
 
 @app.on_event("startup")
 async def startup_event():
     try:
-        client = AsyncIOMotorClient(MONGODB_URL)
-        await client.server_info()  # 这将触发一个到数据库的连接
-        logging.info(f"Successfully connected to MongoDB at {MONGODB_URL}")
+        # 使用共享客户端检查连接，避免额外创建一次性的连接池
+        await get_client().server_info()
+        logging.info("Successfully connected to MongoDB database %s", DATABASE_NAME)
     except Exception as e:
-        logging.error(f"Failed to connect to MongoDB: {str(e)}")
+        logging.error("Failed to connect to MongoDB: %s", e)
         raise
     await init_db()
+    get_http_client()
+    await create_refresh_token_indexes()
+    job_queue.start()
+    await audit_sink.create_collection()
+    if isinstance(state_store.backend, MongoStateBackend):
+        await state_store.backend.create_indexes()
+    if isinstance(rate_limiter.backend, MongoRateLimitBackend):
+        await rate_limiter.backend.create_indexes()
+    if OIDC_ID_TOKEN_ENABLED:
+        # 后台预取 discovery 和 JWKS，不阻塞启动
+        for provider in providers.values():
+            if provider.oidc is not None:
+                asyncio.create_task(provider.oidc.warm_up())
+    if logger.isEnabledFor(logging.DEBUG):
+        for route in app.routes:
+            logger.debug("Registered route: %s", getattr(route, "path", route))
+    mark_ready()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    mark_draining()
+    # 先处理完后台队列里的资料同步等任务，再关闭它们依赖的数据库和 HTTP 连接池
+    await job_queue.stop()
+    await close_http_client()
+    await close_db()
+    shutdown_executor()
+    shutdown_logging()
+
+# 登录、注册、重置密码会触发密码哈希，OAuth 登录和回调会调用提供商接口，都需要限流
+password_admission = Depends(admission_control("password", by_email=True))
+oauth_admission = Depends(admission_control("oauth"))
 
 # Include FastAPI Users routers
 app.include_router(
     fastapi_users.get_auth_router(auth_backend),
     prefix="/auth/jwt",
     tags=["auth"],
+    dependencies=[password_admission, Depends(audit_password_login)],
+)
+app.include_router(
+    get_refresh_router(),
+    prefix="/auth/jwt",
+    tags=["auth"],
 )
 app.include_router(
     fastapi_users.get_register_router(UserRead, UserCreate),
     prefix="/auth",
     tags=["auth"],
+    dependencies=[password_admission],
 )
 app.include_router(
     fastapi_users.get_reset_password_router(),
     prefix="/auth",
     tags=["auth"],
+    dependencies=[password_admission],
 )
 app.include_router(
     fastapi_users.get_verify_router(UserRead),
     prefix="/auth",
     tags=["auth"],
 )
+app.include_router(
+    get_users_listing_router(),
+    prefix="/users",
+    tags=["users"],
+)
 app.include_router(
     fastapi_users.get_users_router(UserRead, UserUpdate),
     prefix="/users",
     tags=["users"],
 )
+app.include_router(
+    get_admin_users_router(),
+    prefix="/admin/users",
+    tags=["admin"],
+)
+app.include_router(
+    get_audit_router(),
+    prefix="/admin/audit",
+    tags=["admin"],
+)
+app.include_router(
+    get_avatar_router(),
+    prefix="/avatars",
+    tags=["avatars"],
+)
+app.include_router(
+    get_health_router(),
+    prefix="/health",
+    tags=["health"],
+)
 
-# 接在 include_router 中调用 get_oauth_router()
-# app.include_router(get_oauth_router(), prefix="/auth/google", tags=["auth"])
-# app.include_router(get_oauth_associate_router(), prefix="/auth/associate/google", tags=["auth"])
-
-oauth_router = APIRouter()
-
-@oauth_router.get("/login")
-async def google_oauth_login():
-    try:
-        state = secrets.token_urlsafe(16)
-        authorization_url = await google_oauth_client.get_authorization_url(
-            "http://localhost:8000/auth/google/callback",
-            state=state
-        )
-        return RedirectResponse(url=authorization_url)
-    except Exception as e:
-        logger.error(f"Error in google_oauth_login: {str(e)}")
-        return {"error": str(e)}
+def auth_error_redirect(error: str, description: str) -> RedirectResponse:
+    return RedirectResponse(url=f"/auth-error?{urlencode({'error': error, 'description': description})}")
 
-@oauth_router.get("/callback")
-async def google_oauth_callback(request: Request, user_manager: UserManager = Depends(get_user_manager)):
-    try:
-        # Get the authorization code from the query parameters
-        code = request.query_params.get("code")
-        if not code:
-            raise HTTPException(status_code=400, detail="Missing authorization code")
 
-        # Exchange the code for an access token
-        token = await google_oauth_client.get_access_token(code, request.url_for("google_oauth_callback"))
-        logging.debug(f"Received token: {token}")
+def build_oauth_router(provider: OAuthProvider) -> APIRouter:
+    """根据提供商声明生成 /login 和 /callback 路由，所有提供商共用同一流程"""
+    router = APIRouter()
 
-        # Get user info using the access token
-        user_data = await google_oauth_client.get_id_email(token["access_token"])
-        logging.info(f"Received Google user data: {user_data}")
+    async def oauth_login():
+        nonce = new_nonce()
+        state = await state_store.mint(provider.name, nonce)
+        authorization_url = await provider.client.get_authorization_url(provider.redirect_uri, state=state)
+        response = RedirectResponse(url=authorization_url)
+        set_state_cookie(response, provider.name, nonce)
+        return response
 
-        email = user_data["email"]
-        first_name = user_data.get("given_name")
-        last_name = user_data.get("family_name")
-        picture = user_data.get("picture")
+    async def oauth_callback(request: Request, user_manager: UserManager = Depends(get_user_manager)):
+        def fail(error: str, description: str) -> RedirectResponse:
+            record_login(request, error, provider.name)
+            response = auth_error_redirect(error, description)
+            clear_state_cookie(response, provider.name)
+            return response
 
-        # Check if user exists, if not, create a new user
-        try:
-            user = await user_manager.get_by_email(email)
-            logging.info(f"Existing user found: {user}")
-        except Exception as e:
-            logging.error(f"Error getting user by email: {str(e)}")
-            user = None
-
-        if user is None:
-            try:
-                user = await user_manager.create(
-                    UserCreate(
-                        email=email,
-                        password=secrets.token_urlsafe(32),
-                        first_name=first_name,
-                        last_name=last_name,
-                        picture=picture,
-                        oauth_provider="google"
-                    )
-                )
-                logging.info(f"New user created: {user}")
-            except Exception as e:
-                logging.error(f"Error creating new user: {str(e)}")
-                raise HTTPException(status_code=500, detail="Failed to create new user")
-        else:
-            # 更新现有用户的信息
-            user.first_name = first_name
-            user.last_name = last_name
-            user.picture = picture
-            user.oauth_provider = "google"
-            await user.save()
-            logging.info(f"User updated: {user}")
-
-        # Create access token
+        code = request.query_params.get("code")
+        if not code:
+            return fail("missing_code", "Missing authorization code")
+        # state 必须由同一个浏览器发起：cookie 里的 nonce 与 state 里签名的 nonce 一致
+        nonce = request.cookies.get(STATE_COOKIE_NAME)
+        if not nonce or not await state_store.verify(request.query_params.get("state"), provider.name, nonce):
+            return fail("invalid_state", "Invalid or expired state")
         try:
-            access_token = await auth_backend.get_strategy().write_token(user)
-            logging.debug(f"Access token created: {access_token}")
+            with track_stage("oauth_login", provider.name):
+                access_token, refresh_token, user_id = await complete_oauth_login(provider, code, user_manager)
+        except ProviderError as e:
+            logging.warning("%s is unavailable during callback: %s", provider.name, e)
+            return fail("provider_unavailable", f"{provider.name} is not responding, please try again later")
         except Exception as e:
-            logging.error(f"Error creating access token: {str(e)}")
-            raise HTTPException(status_code=500, detail="Failed to create access token")
-
-        # Redirect to success page with access token
-        return RedirectResponse(url=f"/auth-success?access_token={access_token}")
-
-    except ValueError as ve:
-        logging.error(f"ValueError in google_oauth_callback: {str(ve)}")
-        raise HTTPException(status_code=400, detail=str(ve))
-    except Exception as e:
-        logging.error(f"Error in google_oauth_callback: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Failed to process Google OAuth callback: {str(e)}")
-
-# 确保这行在定义了所有 oauth_router 路由之后
-app.include_router(oauth_router, prefix="/auth/google", tags=["auth"])
+            logging.error("Error in %s callback: %s", provider.name, e)
+            return fail("unexpected_error", str(e))
+
+        record_login(request, "success", provider.name, user_id)
+        # 重定向到成功页面，URL 里只带短期的 access token；refresh token 放在 HttpOnly cookie 里，
+        # 不进入浏览器历史、Referer 和访问日志
+        response = RedirectResponse(url=f"/auth-success?{urlencode({'access_token': access_token})}")
+        set_refresh_cookie(response, refresh_token)
+        clear_state_cookie(response, provider.name)
+        return response
+
+    router.add_api_route("/login", oauth_login, methods=["GET"], name=f"{provider.name}_oauth_login")
+    router.add_api_route("/callback", oauth_callback, methods=["GET"], name=f"{provider.name}_oauth_callback")
+    return router
+
+
+# 为每个已注册的 OAuth 提供商添加登录路由，以及已登录用户关联该提供商账号的路由
+for provider in providers.values():
+    app.include_router(
+        build_oauth_router(provider), prefix=f"/auth/{provider.name}", tags=["auth"], dependencies=[oauth_admission]
+    )
+    app.include_router(
+        get_oauth_associate_router(provider.name),
+        prefix=f"/auth/{provider.name}/associate",
+        tags=["auth"],
+        dependencies=[oauth_admission],
+    )
 
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to the FastAPI Google OAuth example!"}
 
 @app.get("/protected-route")
-async def protected_route(user: User = Depends(current_active_user)):
+async def protected_route(user: User = Depends(read_only_user)):
     oauth_provider = user.oauth_provider or "Email"
-    
-    # 打印获取到的用户信息
-    logger.info(f"User info: {user.dict()}")
-    
+
+    # 高频路由，只记录用户 id，并按 LOG_SAMPLE_RATES 采样
+    protected_route_logger.info("Protected route accessed by user %s", user.id)
+
     return {
         "message": f"Hello, {user.first_name or ''} {user.last_name or ''}!",
         "email": user.email,
@@ -170,244 +219,60 @@ async def protected_route(user: User = Depends(current_active_user)):
         "last_name": user.last_name,
         "picture": user.picture,
         "oauth_provider": oauth_provider,
-        "additional_info": f"You logged in using {oauth_provider} authentication."
+        "linked_providers": user.linked_providers,
+        # oauth_provider 是注册时使用的方式，不是本次登录的提供商（token 里不记录登录方式）
+        "additional_info": f"You registered with {oauth_provider} authentication."
+        + (f" Linked sign-in providers: {', '.join(user.linked_providers)}." if user.linked_providers else "")
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 @app.get("/test")
 async def test_route():
     return {"message": "Test route is working"}
 
-@app.get("/test-oauth-client")
-async def test_oauth_client():
-    state = secrets.token_urlsafe(16)
-    authorization_url = await google_oauth_client.get_authorization_url(
-        "http://localhost:8000/auth/google/callback",
-        state=state
-    )
-    return {"authorization_url": authorization_url}
-
-@app.get("/auth-success", response_class=HTMLResponse)
-async def auth_success(access_token: str):
-    return f"""
-    <html>
-        <head>
-            <title>Authentication Successful</title>
-        </head>
-        <body>
-            <h1>Authentication Successful</h1>
-            <p>Your access token is: {access_token}</p>
-            <script>
-                // 这里可以添加将令牌存储到localStorage的代码
-                localStorage.setItem('access_token', '{access_token}');
-            </script>
-        </body>
-    </html>
-    """
-
-# LinkedIn OAuth routes
-linkedin_oauth_router = APIRouter()
-
-@linkedin_oauth_router.get("/login")
-async def linkedin_login():
-    redirect_uri = "http://localhost:8000/auth/linkedin/callback"
-    state = secrets.token_urlsafe(16)
-    authorization_url = await linkedin_oauth_client.get_authorization_url(redirect_uri, state)
-    return RedirectResponse(url=authorization_url)
-
-@app.get("/auth/linkedin/callback")
-async def linkedin_callback(request: Request, user_manager: UserManager = Depends(get_user_manager)):
+async def test_authorization_url(name: str, response: Response) -> dict:
     try:
-        code = request.query_params.get("code")
-        if not code:
-            raise HTTPException(status_code=400, detail="Missing authorization code")
-
-        redirect_uri = "http://localhost:8000/auth/linkedin/callback"
-        token = await linkedin_oauth_client.get_access_token(code, redirect_uri)
-        logging.debug(f"Received LinkedIn token: {token}")
-
-        # 使用 OpenID Connect 的 userinfo 端点获取用户信息
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://api.linkedin.com/v2/userinfo",
-                headers={"Authorization": f"Bearer {token['access_token']}"},
-            )
-            response.raise_for_status()
-            user_data = response.json()
-            logging.info(f"Received LinkedIn user data: {user_data}")
-
-        email = user_data.get("email")
-        first_name = user_data.get("given_name")
-        last_name = user_data.get("family_name")
-        picture = user_data.get("picture")
-
-        if not email:
-            raise HTTPException(status_code=400, detail="Email not found in user data")
-
-        # 检查用户是否存在，如果不存在则创建新用户
-        try:
-            user = await user_manager.get_by_email(email)
-        except Exception:
-            user = None
-
-        if user is None:
-            user = await user_manager.create(
-                UserCreate(
-                    email=email,
-                    password=secrets.token_urlsafe(32),
-                    first_name=first_name,
-                    last_name=last_name,
-                    picture=picture,
-                    oauth_provider="linkedin"
-                )
-            )
-            logging.info(f"New user created: {user.dict()}")
-        else:
-            # 更新现有用户的信息
-            user.first_name = first_name
-            user.last_name = last_name
-            user.picture = picture
-            user.oauth_provider = "linkedin"
-            await user.save()
-            logging.info(f"User updated: {user.dict()}")
-
-        # 创建访问令牌
-        access_token = await auth_backend.get_strategy().write_token(user)
-        logging.debug(f"Access token created: {access_token}")
-
-        # 重定向到成功页面，带上访问令牌
-        return RedirectResponse(url=f"/auth-success?access_token={access_token}")
-
-    except Exception as e:
-        logging.error(f"Error in LinkedIn callback: {str(e)}")
-        return RedirectResponse(url=f"/auth-error?error=unexpected_error&description={str(e)}")
-
-# 添加 LinkedIn OAuth 路由
-app.include_router(linkedin_oauth_router, prefix="/auth/linkedin", tags=["auth"])
-
-# 修改测试路由
-@app.get("/test-linkedin-oauth-client")
-async def test_linkedin_oauth_client():
-    state = secrets.token_urlsafe(16)
-    authorization_url = await linkedin_oauth_client.get_authorization_url(
-        "http://localhost:8000/auth/linkedin/callback",
-        state=state
-    )
+        provider = get_provider(name)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"OAuth provider {name} is not configured")
+    nonce = new_nonce()
+    state = await state_store.mint(name, nonce)
+    authorization_url = await provider.client.get_authorization_url(provider.redirect_uri, state=state)
+    set_state_cookie(response, name, nonce)
     return {"authorization_url": authorization_url}
 
-@app.get("/auth-error")
-async def auth_error(error: str, description: str):
-    return {"message": "Authentication failed", "error": error, "description": description}
+@app.get("/test-oauth-client")
+async def test_oauth_client(response: Response):
+    return await test_authorization_url("google", response)
 
 @app.get("/auth-success")
-async def auth_success(access_token: str):
-    return {"message": "Authentication successful", "access_token": access_token}
-
-# Facebook OAuth routes
-facebook_oauth_router = APIRouter()
+async def auth_success(request: Request, access_token: str):
+    return render_auth_success(request, access_token)
 
-@facebook_oauth_router.get("/login")
-async def facebook_login():
-    redirect_uri = "http://localhost:8000/auth/facebook/callback"
-    state = secrets.token_urlsafe(16)
-    authorization_url = await facebook_oauth_client.get_authorization_url(redirect_uri, state)
-    return RedirectResponse(url=authorization_url)
-
-@app.get("/auth/facebook/callback")
-async def facebook_callback(request: Request, user_manager: UserManager = Depends(get_user_manager)):
-    try:
-        code = request.query_params.get("code")
-        if not code:
-            raise HTTPException(status_code=400, detail="Missing authorization code")
-
-        redirect_uri = "http://localhost:8000/auth/facebook/callback"
-        token = await facebook_oauth_client.get_access_token(code, redirect_uri)
-        logging.debug(f"Received Facebook token: {token}")
-
-        user_data = await facebook_oauth_client.get_id_email(token["access_token"])
-        logging.info(f"Received Facebook user data: {user_data}")
-
-        # 假设 get_id_email 返回一个元组 (id, email)
-        account_id, email = user_data
-
-        if not email:
-            raise HTTPException(status_code=400, detail="Email not found in user data")
-
-        # 获取额外的用户信息
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://graph.facebook.com/v12.0/me?fields=id,first_name,last_name,picture&access_token={token['access_token']}"
-            )
-            response.raise_for_status()
-            profile_data = response.json()
-            logging.info(f"Received Facebook profile data: {profile_data}")
-
-        first_name = profile_data.get("first_name")
-        last_name = profile_data.get("last_name")
-        picture = profile_data.get("picture", {}).get("data", {}).get("url")
-
-        # 检查用户是否存在，如果不存在则创建新用户
-        try:
-            user = await user_manager.get_by_email(email)
-        except Exception:
-            user = None
-
-        if user is None:
-            user = await user_manager.create(
-                UserCreate(
-                    email=email,
-                    password=secrets.token_urlsafe(32),
-                    first_name=first_name,
-                    last_name=last_name,
-                    picture=picture,
-                    oauth_provider="facebook"
-                )
-            )
-            logging.info(f"New user created: {user.dict()}")
-        else:
-            # 更新现有用户的信息
-            user.first_name = first_name
-            user.last_name = last_name
-            user.picture = picture
-            user.oauth_provider = "facebook"
-            await user.save()
-            logging.info(f"User updated: {user.dict()}")
-
-        # 创建访问令牌
-        access_token = await auth_backend.get_strategy().write_token(user)
-        logging.debug(f"Access token created: {access_token}")
-
-        # 重定向到成功页面，带上访问令牌
-        return RedirectResponse(url=f"/auth-success?access_token={access_token}")
+@app.get("/auth-error")
+async def auth_error(request: Request, error: str, description: str):
+    return render_auth_error(request, error, description)
 
-    except Exception as e:
-        logging.error(f"Error in Facebook callback: {str(e)}")
-        return RedirectResponse(url=f"/auth-error?error=unexpected_error&description={str(e)}")
+@app.get("/static/auth-success.js", include_in_schema=False)
+async def auth_success_js(request: Request):
+    return auth_success_script(request)
 
-# 添加 Facebook OAuth 路由
-app.include_router(facebook_oauth_router, prefix="/auth/facebook", tags=["auth"])
+# 修改测试路由
+@app.get("/test-linkedin-oauth-client")
+async def test_linkedin_oauth_client(response: Response):
+    return await test_authorization_url("linkedin", response)
 
 # 修改测试路由
 @app.get("/test-facebook-oauth-client")
-async def test_facebook_oauth_client():
-    state = secrets.token_urlsafe(16)
-    authorization_url = await facebook_oauth_client.get_authorization_url(
-        "http://localhost:8000/auth/facebook/callback",
-        state=state
-    )
-    return {"authorization_url": authorization_url}
+async def test_facebook_oauth_client(response: Response):
+    return await test_authorization_url("facebook", response)
 
 if __name__ == "__main__":
+    # 开发模式：单进程 + 自动重载；生产环境使用 python -m app.server
     import uvicorn
-    
-    print("Registered routes:")
-    for route in app.routes:
-        print(f"Path: {route.path}")
-        print(f"Name: {route.name}")
-        print(f"Methods: {route.methods}")
-        print("---")
-    
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True, log_level="debug")
 
-# 在所有 app.include_router() 调用之后添加
-for route in app.routes:
-    logger.debug(f"Registered route: {route.path}")
\ No newline at end of file
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True, log_level="debug")
@@ -0,0 +1,171 @@
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+from app.config import SLOW_REQUEST_SECONDS
+
+STAGE_LATENCY = Histogram(
+    "auth_stage_duration_seconds",
+    "Duration of each stage of the authentication flows",
+    ["stage", "provider", "outcome"],
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request duration by route",
+    ["method", "route", "status"],
+)
+HASH_QUEUE_WAIT = Histogram(
+    "password_hash_queue_wait_seconds",
+    "Time spent waiting for a password hashing worker",
+)
+HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Password hashing calls rejected because the queue was full",
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total",
+    "Requests shed by rate limiting (429) or concurrency caps (503)",
+    ["route_class", "reason"],
+)
+PROVIDER_CALLS = Counter(
+    "provider_calls_total",
+    "Calls to OAuth providers; outcome is success, error, timeout, circuit_open or deadline_exceeded",
+    ["provider", "call", "outcome"],
+)
+PROVIDER_RETRIES = Counter(
+    "provider_retries_total",
+    "Retried OAuth provider calls",
+    ["provider", "call"],
+)
+PROVIDER_HEDGES = Counter(
+    "provider_hedged_requests_total",
+    "Hedged OAuth provider requests; result=sent when the backup request was issued, won when it answered first",
+    ["provider", "call", "result"],
+)
+PROVIDER_CIRCUIT_STATE = Gauge(
+    "provider_circuit_state",
+    "Circuit breaker state per OAuth provider: 0 closed, 1 half-open, 2 open",
+    ["provider"],
+    multiprocess_mode="max",
+)
+JOB_EVENTS = Counter(
+    "background_jobs_total",
+    "Background jobs by kind; outcome is submitted, rejected (queue full or stopped), done or failed",
+    ["kind", "outcome"],
+)
+JOB_QUEUE_DEPTH = Gauge(
+    "background_job_queue_depth",
+    "Jobs waiting in the in-process background queue",
+    multiprocess_mode="livesum",
+)
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total",
+    "Deduplicated async lookups; role=coalesced counts calls that reused an in-flight result",
+    ["group", "role"],
+)
+USER_CACHE_EVENTS = Gauge(
+    "user_cache_events",
+    "Authenticated user cache counters",
+    ["event"],
+    # 多 worker 时按存活进程求和（单进程模式下忽略该参数）
+    multiprocess_mode="livesum",
+)
+
+# 当前请求内记录的各阶段耗时，用于请求级别的 span 和 Server-Timing 头
+_spans: contextvars.ContextVar[list | None] = contextvars.ContextVar("auth_spans", default=None)
+
+
+@contextmanager
+def track_stage(stage: str, provider: str = "none"):
+    """记录一个阶段的耗时，按 stage/provider/outcome 写入直方图"""
+    started_at = time.perf_counter()
+    outcome = "success"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started_at
+        STAGE_LATENCY.labels(stage=stage, provider=provider, outcome=outcome).observe(elapsed)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def current_spans() -> dict[str, float]:
+    """当前请求内已经记录的各阶段耗时（毫秒），用于登录审计事件"""
+    return {stage: round(elapsed * 1000, 2) for stage, elapsed in _spans.get() or []}
+
+
+_route_templates: dict[int, str] = {}
+
+
+def _walk_routes(routes, prefix: str = ""):
+    for route in routes:
+        # include_router 挂载的子路由只记录自己的相对路径，前缀在外层的 include 上下文里
+        included = getattr(route, "original_router", None)
+        if included is not None:
+            yield from _walk_routes(included.routes, prefix + route.include_context.prefix)
+        elif hasattr(route, "path_format"):
+            yield route, prefix + route.path_format
+
+
+def route_template(request) -> str:
+    """请求命中的完整路由模板，如 /auth/google/callback；未命中路由时为 unmatched"""
+    route = request.scope.get("route")
+    if route is None:
+        return "unmatched"
+    template = _route_templates.get(id(route))
+    if template is None:
+        _route_templates.update({id(r): path for r, path in _walk_routes(request.app.routes)})
+        template = _route_templates.setdefault(id(route), getattr(route, "path_format", "unmatched"))
+    return template
+
+
+async def metrics_middleware(request, call_next):
+    spans = []
+    token = _spans.set(spans)
+    started_at = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started_at
+        _spans.reset(token)
+        route_path = route_template(request)
+        REQUEST_LATENCY.labels(method=request.method, route=route_path, status=status).observe(elapsed)
+        if elapsed >= SLOW_REQUEST_SECONDS:
+            logging.warning(
+                "Slow request %s %s took %.3fs, spans: %s",
+                request.method, route_path, elapsed,
+                ", ".join(f"{name}={seconds:.3f}s" for name, seconds in spans),
+            )
+
+    if spans:
+        response.headers["Server-Timing"] = ", ".join(
+            f"{name};dur={seconds * 1000:.1f}" for name, seconds in spans
+        )
+    return response
+
+
+def render_metrics() -> tuple[bytes, str]:
+    from app.cache import user_cache
+
+    stats = user_cache.stats()
+    USER_CACHE_EVENTS.labels(event="hits").set(stats["hits"])
+    USER_CACHE_EVENTS.labels(event="misses").set(stats["misses"])
+    USER_CACHE_EVENTS.labels(event="size").set(stats["size"])
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # app.server 启动多个 worker 时，汇总所有 worker 写入的指标文件
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,9 +1,17 @@
 from fastapi_users import schemas
 from beanie import Document
-from pydantic import Field, EmailStr
+from pydantic import BaseModel, ConfigDict, Field, EmailStr
 from typing import Optional
+from datetime import datetime
 from fastapi_users.db import BeanieBaseUser
 from beanie import PydanticObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+class OAuthAccount(BaseModel):
+    """用户关联的一个提供商账号，(provider, account_id) 在所有用户中唯一"""
+    provider: str
+    account_id: str
+    last_login: Optional[datetime] = None
 
 class User(BeanieBaseUser, Document):
     email: EmailStr
@@ -11,11 +19,42 @@ class User(BeanieBaseUser, Document):
     first_name: Optional[str] = None
     last_name: Optional[str] = None
     picture: Optional[str] = None
-    oauth_provider: Optional[str] = None  # 'google' or 'linkedin'
+    oauth_provider: Optional[str] = None  # 注册时使用的提供商，之后用其他提供商登录不再改写
+    oauth_accounts: list[OAuthAccount] = Field(default_factory=list)
+
+    @property
+    def linked_providers(self) -> list[str]:
+        """可以用来登录的提供商（已关联的账号），与注册时的 oauth_provider 不一定相同"""
+        return sorted({account.provider for account in self.oauth_accounts})
     
     class Settings:
         name = "users"
         email_collation = None
+        # _id（ObjectId）按创建时间递增，列表接口按 _id 倒序即按注册时间从新到旧；
+        # 每种筛选组合都有以 _id（或 email 前缀查询时以 email）结尾的复合索引，翻页只扫描一页的索引项（见 app/user_listing.py）
+        indexes = [
+            IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+            IndexModel([("oauth_provider", ASCENDING), ("_id", DESCENDING)], name="provider_recency"),
+            IndexModel([("is_active", ASCENDING), ("_id", DESCENDING)], name="active_recency"),
+            IndexModel(
+                [("oauth_provider", ASCENDING), ("is_active", ASCENDING), ("_id", DESCENDING)],
+                name="provider_active_recency",
+            ),
+            # email 前缀和其他筛选组合时按 email 排序：等值字段在前、email 在后，范围扫描只覆盖匹配的用户
+            IndexModel([("oauth_provider", ASCENDING), ("email", ASCENDING)], name="provider_email"),
+            IndexModel([("is_active", ASCENDING), ("email", ASCENDING)], name="active_email"),
+            IndexModel(
+                [("oauth_provider", ASCENDING), ("is_active", ASCENDING), ("email", ASCENDING)],
+                name="provider_active_email",
+            ),
+            # 多键唯一索引：OAuth 登录按提供商身份一次索引查找；没有关联账号的用户不进入索引
+            IndexModel(
+                [("oauth_accounts.provider", ASCENDING), ("oauth_accounts.account_id", ASCENDING)],
+                name="oauth_identity",
+                unique=True,
+                partialFilterExpression={"oauth_accounts.account_id": {"$exists": True}},
+            ),
+        ]
 
     class Config:
         json_schema_extra = {
@@ -29,9 +68,37 @@ class User(BeanieBaseUser, Document):
                 "last_name": "Doe",
                 "picture": "https://example.com/avatar.jpg",
                 "oauth_provider": "google",
+                "oauth_accounts": [
+                    {"provider": "google", "account_id": "1234567890", "last_login": "2024-01-01T00:00:00Z"},
+                ],
             }
         }
 
+class UserImport(BaseModel):
+    """批量导入的一行；严格类型，不做 "yes" -> True 之类的转换，未知字段忽略"""
+    model_config = ConfigDict(strict=True)
+
+    email: EmailStr
+    hashed_password: Optional[str] = Field(default=None, min_length=1)
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    picture: Optional[str] = None
+    oauth_provider: Optional[str] = None
+    is_active: Optional[bool] = None
+    is_superuser: Optional[bool] = None
+    is_verified: Optional[bool] = None
+
+class TokenUser(BaseModel):
+    """从已签名的 JWT claims 构造的只读用户信息"""
+    id: PydanticObjectId
+    email: EmailStr
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    picture: Optional[str] = None
+    oauth_provider: Optional[str] = None
+    linked_providers: list[str] = Field(default_factory=list)
+    is_active: bool = True
+
 class UserCreate(schemas.BaseUserCreate):
     pass
 
@@ -39,6 +106,6 @@ class UserUpdate(schemas.BaseUserUpdate):
     pass
 
 class UserRead(schemas.BaseUser[PydanticObjectId]):
-    pass
+    oauth_accounts: list[OAuthAccount] = Field(default_factory=list)
 
 # Remove the UserDB class as it's no longer needed
\ No newline at end of file
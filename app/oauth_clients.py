@@ -1,17 +1,83 @@
+from httpx_oauth.clients.google import GoogleOAuth2
 from httpx_oauth.clients.linkedin import LinkedInOAuth2
 from httpx_oauth.clients.facebook import FacebookOAuth2
-from app.config import LINKEDIN_CLIENT_ID, LINKEDIN_CLIENT_SECRET, FACEBOOK_CLIENT_ID, FACEBOOK_CLIENT_SECRET
-
-linkedin_oauth_client = LinkedInOAuth2(
-    client_id=LINKEDIN_CLIENT_ID,
-    client_secret=LINKEDIN_CLIENT_SECRET,
-    scopes=["openid", "profile", "email"]  # 使用 OpenID Connect 标准的 scopes
-)
-
-facebook_oauth_client = FacebookOAuth2(
-    client_id=FACEBOOK_CLIENT_ID,
-    client_secret=FACEBOOK_CLIENT_SECRET,
-    scopes=["email", "public_profile"]
-)
+from app.config import GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, LINKEDIN_CLIENT_ID, LINKEDIN_CLIENT_SECRET, FACEBOOK_CLIENT_ID, FACEBOOK_CLIENT_SECRET, OAUTH_MOCK_BASE_URL
+from app.http_client import SharedHTTPClientMixin, get_http_client
+import logging
+
+GOOGLE_USERINFO_ENDPOINT = "https://www.googleapis.com/oauth2/v2/userinfo"
+LINKEDIN_USERINFO_ENDPOINT = "https://api.linkedin.com/v2/userinfo"
+FACEBOOK_PROFILE_ENDPOINT = "https://graph.facebook.com/v12.0/me"
+GOOGLE_DISCOVERY_ENDPOINT = "https://accounts.google.com/.well-known/openid-configuration"
+LINKEDIN_DISCOVERY_ENDPOINT = "https://www.linkedin.com/oauth/.well-known/openid-configuration"
+
+if OAUTH_MOCK_BASE_URL:
+    GOOGLE_USERINFO_ENDPOINT = f"{OAUTH_MOCK_BASE_URL}/google/userinfo"
+    LINKEDIN_USERINFO_ENDPOINT = f"{OAUTH_MOCK_BASE_URL}/linkedin/userinfo"
+    FACEBOOK_PROFILE_ENDPOINT = f"{OAUTH_MOCK_BASE_URL}/facebook/me"
+    GOOGLE_DISCOVERY_ENDPOINT = f"{OAUTH_MOCK_BASE_URL}/google/.well-known/openid-configuration"
+    LINKEDIN_DISCOVERY_ENDPOINT = f"{OAUTH_MOCK_BASE_URL}/linkedin/.well-known/openid-configuration"
+
+
+class CustomGoogleOAuth2(SharedHTTPClientMixin, GoogleOAuth2):
+    async def get_id_email(self, token: str):
+        client = get_http_client()
+        response = await client.get(
+            GOOGLE_USERINFO_ENDPOINT,
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        return {
+            "id": data.get("id"),
+            "email": data.get("email"),
+            "given_name": data.get("given_name"),
+            "family_name": data.get("family_name"),
+            "picture": data.get("picture")
+        }
+
+
+
+class SharedLinkedInOAuth2(SharedHTTPClientMixin, LinkedInOAuth2):
+    pass
+
+
+class SharedFacebookOAuth2(SharedHTTPClientMixin, FacebookOAuth2):
+    pass
+
+
+def use_mock_endpoints(name: str, client):
+    # 本地压测时把授权和换取 token 的端点也指向模拟服务
+    if OAUTH_MOCK_BASE_URL:
+        client.authorize_endpoint = f"{OAUTH_MOCK_BASE_URL}/{name}/authorize"
+        client.access_token_endpoint = f"{OAUTH_MOCK_BASE_URL}/{name}/token"
+        logging.warning("OAuth provider %s is using the mock provider at %s", name, OAUTH_MOCK_BASE_URL)
+    return client
+
+
+# 客户端按需创建：只有用到（并且已配置）的提供商才会实例化
+def create_google_oauth_client() -> CustomGoogleOAuth2:
+    return use_mock_endpoints("google", CustomGoogleOAuth2(
+        client_id=GOOGLE_CLIENT_ID,
+        client_secret=GOOGLE_CLIENT_SECRET,
+        scopes=["openid", "email", "profile"]
+    ))
+
+
+def create_linkedin_oauth_client() -> SharedLinkedInOAuth2:
+    return use_mock_endpoints("linkedin", SharedLinkedInOAuth2(
+        client_id=LINKEDIN_CLIENT_ID,
+        client_secret=LINKEDIN_CLIENT_SECRET,
+        scopes=["openid", "profile", "email"]  # 使用 OpenID Connect 标准的 scopes
+    ))
+
+
+def create_facebook_oauth_client() -> SharedFacebookOAuth2:
+    return use_mock_endpoints("facebook", SharedFacebookOAuth2(
+        client_id=FACEBOOK_CLIENT_ID,
+        client_secret=FACEBOOK_CLIENT_SECRET,
+        scopes=["email", "public_profile"]
+    ))
 
 # 移除 Twitter 相关代码
\ No newline at end of file
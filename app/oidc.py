@@ -0,0 +1,142 @@
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Any
+
+import jwt
+
+from app.config import OIDC_CACHE_TTL_SECONDS, OIDC_REFRESH_MIN_INTERVAL_SECONDS
+from app.http_client import get_http_client
+from app.resilience import ProviderResilience
+
+ALLOWED_ALGORITHMS = ["RS256", "ES256"]
+
+
+class StaleWhileRevalidateValue:
+    """单个远程 JSON 文档的缓存：过期后先返回旧值，同时在后台刷新
+
+    设置了 resilience 时下载经过提供商的容错层（重试、熔断、登录时限），call 是指标里的调用名。
+    """
+
+    def __init__(self, url: str, ttl_seconds: float, resilience: ProviderResilience | None = None, call: str = "oidc"):
+        self.url = url
+        self.ttl_seconds = ttl_seconds
+        self.resilience = resilience
+        self.call = call
+        self.value: dict[str, Any] | None = None
+        self.fetched_at = 0.0
+        self._refresh_task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    async def _download(self) -> dict[str, Any]:
+        response = await get_http_client().get(self.url)
+        response.raise_for_status()
+        return response.json()
+
+    async def _fetch(self) -> dict[str, Any]:
+        if self.resilience is None:
+            self.value = await self._download()
+        else:
+            self.value = await self.resilience.call(self.call, self._download)
+        self.fetched_at = time.monotonic()
+        logging.debug("Fetched OIDC document %s", self.url)
+        return self.value
+
+    async def refresh(self) -> dict[str, Any]:
+        # 并发的刷新请求合并为一次
+        async with self._lock:
+            if self.value is not None and time.monotonic() - self.fetched_at < OIDC_REFRESH_MIN_INTERVAL_SECONDS:
+                return self.value
+            return await self._fetch()
+
+    def _refresh_in_background(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            # 空的 context：后台刷新不继承触发它的请求的登录时限
+            self._refresh_task = asyncio.create_task(self._background_refresh(), context=contextvars.Context())
+
+    async def _background_refresh(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logging.warning("Background refresh of %s failed: %s", self.url, e)
+
+    async def get(self) -> dict[str, Any]:
+        if self.value is None:
+            return await self.refresh()
+        if time.monotonic() - self.fetched_at >= self.ttl_seconds:
+            self._refresh_in_background()
+        return self.value
+
+
+class OIDCProvider:
+    """缓存 discovery 文档和 JWKS，本地校验 id_token
+
+    resilience 由所属的 OAuthProvider 注入，与该提供商的其他调用共用同一个熔断器。
+    """
+
+    def __init__(
+        self,
+        discovery_url: str,
+        ttl_seconds: float = OIDC_CACHE_TTL_SECONDS,
+        resilience: ProviderResilience | None = None,
+    ):
+        self.discovery = StaleWhileRevalidateValue(discovery_url, ttl_seconds, resilience, "oidc_discovery")
+        self.ttl_seconds = ttl_seconds
+        self.jwks: StaleWhileRevalidateValue | None = None
+
+    @property
+    def resilience(self) -> ProviderResilience | None:
+        return self.discovery.resilience
+
+    @resilience.setter
+    def resilience(self, resilience: ProviderResilience | None):
+        self.discovery.resilience = resilience
+        if self.jwks is not None:
+            self.jwks.resilience = resilience
+
+    async def _get_jwks(self) -> StaleWhileRevalidateValue:
+        discovery = await self.discovery.get()
+        jwks_uri = discovery["jwks_uri"]
+        if self.jwks is None or self.jwks.url != jwks_uri:
+            self.jwks = StaleWhileRevalidateValue(jwks_uri, self.ttl_seconds, self.resilience, "jwks")
+        return self.jwks
+
+    @staticmethod
+    def _find_key(jwks: dict[str, Any], kid: str | None) -> dict[str, Any] | None:
+        for key in jwks.get("keys", []):
+            if kid is None or key.get("kid") == kid:
+                return key
+        return None
+
+    async def get_signing_key(self, kid: str | None) -> jwt.PyJWK:
+        jwks_cache = await self._get_jwks()
+        key = self._find_key(await jwks_cache.get(), kid)
+        if key is None:
+            # 未知的 kid 说明提供商可能轮换了密钥，立即刷新一次
+            key = self._find_key(await jwks_cache.refresh(), kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"No signing key found for kid {kid}")
+        return jwt.PyJWK(key)
+
+    async def warm_up(self):
+        """启动时预取 discovery 和 JWKS，失败不影响启动"""
+        try:
+            jwks_cache = await self._get_jwks()
+            await jwks_cache.get()
+        except Exception as e:
+            logging.warning("Failed to warm up OIDC cache %s: %s", self.discovery.url, e)
+
+    async def verify_id_token(self, id_token: str, audience: str | None) -> dict[str, Any]:
+        header = jwt.get_unverified_header(id_token)
+        if header.get("alg") not in ALLOWED_ALGORITHMS:
+            raise jwt.InvalidAlgorithmError(f"Unsupported id_token algorithm {header.get('alg')}")
+        signing_key = await self.get_signing_key(header.get("kid"))
+        discovery = await self.discovery.get()
+        return jwt.decode(
+            id_token,
+            signing_key,
+            algorithms=ALLOWED_ALGORITHMS,
+            audience=audience,
+            issuer=discovery["issuer"],
+        )
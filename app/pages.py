@@ -0,0 +1,108 @@
+import hashlib
+import html
+from string import Template
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+
+# 页面骨架；$title/$body 在导入时展开，其余占位符在请求时填入转义后的值
+_PAGE = Template("""<!DOCTYPE html>
+<html>
+    <head>
+        <meta charset="utf-8">
+        <title>$title</title>
+    </head>
+    <body>
+        <h1>$title</h1>
+        $body
+    </body>
+</html>
+""")
+
+_SUCCESS_BODY = """<p>Your access token is: <code id="access-token">$access_token</code></p>
+        <div id="auth-tokens" data-access-token="$access_token" hidden></div>
+        <script src="/static/auth-success.js"></script>"""
+
+_ERROR_BODY = """<p>Error: $error</p>
+        <p>$description</p>"""
+
+
+class CompiledPage:
+    """导入时把页面骨架和标题展开，并按 $name 占位符切成片段。
+
+    渲染时只需把转义后的值和静态片段 join 起来，避免每次请求都跑
+    Template.substitute 的正则或 str.format 的解析。
+    """
+
+    def __init__(self, title: str, body: str):
+        page = _PAGE.substitute(title=html.escape(title), body=body)
+        self.parts: list[str] = []
+        self.names: list[str] = []
+        last = 0
+        for match in Template.pattern.finditer(page):
+            name = match.group("named") or match.group("braced")
+            if name is None:
+                continue
+            self.parts.append(page[last:match.start()])
+            self.names.append(name)
+            last = match.end()
+        self.parts.append(page[last:])
+
+    def render(self, **values: str) -> str:
+        escaped = {name: html.escape(value) for name, value in values.items()}
+        chunks = [self.parts[0]]
+        for name, part in zip(self.names, self.parts[1:]):
+            chunks.append(escaped[name])
+            chunks.append(part)
+        return "".join(chunks)
+
+
+_SUCCESS_PAGE = CompiledPage("Authentication Successful", _SUCCESS_BODY)
+_ERROR_PAGE = CompiledPage("Authentication Failed", _ERROR_BODY)
+
+# 把 access token 存到 localStorage 的脚本是静态的，可以被浏览器长期缓存；
+# refresh token 在 HttpOnly cookie 里，脚本读不到，用 POST /auth/jwt/refresh 续期
+AUTH_SUCCESS_JS = """(function () {
+    var tokens = document.getElementById("auth-tokens").dataset;
+    localStorage.setItem("access_token", tokens.accessToken);
+})();
+""".encode()
+AUTH_SUCCESS_JS_ETAG = f'"{hashlib.sha256(AUTH_SUCCESS_JS).hexdigest()[:16]}"'
+
+# 页面里带有令牌，不能被任何缓存保存
+NO_STORE_HEADERS = {"Cache-Control": "no-store"}
+STATIC_CACHE_HEADERS = {"Cache-Control": "public, max-age=86400", "ETag": AUTH_SUCCESS_JS_ETAG}
+
+
+def wants_html(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return "text/html" in accept
+
+
+def render_success_html(access_token: str) -> str:
+    return _SUCCESS_PAGE.render(access_token=access_token)
+
+
+def render_error_html(error: str, description: str) -> str:
+    return _ERROR_PAGE.render(error=error, description=description)
+
+
+def render_auth_success(request: Request, access_token: str) -> Response:
+    if not wants_html(request):
+        return JSONResponse({"message": "Authentication successful", "access_token": access_token}, headers=NO_STORE_HEADERS)
+    return HTMLResponse(render_success_html(access_token), headers=NO_STORE_HEADERS)
+
+
+def render_auth_error(request: Request, error: str, description: str) -> Response:
+    if not wants_html(request):
+        return JSONResponse(
+            {"message": "Authentication failed", "error": error, "description": description},
+            headers=NO_STORE_HEADERS,
+        )
+    return HTMLResponse(render_error_html(error, description), headers=NO_STORE_HEADERS)
+
+
+def auth_success_script(request: Request) -> Response:
+    if request.headers.get("if-none-match") == AUTH_SUCCESS_JS_ETAG:
+        return Response(status_code=304, headers=STATIC_CACHE_HEADERS)
+    return Response(AUTH_SUCCESS_JS, media_type="application/javascript", headers=STATIC_CACHE_HEADERS)
@@ -0,0 +1,198 @@
+import logging
+from typing import Any, Awaitable, Callable
+
+from httpx_oauth.oauth2 import BaseOAuth2
+
+from app.oauth_clients import (
+    create_google_oauth_client,
+    create_linkedin_oauth_client,
+    create_facebook_oauth_client,
+    LINKEDIN_USERINFO_ENDPOINT,
+    FACEBOOK_PROFILE_ENDPOINT,
+    GOOGLE_DISCOVERY_ENDPOINT,
+    LINKEDIN_DISCOVERY_ENDPOINT,
+)
+from app.http_client import get_http_client
+from app.oidc import OIDCProvider
+from app.resilience import ProviderResilience
+from app.singleflight import SingleFlight
+from app.config import APP_BASE_URL, OIDC_ID_TOKEN_ENABLED, settings
+
+
+token_exchanges = SingleFlight("oauth_token_exchange")
+profile_fetches = SingleFlight("oauth_profile_fetch")
+
+
+class OAuthProvider:
+    """OAuth 提供商的声明：客户端、回调地址，以及把 token 响应映射为统一用户资料的函数
+
+    fetch_profile 接收 token 响应（至少包含 access_token），返回的字典统一包含
+    account_id、email、first_name、last_name、picture。client_factory 在第一次
+    访问 client 时才调用，oidc 为支持 id_token 的提供商的 discovery/JWKS 缓存。
+    对提供商的网络调用都通过 resilience.call() 发出（超时、重试、熔断）。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        client_factory: Callable[[], BaseOAuth2],
+        fetch_profile: Callable[[dict[str, Any]], Awaitable[dict[str, Any]]],
+        oidc: OIDCProvider | None = None,
+    ):
+        self.name = name
+        self.client_factory = client_factory
+        self.fetch_profile = fetch_profile
+        self.oidc = oidc
+        self.resilience = ProviderResilience(name)
+        if oidc is not None:
+            # discovery/JWKS 下载与换 token、userinfo 共用重试、熔断和登录时限
+            oidc.resilience = self.resilience
+        self._client: BaseOAuth2 | None = None
+
+    @property
+    def client(self) -> BaseOAuth2:
+        if self._client is None:
+            self._client = self.client_factory()
+        return self._client
+
+    async def get_access_token(
+        self, code: str, redirect_uri: str | None = None, code_verifier: str | None = None,
+    ) -> dict[str, Any]:
+        """redirect_uri 默认为登录回调地址；关联账号的回调地址不同，需要传入"""
+        redirect_uri = redirect_uri or self.redirect_uri
+        # 重试同一个回调时授权码已被用掉，合并后重复请求拿到的是同一次换取的结果
+        return await token_exchanges.do(
+            (self.name, code), lambda: self._exchange_code(code, redirect_uri, code_verifier),
+        )
+
+    async def _exchange_code(self, code: str, redirect_uri: str, code_verifier: str | None) -> dict[str, Any]:
+        # 授权码只能用一次，不是幂等调用，只在连接失败（请求未发出）时重试
+        return await self.resilience.call(
+            "token_exchange",
+            lambda: self.client.get_access_token(code, redirect_uri, code_verifier),
+            idempotent=False,
+        )
+
+    async def get_profile(self, token: dict[str, Any]) -> dict[str, Any]:
+        """同一 access_token 的并发请求共用一次资料获取；返回副本，调用方可以修改"""
+        profile = await profile_fetches.do((self.name, token["access_token"]), lambda: self.fetch_profile(token))
+        return dict(profile)
+
+    @property
+    def redirect_uri(self) -> str:
+        return f"{APP_BASE_URL}/auth/{self.name}/callback"
+
+
+def profile_from_claims(claims: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "account_id": claims.get("sub"),
+        "email": claims.get("email"),
+        "first_name": claims.get("given_name"),
+        "last_name": claims.get("family_name"),
+        "picture": claims.get("picture"),
+    }
+
+
+async def profile_from_id_token(provider: OAuthProvider, token: dict[str, Any]) -> dict[str, Any] | None:
+    """本地校验 id_token 并从 claims 中取资料，不可用时返回 None 以回退到 userinfo"""
+    id_token = token.get("id_token")
+    if not OIDC_ID_TOKEN_ENABLED or not id_token or provider.oidc is None:
+        return None
+    try:
+        claims = await provider.oidc.verify_id_token(id_token, provider.client.client_id)
+    except Exception as e:
+        logging.warning("id_token verification failed, falling back to userinfo: %s", e)
+        return None
+    profile = profile_from_claims(claims)
+    if not profile["email"]:
+        return None
+    return profile
+
+
+async def fetch_google_profile(token: dict[str, Any]) -> dict[str, Any]:
+    provider = get_provider("google")
+    profile = await profile_from_id_token(provider, token)
+    if profile is not None:
+        return profile
+    data = await provider.resilience.call(
+        "userinfo", lambda: provider.client.get_id_email(token["access_token"]), hedge=True,
+    )
+    return {
+        "account_id": data.get("id"),
+        "email": data.get("email"),
+        "first_name": data.get("given_name"),
+        "last_name": data.get("family_name"),
+        "picture": data.get("picture"),
+    }
+
+
+async def get_json(url: str, **kwargs) -> Any:
+    response = await get_http_client().get(url, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+async def fetch_linkedin_profile(token: dict[str, Any]) -> dict[str, Any]:
+    provider = get_provider("linkedin")
+    profile = await profile_from_id_token(provider, token)
+    if profile is not None:
+        return profile
+    # 使用 OpenID Connect 的 userinfo 端点获取用户信息
+    data = await provider.resilience.call(
+        "userinfo",
+        lambda: get_json(LINKEDIN_USERINFO_ENDPOINT, headers={"Authorization": f"Bearer {token['access_token']}"}),
+        hedge=True,
+    )
+    return profile_from_claims(data)
+
+
+async def fetch_facebook_profile(token: dict[str, Any]) -> dict[str, Any]:
+    # 一次 Graph API 请求同时取回 id、email 和资料，不再分两次串行调用
+    params = {
+        "fields": "id,email,first_name,last_name,picture",
+        "access_token": token["access_token"],
+    }
+    data = await get_provider("facebook").resilience.call(
+        "userinfo", lambda: get_json(FACEBOOK_PROFILE_ENDPOINT, params=params), hedge=True,
+    )
+    return {
+        "account_id": data.get("id"),
+        "email": data.get("email"),
+        "first_name": data.get("first_name"),
+        "last_name": data.get("last_name"),
+        "picture": data.get("picture", {}).get("data", {}).get("url"),
+    }
+
+
+providers: dict[str, OAuthProvider] = {}
+
+
+def register_provider(provider: OAuthProvider):
+    providers[provider.name] = provider
+    logging.debug("OAuth provider registered: %s", provider.name)
+
+
+def get_provider(name: str) -> OAuthProvider:
+    try:
+        return providers[name]
+    except KeyError:
+        raise ValueError(f"Unknown OAuth provider: {name}")
+
+
+def register_configured_providers():
+    """只注册配置了 client id 的提供商；客户端和 OIDC 缓存都在第一次使用时才创建"""
+    if settings.provider_configured("google"):
+        register_provider(OAuthProvider(
+            "google", create_google_oauth_client, fetch_google_profile, OIDCProvider(GOOGLE_DISCOVERY_ENDPOINT),
+        ))
+    if settings.provider_configured("linkedin"):
+        register_provider(OAuthProvider(
+            "linkedin", create_linkedin_oauth_client, fetch_linkedin_profile, OIDCProvider(LINKEDIN_DISCOVERY_ENDPOINT),
+        ))
+    if settings.provider_configured("facebook"):
+        register_provider(OAuthProvider("facebook", create_facebook_oauth_client, fetch_facebook_profile))
+    if not providers:
+        logging.warning("No OAuth provider is configured; set GOOGLE_CLIENT_ID, LINKEDIN_CLIENT_ID or FACEBOOK_CLIENT_ID")
+
+
+register_configured_providers()
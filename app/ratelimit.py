@@ -0,0 +1,225 @@
+import ipaddress
+import logging
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from fastapi import HTTPException, Request
+from pymongo.errors import DuplicateKeyError
+
+from app.config import (
+    DATABASE_NAME,
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_IP_RATE,
+    RATE_LIMIT_IP_BURST,
+    RATE_LIMIT_EMAIL_RATE,
+    RATE_LIMIT_EMAIL_BURST,
+    RATE_LIMIT_MAX_KEYS,
+    OAUTH_MAX_CONCURRENCY,
+    PASSWORD_MAX_CONCURRENCY,
+    TRUSTED_PROXIES,
+)
+from app.db import get_client
+from app.metrics import ADMISSION_REJECTED
+
+RATE_LIMIT_COLLECTION = "rate_limits"
+# 共享后端并发更新同一个桶时的重试次数，超过后放行，不因为限流本身拒绝请求
+MONGO_CAS_RETRIES = 3
+TRUSTED_PROXY_NETWORKS = tuple(ipaddress.ip_network(proxy, strict=False) for proxy in TRUSTED_PROXIES)
+
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXY_NETWORKS)
+
+
+def client_ip(request: Request) -> str:
+    """客户端 IP：连接来自受信任的代理时取 X-Forwarded-For 中从右往左第一个不受信任的地址
+
+    最右边的地址由离我们最近的代理追加，更左边的可能是客户端伪造的，所以不能直接取第一个。
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not _is_trusted_proxy(peer):
+        return peer
+    hops = [hop.strip() for header in request.headers.getlist("x-forwarded-for") for hop in header.split(",")]
+    address = peer
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            # 受信任代理追加的地址一定是合法 IP；不合法说明代理配置有误，退回到上一跳
+            try:
+                return str(ipaddress.ip_address(hop))
+            except ValueError:
+                return address
+        address = hop
+    return address
+
+
+def _refill(tokens: float, updated_at: float, now: float, rate: float, burst: int) -> float:
+    return min(burst, tokens + (now - updated_at) * rate)
+
+
+def _retry_after(tokens: float, rate: float, cost: float) -> float:
+    return (cost - tokens) / rate
+
+
+class MemoryRateLimitBackend:
+    """本地替身：令牌桶保存在进程内，多 worker 时每个 worker 单独计数
+
+    最多保留 max_keys 个桶，超出时淘汰最久未使用的（被淘汰的桶相当于重新装满）。
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        """扣除 cost 个令牌，成功返回 0，否则返回需要等待的秒数"""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (burst, now))
+        tokens = _refill(tokens, updated_at, now, rate, burst)
+        retry_after = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            retry_after = _retry_after(tokens, rate, cost)
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class MongoRateLimitBackend:
+    """多进程/多节点共享：桶存在 MongoDB，用比较并交换保证并发扣减的正确性，TTL 索引清理空闲桶"""
+
+    def _collection(self):
+        return get_client()[DATABASE_NAME][RATE_LIMIT_COLLECTION]
+
+    async def create_indexes(self):
+        await self._collection().create_index("expires_at", expireAfterSeconds=0)
+
+    async def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        collection = self._collection()
+        for _ in range(MONGO_CAS_RETRIES):
+            now = time.time()
+            document = await collection.find_one({"_id": key})
+            if document is None:
+                tokens, updated_at = float(burst), now
+            else:
+                tokens, updated_at = document["tokens"], document["updated_at"]
+            tokens = _refill(tokens, updated_at, now, rate, burst)
+            if tokens < cost:
+                return _retry_after(tokens, rate, cost)
+            # 桶从空补满所需的时间之后，这条记录就可以删除了
+            update = {
+                "tokens": tokens - cost,
+                "updated_at": now,
+                "expires_at": datetime.fromtimestamp(now + burst / rate, tz=timezone.utc),
+            }
+            if document is None:
+                try:
+                    await collection.insert_one({"_id": key, **update})
+                    return 0.0
+                except DuplicateKeyError:
+                    continue
+            result = await collection.update_one(
+                {"_id": key, "updated_at": document["updated_at"], "tokens": document["tokens"]},
+                {"$set": update},
+            )
+            if result.matched_count:
+                return 0.0
+        logging.warning("Rate limit bucket %s is heavily contended, allowing request", key)
+        return 0.0
+
+
+class ConcurrencyLimiter:
+    """一类路由同时处理的请求数上限，超出时立即返回 503，让客户端稍后重试"""
+
+    def __init__(self, route_class: str, limit: int):
+        self.route_class = route_class
+        self.limit = limit
+        self.active = 0
+
+    def acquire(self):
+        if self.active >= self.limit:
+            ADMISSION_REJECTED.labels(route_class=self.route_class, reason="concurrency").inc()
+            raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def check(self, route_class: str, kind: str, value: str, rate: float, burst: int):
+        retry_after = await self.backend.take(f"{route_class}:{kind}:{value}", rate, burst)
+        if retry_after > 0:
+            ADMISSION_REJECTED.labels(route_class=route_class, reason=f"{kind}_rate").inc()
+            logging.info("Rate limited %s %s on %s routes", kind, value, route_class)
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+
+def build_rate_limiter() -> RateLimiter:
+    backends = {
+        "memory": lambda: MemoryRateLimitBackend(RATE_LIMIT_MAX_KEYS),
+        "mongo": MongoRateLimitBackend,
+    }
+    logging.info("Rate limit backend: %s", RATE_LIMIT_BACKEND)
+    return RateLimiter(backends[RATE_LIMIT_BACKEND]())
+
+
+rate_limiter = build_rate_limiter()
+concurrency_limiters = {
+    "oauth": ConcurrencyLimiter("oauth", OAUTH_MAX_CONCURRENCY),
+    "password": ConcurrencyLimiter("password", PASSWORD_MAX_CONCURRENCY),
+}
+
+
+async def _request_email(request: Request) -> str | None:
+    """从登录表单（username）或注册/重置密码的 JSON（email）里取出 email"""
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith(("application/x-www-form-urlencoded", "multipart/form-data")):
+            email = (await request.form()).get("username")
+        elif content_type.startswith("application/json"):
+            body = await request.json()
+            email = body.get("email") if isinstance(body, dict) else None
+        else:
+            return None
+    except Exception:
+        return None
+    return email.strip().lower() if isinstance(email, str) and email else None
+
+
+def admission_control(route_class: str, by_email: bool = False):
+    """路由依赖：先按 IP（和 email）限流，再占用该类路由的并发名额，请求结束后释放
+
+    RATE_LIMIT_ENABLED 只控制令牌桶限流，并发上限始终生效。
+    """
+    limiter = concurrency_limiters[route_class]
+
+    async def dependency(request: Request):
+        if RATE_LIMIT_ENABLED:
+            await rate_limiter.check(route_class, "ip", client_ip(request), RATE_LIMIT_IP_RATE, RATE_LIMIT_IP_BURST)
+            if by_email:
+                email = await _request_email(request)
+                if email:
+                    await rate_limiter.check(route_class, "email", email, RATE_LIMIT_EMAIL_RATE, RATE_LIMIT_EMAIL_BURST)
+        limiter.acquire()
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    return dependency
@@ -0,0 +1,97 @@
+import hashlib
+import logging
+import secrets
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, ReturnDocument
+
+from app.config import DATABASE_NAME, REFRESH_TOKEN_LIFETIME_SECONDS, REFRESH_TOKEN_MAX_LIFETIME_SECONDS
+from app.db import get_client
+
+REFRESH_TOKEN_COLLECTION = "refresh_tokens"
+
+
+class RefreshTokenError(Exception):
+    pass
+
+
+def _collection():
+    return get_client()[DATABASE_NAME][REFRESH_TOKEN_COLLECTION]
+
+
+def _hash(token: str) -> str:
+    # 只保存哈希，数据库泄露也拿不到可用的 refresh token
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+async def create_indexes():
+    collection = _collection()
+    await collection.create_index([("token_hash", ASCENDING)], unique=True)
+    await collection.create_index([("family_id", ASCENDING)])
+    # 过期的 refresh token 由 MongoDB 自动删除
+    await collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+
+
+async def issue_refresh_token(user_id, family_id: str | None = None, family_expires_at: datetime | None = None) -> str:
+    """签发 refresh token；同一次登录轮换出来的 token 属于同一个 family"""
+    now = datetime.now(timezone.utc)
+    if family_id is None:
+        family_id = secrets.token_hex(16)
+        family_expires_at = now + timedelta(seconds=REFRESH_TOKEN_MAX_LIFETIME_SECONDS)
+    # 滑动过期：每次轮换都延长有效期，但不超过整个 family 的最长寿命
+    expires_at = min(now + timedelta(seconds=REFRESH_TOKEN_LIFETIME_SECONDS), family_expires_at)
+
+    token = secrets.token_urlsafe(32)
+    await _collection().insert_one({
+        "token_hash": _hash(token),
+        "user_id": str(user_id),
+        "family_id": family_id,
+        "family_expires_at": family_expires_at,
+        "expires_at": expires_at,
+        "used": False,
+        "revoked": False,
+        "created_at": now,
+    })
+    return token
+
+
+async def revoke_family(family_id: str):
+    await _collection().update_many({"family_id": family_id}, {"$set": {"revoked": True}})
+
+
+async def rotate_refresh_token(token: str) -> tuple[str, str]:
+    """消费一个 refresh token 并签发新的，返回 (user_id, 新 token)
+
+    已经用过的 token 再次出现说明可能被盗用，整个 family 都会被吊销。
+    """
+    collection = _collection()
+    token_hash = _hash(token)
+    document = await collection.find_one_and_update(
+        {"token_hash": token_hash, "used": False, "revoked": False},
+        {"$set": {"used": True}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if document is None:
+        existing = await collection.find_one({"token_hash": token_hash}, {"family_id": 1, "used": 1})
+        if existing is not None and existing.get("used"):
+            logging.warning("Refresh token reuse detected, revoking family %s", existing["family_id"])
+            await revoke_family(existing["family_id"])
+        raise RefreshTokenError("Invalid refresh token")
+
+    if _as_utc(document["expires_at"]) <= datetime.now(timezone.utc):
+        raise RefreshTokenError("Refresh token expired")
+
+    new_token = await issue_refresh_token(
+        document["user_id"], document["family_id"], _as_utc(document["family_expires_at"])
+    )
+    return document["user_id"], new_token
+
+
+async def revoke_refresh_token(token: str):
+    document = await _collection().find_one({"token_hash": _hash(token)}, {"family_id": 1})
+    if document is not None:
+        await revoke_family(document["family_id"])
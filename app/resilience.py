@@ -0,0 +1,221 @@
+"""调用 OAuth 提供商的容错层
+
+每个 OAuthProvider 有一个 ProviderResilience，对提供商的网络调用都经过 call()：
+    - 时限：login_deadline() 范围内的调用共享同一个截止时间，单次调用另有超时上限
+    - 重试：只重试幂等调用（以及请求还没发出去的连接错误），指数退避加随机抖动
+    - 熔断：连续失败达到阈值后一段时间内直接失败，不再占用连接和协程
+    - 对冲：可选，userinfo 请求迟迟不返回时再发一个，取先成功的结果
+熔断状态按进程保存，多 worker 时每个 worker 各自判断。
+"""
+import asyncio
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+
+from app.config import (
+    PROVIDER_CALL_TIMEOUT_SECONDS,
+    PROVIDER_MAX_RETRIES,
+    PROVIDER_RETRY_BASE_DELAY_SECONDS,
+    PROVIDER_BREAKER_FAILURE_THRESHOLD,
+    PROVIDER_BREAKER_RESET_SECONDS,
+    PROVIDER_HEDGE_DELAY_SECONDS,
+)
+from app.metrics import PROVIDER_CALLS, PROVIDER_RETRIES, PROVIDER_HEDGES, PROVIDER_CIRCUIT_STATE
+
+T = TypeVar("T")
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("provider_deadline", default=None)
+
+
+class ProviderError(Exception):
+    pass
+
+
+class ProviderUnavailable(ProviderError):
+    """熔断打开或登录时限已经用完，请求没有发出"""
+
+
+class ProviderTimeout(ProviderError):
+    pass
+
+
+@contextmanager
+def login_deadline(seconds: float):
+    """范围内的提供商调用共享同一个截止时间；嵌套时保留更早的那个"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left() -> float:
+    deadline = _deadline.get()
+    if deadline is None:
+        return PROVIDER_CALL_TIMEOUT_SECONDS
+    return min(PROVIDER_CALL_TIMEOUT_SECONDS, deadline - time.monotonic())
+
+
+def _http_error(exc: BaseException) -> httpx.HTTPError | None:
+    """httpx_oauth 会把 httpx 的异常包一层，沿着 __cause__ 找到原始异常"""
+    while exc is not None:
+        if isinstance(exc, httpx.HTTPError):
+            return exc
+        exc = exc.__cause__
+    return None
+
+
+def _is_provider_failure(exc: BaseException) -> bool:
+    """超时、网络错误和 5xx/429 说明提供商有问题；其他 4xx 是请求本身的问题，不计入熔断"""
+    if isinstance(exc, ProviderTimeout):
+        return True
+    error = _http_error(exc)
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def _is_retryable(exc: BaseException, idempotent: bool) -> bool:
+    # 连接没建立起来时请求肯定没发出，换取 token 这类非幂等调用也可以安全重试
+    if isinstance(_http_error(exc), (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    return idempotent and _is_provider_failure(exc)
+
+
+class CircuitBreaker:
+    """closed 正常放行；open 期间直接拒绝；reset_seconds 后进入 half_open，只放一个探测请求"""
+
+    def __init__(self, provider: str, failure_threshold: int, reset_seconds: float):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        PROVIDER_CIRCUIT_STATE.labels(provider=provider).set(0)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logging.warning("Circuit for provider %s is now %s", self.provider, state)
+        self.state = state
+        PROVIDER_CIRCUIT_STATE.labels(provider=self.provider).set(CIRCUIT_STATES[state])
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self._set_state("half_open")
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self):
+        self._probing = False
+        self.failures = 0
+        self._set_state("closed")
+
+    def record_failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state("open")
+
+    def release(self):
+        """调用被取消、没有结果时释放探测名额"""
+        self._probing = False
+
+
+class ProviderResilience:
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.breaker = CircuitBreaker(provider, PROVIDER_BREAKER_FAILURE_THRESHOLD, PROVIDER_BREAKER_RESET_SECONDS)
+
+    async def call(
+        self,
+        call: str,
+        fn: Callable[[], Awaitable[T]],
+        idempotent: bool = True,
+        hedge: bool = False,
+    ) -> T:
+        """fn 每次调用都要发出一个新请求；hedge 只应该用于幂等的读请求"""
+        attempt = 0
+        while True:
+            try:
+                return await self._attempt(call, fn, hedge and PROVIDER_HEDGE_DELAY_SECONDS > 0)
+            except ProviderUnavailable:
+                raise
+            except Exception as e:
+                if attempt >= PROVIDER_MAX_RETRIES or not _is_retryable(e, idempotent):
+                    raise
+                # full jitter：在 [0, base * 2^attempt) 内随机等待，避免大量客户端同时重试
+                delay = random.uniform(0, PROVIDER_RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+                if delay >= time_left():
+                    raise
+                attempt += 1
+                PROVIDER_RETRIES.labels(provider=self.provider, call=call).inc()
+                logging.info("Retrying %s %s (attempt %s) after %.3fs: %s", self.provider, call, attempt, delay, e)
+                await asyncio.sleep(delay)
+
+    async def _attempt(self, call: str, fn: Callable[[], Awaitable[T]], hedge: bool) -> T:
+        timeout = time_left()
+        if timeout <= 0:
+            PROVIDER_CALLS.labels(provider=self.provider, call=call, outcome="deadline_exceeded").inc()
+            raise ProviderUnavailable(f"Login deadline exceeded before calling {self.provider} {call}")
+        if not self.breaker.allow():
+            PROVIDER_CALLS.labels(provider=self.provider, call=call, outcome="circuit_open").inc()
+            raise ProviderUnavailable(f"{self.provider} is temporarily unavailable")
+        try:
+            result = await asyncio.wait_for(self._hedged(call, fn) if hedge else fn(), timeout)
+        except asyncio.TimeoutError:
+            PROVIDER_CALLS.labels(provider=self.provider, call=call, outcome="timeout").inc()
+            self.breaker.record_failure()
+            raise ProviderTimeout(f"{self.provider} {call} timed out after {timeout:.2f}s")
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            PROVIDER_CALLS.labels(provider=self.provider, call=call, outcome="error").inc()
+            if _is_provider_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        PROVIDER_CALLS.labels(provider=self.provider, call=call, outcome="success").inc()
+        self.breaker.record_success()
+        return result
+
+    async def _hedged(self, call: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """先发一个请求，PROVIDER_HEDGE_DELAY_SECONDS 内没有返回就再发一个，取先成功的结果"""
+        primary = asyncio.ensure_future(fn())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=PROVIDER_HEDGE_DELAY_SECONDS)
+            if not done:
+                PROVIDER_HEDGES.labels(provider=self.provider, call=call, result="sent").inc()
+                tasks.add(asyncio.ensure_future(fn()))
+            error: BaseException | None = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            PROVIDER_HEDGES.labels(provider=self.provider, call=call, result="won").inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,215 @@
+"""生产环境启动入口：预加载应用，按 CPU 核数 fork 多个 uvicorn worker
+
+父进程先导入 app.main 并绑定监听 socket，再 fork 出 worker，worker 共享同一个
+socket，导入和路由构建只做一次。Motor/httpx 连接池在每个 worker 的 startup
+事件里按配置单独创建。收到 SIGTERM 后父进程转发给所有 worker：worker 先把
+/health/ready 置为 503（持续 DRAIN_DELAY_SECONDS），再停止接受新连接，等待进行
+中的请求完成（最多 GRACEFUL_TIMEOUT_SECONDS）后关闭连接池退出。
+
+用法: python -m app.server [--workers N] [--host HOST] [--port PORT]
+"""
+import argparse
+import importlib.util
+import logging
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+
+import uvicorn
+
+from app.config import (
+    SERVER_HOST,
+    SERVER_PORT,
+    WEB_CONCURRENCY,
+    DRAIN_DELAY_SECONDS,
+    GRACEFUL_TIMEOUT_SECONDS,
+    MONGODB_MAX_POOL_SIZE,
+    HTTP_MAX_CONNECTIONS,
+)
+
+logger = logging.getLogger(__name__)
+
+# worker 启动后立刻退出时，重启前等待的时间，避免疯狂 fork
+RESPAWN_BACKOFF_SECONDS = 1.0
+
+
+class DrainingServer(uvicorn.Server):
+    """第一次 SIGTERM 只标记 draining，DRAIN_DELAY_SECONDS 后才真正开始关闭"""
+
+    drain_started_at: float | None = None
+
+    def handle_exit(self, sig, frame):
+        from app.health import mark_draining
+
+        if sig == signal.SIGTERM and self.drain_started_at is None and DRAIN_DELAY_SECONDS > 0:
+            mark_draining()
+            self.drain_started_at = time.monotonic()
+            return
+        super().handle_exit(sig, frame)
+
+    async def on_tick(self, counter: int) -> bool:
+        if self.drain_started_at is not None and time.monotonic() - self.drain_started_at >= DRAIN_DELAY_SECONDS:
+            self.should_exit = True
+        return await super().on_tick(counter)
+
+
+def select_event_loop() -> tuple[str, str]:
+    """有 uvloop/httptools 时使用它们，否则回退到标准 asyncio 和 h11"""
+    loop = "uvloop" if importlib.util.find_spec("uvloop") and sys.platform != "win32" else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    return loop, http
+
+
+def preload_app():
+    from app import db, http_client
+    from app.main import app
+
+    # 连接池必须在 fork 之后由各 worker 自己创建，共享 fork 前的连接会串数据
+    if db._client is not None or http_client._client is not None:
+        raise RuntimeError("Connection pools were created before forking workers")
+    return app
+
+
+def run_worker(config: uvicorn.Config, sock):
+    from app.logging_config import setup_logging
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal.SIG_DFL)
+    # 父进程的日志后台线程不会被 fork 过来，这里重新启动
+    setup_logging()
+    DrainingServer(config).run(sockets=[sock])
+
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, workers: int):
+        self.config = config
+        self.workers = workers
+        self.sock = config.bind_socket()
+        self.children: dict[int, float] = {}
+        self.stopping = False
+        self.stop_deadline = 0.0
+
+    def spawn(self):
+        from app.logging_config import setup_logging, shutdown_logging
+
+        # fork 时不能有持锁的日志线程，先停掉，fork 后父子进程各自重新启动
+        shutdown_logging()
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                run_worker(self.config, self.sock)
+            except BaseException:
+                logger.exception("Worker crashed")
+                status = 1
+            finally:
+                # 不执行父进程注册的 atexit 等清理逻辑
+                os._exit(status)
+        setup_logging()
+        self.children[pid] = time.monotonic()
+        logger.info("Started worker %s", pid)
+
+    def stop(self, sig, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        self.stop_deadline = time.monotonic() + DRAIN_DELAY_SECONDS + GRACEFUL_TIMEOUT_SECONDS + 5
+        logger.info("Received signal %s, draining %s workers", sig, len(self.children))
+        for pid in self.children:
+            self._kill(pid, signal.SIGTERM)
+
+    @staticmethod
+    def _kill(pid: int, sig: int):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            started_at = self.children.pop(pid, None)
+            self._mark_dead(pid)
+            if self.stopping or started_at is None:
+                continue
+            logger.warning("Worker %s exited with status %s, restarting", pid, status)
+            if time.monotonic() - started_at < RESPAWN_BACKOFF_SECONDS:
+                time.sleep(RESPAWN_BACKOFF_SECONDS)
+            self.spawn()
+
+    @staticmethod
+    def _mark_dead(pid: int):
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            from prometheus_client import multiprocess
+
+            multiprocess.mark_process_dead(pid)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        while self.children:
+            self.reap()
+            if self.stopping and time.monotonic() > self.stop_deadline:
+                logger.error("Graceful shutdown timed out, killing %s workers", len(self.children))
+                for pid in self.children:
+                    self._kill(pid, signal.SIGKILL)
+                self.stop_deadline = float("inf")
+            time.sleep(0.2)
+        self.sock.close()
+        logger.info("All workers exited")
+        from app.logging_config import shutdown_logging
+
+        shutdown_logging()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with multiple preloaded workers")
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+
+    metrics_dir = None
+    if args.workers > 1 and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # 必须在导入 prometheus_client 之前设置，/metrics 才能汇总所有 worker
+        metrics_dir = tempfile.mkdtemp(prefix="prometheus-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
+    app = preload_app()
+    loop, http = select_event_loop()
+    config = uvicorn.Config(
+        app,
+        host=args.host,
+        port=args.port,
+        loop=loop,
+        http=http,
+        log_config=None,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT_SECONDS,
+        # 客户端 IP 由 app.ratelimit.client_ip 按 TRUSTED_PROXIES 解析，uvicorn 不改写 request.client
+        proxy_headers=False,
+    )
+    logger.info(
+        "Starting %s workers on %s:%s (loop=%s, http=%s); per-worker pools: mongo=%s, http=%s",
+        args.workers, args.host, args.port, loop, http, MONGODB_MAX_POOL_SIZE, HTTP_MAX_CONNECTIONS,
+    )
+
+    if args.workers == 1:
+        # 单 worker 不需要监督进程，直接在当前进程里运行
+        DrainingServer(config).run()
+        return
+    try:
+        Supervisor(config, args.workers).run()
+    finally:
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
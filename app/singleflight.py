@@ -0,0 +1,40 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from app.metrics import SINGLEFLIGHT_CALLS
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """同一个 key 同时只执行一次异步调用，并发的相同调用共享同一个结果
+
+    只合并正在进行中的调用，结束后立即移除，不做缓存；异常同样会传给所有等待者。
+    name 用作 singleflight_calls_total 指标的 group 标签。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            SINGLEFLIGHT_CALLS.labels(group=self.name, role="leader").inc()
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            SINGLEFLIGHT_CALLS.labels(group=self.name, role="coalesced").inc()
+        # shield：某个调用方被取消时不影响其他等待同一结果的调用方
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 所有调用方都被取消时也要取走异常，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
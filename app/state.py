@@ -0,0 +1,166 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import time
+from datetime import datetime, timezone
+
+from fastapi import Response
+
+from app.config import SECRET_KEY, OAUTH_STATE_BACKEND, OAUTH_STATE_TTL_SECONDS, DATABASE_NAME, COOKIE_SECURE
+from app.db import get_client
+
+OAUTH_STATE_COLLECTION = "oauth_states"
+STATE_COOKIE_NAME = "oauth_state"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class MemoryStateBackend:
+    """本地替身：进程内记录未使用的 nonce，只适用于单进程"""
+
+    def __init__(self):
+        self._nonces: dict[str, float] = {}
+
+    async def add(self, nonce: str, expires_at: float):
+        self._nonces[nonce] = expires_at
+        # 摊还清理：每次写入顺带淘汰少量过期项，避免全量扫描
+        for _ in range(2):
+            oldest = next(iter(self._nonces))
+            if self._nonces[oldest] >= time.time():
+                break
+            del self._nonces[oldest]
+
+    async def consume(self, nonce: str) -> bool:
+        expires_at = self._nonces.pop(nonce, None)
+        return expires_at is not None and expires_at >= time.time()
+
+
+class MongoStateBackend:
+    """多进程/多节点共享：nonce 存在 MongoDB，TTL 索引负责过期清理"""
+
+    def _collection(self):
+        return get_client()[DATABASE_NAME][OAUTH_STATE_COLLECTION]
+
+    async def create_indexes(self):
+        await self._collection().create_index("expires_at", expireAfterSeconds=0)
+
+    async def add(self, nonce: str, expires_at: float):
+        await self._collection().insert_one({"_id": nonce, "expires_at": datetime.fromtimestamp(expires_at, tz=timezone.utc)})
+
+    async def consume(self, nonce: str) -> bool:
+        # 按 _id 原子删除，同一个 state 只有一次能成功
+        document = await self._collection().find_one_and_delete({"_id": nonce})
+        if document is None:
+            return False
+        expires_at = document["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return expires_at.timestamp() >= time.time()
+
+
+class OAuthStateStore:
+    """签发和校验 OAuth state
+
+    state 本身用 SECRET_KEY 做 HMAC 签名，包含提供商、nonce 和过期时间，伪造的 state 不需要查存储
+    就能拒绝。nonce 同时写进发起登录的浏览器的 HttpOnly cookie，回调时必须一致，别人截获的
+    state 换一个浏览器无法使用。配置了 backend 时还会记录 nonce，保证每个 state 只能使用一次。
+    """
+
+    def __init__(self, secret: str, ttl_seconds: float, backend=None):
+        self._key = hashlib.sha256(f"oauth-state:{secret}".encode()).digest()
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+
+    def _sign(self, payload: bytes) -> str:
+        return _b64encode(hmac.new(self._key, payload, hashlib.sha256).digest())
+
+    def _signature_matches(self, signature: str, payload: bytes) -> bool:
+        # 按字节比较：compare_digest 遇到非 ASCII 的 str 会抛 TypeError
+        return hmac.compare_digest(signature.encode(), self._sign(payload).encode())
+
+    async def mint(self, provider: str, nonce: str | None = None) -> str:
+        nonce = nonce or new_nonce()
+        expires_at = time.time() + self.ttl_seconds
+        payload = json.dumps({"p": provider, "n": nonce, "e": int(expires_at)}, separators=(",", ":")).encode()
+        if self.backend is not None:
+            await self.backend.add(nonce, expires_at)
+        return f"{_b64encode(payload)}.{self._sign(payload)}"
+
+    async def verify(self, state: str | None, provider: str, nonce: str | None = None) -> bool:
+        """nonce 为浏览器 cookie 里的值；传入时必须与 state 里签名的 nonce 一致"""
+        if not state or "." not in state:
+            return False
+        encoded_payload, signature = state.rsplit(".", 1)
+        try:
+            payload = _b64decode(encoded_payload)
+        except ValueError:
+            return False
+        if not self._signature_matches(signature, payload):
+            return False
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return False
+        if not isinstance(data, dict) or data.get("p") != provider:
+            return False
+        expires_at, state_nonce = data.get("e"), data.get("n")
+        if not isinstance(expires_at, (int, float)) or expires_at < time.time():
+            return False
+        if not isinstance(state_nonce, str):
+            return False
+        if nonce is not None and not hmac.compare_digest(state_nonce.encode(), nonce.encode()):
+            return False
+        if self.backend is not None:
+            return await self.backend.consume(state_nonce)
+        return True
+
+
+def new_nonce() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def set_state_cookie(response: Response, provider: str, nonce: str):
+    """把 state 的 nonce 绑定到发起登录的浏览器
+
+    SameSite=Lax：提供商回调是跨站的顶层 GET 跳转，Strict 会让 cookie 丢失。
+    """
+    response.set_cookie(
+        STATE_COOKIE_NAME,
+        nonce,
+        max_age=OAUTH_STATE_TTL_SECONDS,
+        path=f"/auth/{provider}",
+        secure=COOKIE_SECURE,
+        httponly=True,
+        samesite="lax",
+    )
+
+
+def clear_state_cookie(response: Response, provider: str):
+    response.delete_cookie(STATE_COOKIE_NAME, path=f"/auth/{provider}", secure=COOKIE_SECURE, httponly=True, samesite="lax")
+
+
+def build_state_store() -> OAuthStateStore:
+    if not SECRET_KEY:
+        raise ValueError("SECRET_KEY must be set to sign OAuth state")
+    backends = {
+        "signed": None,
+        "memory": MemoryStateBackend,
+        "mongo": MongoStateBackend,
+    }
+    if OAUTH_STATE_BACKEND not in backends:
+        raise ValueError(f"Unknown OAUTH_STATE_BACKEND: {OAUTH_STATE_BACKEND}")
+    backend_class = backends[OAUTH_STATE_BACKEND]
+    logging.info("OAuth state backend: %s", OAUTH_STATE_BACKEND)
+    return OAuthStateStore(SECRET_KEY, OAUTH_STATE_TTL_SECONDS, backend_class() if backend_class else None)
+
+
+state_store = build_state_store()
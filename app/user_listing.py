@@ -0,0 +1,174 @@
+"""GET /users：按提供商、是否启用、email 前缀筛选用户，游标分页
+
+不用 skip/limit：翻到第 N 页时 skip 仍要扫描前面所有索引项。这里的游标是上一页最后
+一条的排序键，下一页从该键之后开始，每页只扫描 limit + 1 个索引项。游标里记录了生成它的
+筛选条件指纹，换了筛选条件再用旧游标返回 400。
+    - 没有 email 前缀时按 _id 倒序（注册时间从新到旧），用 User 上以 _id 结尾的复合索引
+    - 有 email 前缀时按 email 升序，用以 email 结尾的复合索引（只有前缀时用唯一 email 索引）
+      做范围扫描，提供商/是否启用是索引里的等值条件，不需要取文档再过滤
+每个查询都用 hint 指定与筛选条件完全匹配的索引，不会退化为全表扫描；另有 max_time_ms 兜底。
+只返回 fields 指定的字段，不加载完整文档，hashed_password 永远不会返回。
+"""
+import base64
+import binascii
+import hashlib
+import json
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import ExecutionTimeout
+
+from app.auth import fastapi_users
+from app.config import USER_LIST_DEFAULT_LIMIT, USER_LIST_MAX_LIMIT, USER_LIST_MAX_TIME_MS
+from app.db import get_users_collection
+from app.metrics import track_stage
+
+LISTABLE_FIELDS = (
+    "email", "first_name", "last_name", "picture", "oauth_provider", "is_active", "is_superuser", "is_verified",
+)
+DEFAULT_FIELDS = ("email", "oauth_provider", "is_active")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def filters_fingerprint(oauth_provider: str | None, is_active: bool | None, email_prefix: str | None) -> str:
+    """筛选条件（含决定排序方式的 email 前缀）的短指纹，写进游标"""
+    filters = json.dumps([oauth_provider, is_active, email_prefix or None], separators=(",", ":"))
+    return hashlib.sha256(filters.encode()).hexdigest()[:16]
+
+
+def encode_cursor(fingerprint: str, value: str) -> str:
+    return base64.urlsafe_b64encode(f"{fingerprint}:{value}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, fingerprint: str) -> str:
+    try:
+        decoded = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor("Malformed cursor")
+    cursor_fingerprint, _, value = decoded.partition(":")
+    # 游标只能用于生成它的同一组筛选条件，换了筛选条件要从第一页开始
+    if cursor_fingerprint != fingerprint or not value:
+        raise InvalidCursor("Cursor does not match the requested filters")
+    return value
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    """以 prefix 开头的字符串都小于返回值，用于 email 范围查询"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _pick_index(oauth_provider: str | None, is_active: bool | None, suffix: str) -> str:
+    """等值筛选字段在前、排序字段在后的复合索引名（见 User.Settings.indexes）"""
+    if oauth_provider is not None and is_active is not None:
+        return f"provider_active_{suffix}"
+    if oauth_provider is not None:
+        return f"provider_{suffix}"
+    if is_active is not None:
+        return f"active_{suffix}"
+    return {"recency": "_id_", "email": "email_unique"}[suffix]
+
+
+def build_query(
+    oauth_provider: str | None,
+    is_active: bool | None,
+    email_prefix: str | None,
+    cursor: str | None,
+) -> tuple[dict, list, str, str]:
+    """返回 (filter, sort, hint, 排序字段)"""
+    query: dict = {}
+    if oauth_provider is not None:
+        query["oauth_provider"] = oauth_provider
+    if is_active is not None:
+        query["is_active"] = is_active
+
+    fingerprint = filters_fingerprint(oauth_provider, is_active, email_prefix)
+    if email_prefix:
+        email_range = {"$gte": email_prefix, "$lt": _prefix_upper_bound(email_prefix)}
+        if cursor:
+            after = decode_cursor(cursor, fingerprint)
+            # 上下界都保留：游标只是把下界从前缀本身推到上一页最后一条之后
+            if not after.startswith(email_prefix):
+                raise InvalidCursor("Cursor is outside the requested email prefix")
+            del email_range["$gte"]
+            email_range["$gt"] = after
+        query["email"] = email_range
+        return query, [("email", ASCENDING)], _pick_index(oauth_provider, is_active, "email"), "email"
+
+    if cursor:
+        try:
+            query["_id"] = {"$lt": ObjectId(decode_cursor(cursor, fingerprint))}
+        except InvalidId:
+            raise InvalidCursor("Malformed cursor")
+    return query, [("_id", DESCENDING)], _pick_index(oauth_provider, is_active, "recency"), "id"
+
+
+async def list_users(
+    fields: tuple[str, ...] = DEFAULT_FIELDS,
+    oauth_provider: str | None = None,
+    is_active: bool | None = None,
+    email_prefix: str | None = None,
+    cursor: str | None = None,
+    limit: int = USER_LIST_DEFAULT_LIMIT,
+) -> dict:
+    query, sort, hint, sort_key = build_query(oauth_provider, is_active, email_prefix, cursor)
+    projection = {field: 1 for field in fields}
+    # 多取一条用来判断是否还有下一页
+    documents = await (
+        get_users_collection()
+        .find(query, projection)
+        .sort(sort)
+        .hint(hint)
+        .limit(limit + 1)
+        .max_time_ms(USER_LIST_MAX_TIME_MS)
+        .to_list(length=limit + 1)
+    )
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        fingerprint = filters_fingerprint(oauth_provider, is_active, email_prefix)
+        next_cursor = encode_cursor(fingerprint, last["email"] if sort_key == "email" else str(last["_id"]))
+    items = []
+    for document in documents:
+        document["id"] = str(document.pop("_id"))
+        items.append(document)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def parse_fields(fields: str | None) -> tuple[str, ...]:
+    if not fields:
+        return DEFAULT_FIELDS
+    selected = tuple(field.strip() for field in fields.split(",") if field.strip())
+    unknown = [field for field in selected if field not in LISTABLE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown or non-listable fields: {', '.join(unknown)}")
+    return selected
+
+
+def get_users_listing_router() -> APIRouter:
+    router = APIRouter(dependencies=[Depends(fastapi_users.current_user(active=True, superuser=True))])
+
+    @router.get("")
+    async def users_listing(
+        oauth_provider: str | None = None,
+        is_active: bool | None = None,
+        email_prefix: str | None = Query(None, min_length=1),
+        fields: str | None = Query(None, description="Comma-separated fields, e.g. email,first_name"),
+        cursor: str | None = None,
+        limit: int = Query(USER_LIST_DEFAULT_LIMIT, ge=1, le=USER_LIST_MAX_LIMIT),
+    ):
+        selected = parse_fields(fields)
+        try:
+            with track_stage("user_listing"):
+                return await list_users(selected, oauth_provider, is_active, email_prefix, cursor, limit)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ExecutionTimeout:
+            raise HTTPException(status_code=503, detail="User listing query timed out, narrow the filters")
+
+    return router
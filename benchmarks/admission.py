@@ -0,0 +1,54 @@
+"""限流和并发上限的效果：对同一个账号并发发起大量错误密码登录（模拟撞库）
+
+统计各状态码的数量和耗时：被 429/503 拒绝的请求不做密码哈希，应当远快于正常处理的 400。
+同时从 /metrics 读取 admission_rejected_total。
+
+准备:
+    MONGODB_URL=mongomock:// uvicorn app.main:app
+    （关闭限流对比: RATE_LIMIT_ENABLED=false）
+
+用法: python -m benchmarks.admission [--attempts 200] [--concurrency 50] [--base-url http://127.0.0.1:8000]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.load import summarize
+
+
+async def attempt_login(client: httpx.AsyncClient, email: str, semaphore: asyncio.Semaphore, results: dict):
+    async with semaphore:
+        start = time.perf_counter()
+        response = await client.post("/auth/jwt/login", data={"username": email, "password": "wrong-password"})
+        results[response.status_code].append(time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--attempts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    args = parser.parse_args()
+
+    email = f"victim-{uuid.uuid4().hex[:8]}@example.com"
+    results: dict[int, list[float]] = defaultdict(list)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        semaphore = asyncio.Semaphore(args.concurrency)
+        start = time.perf_counter()
+        await asyncio.gather(*(attempt_login(client, email, semaphore, results) for _ in range(args.attempts)))
+        elapsed = time.perf_counter() - start
+        metrics = (await client.get("/metrics")).text
+
+    for status, samples in sorted(results.items()):
+        summarize(f"status {status}", samples, 0, elapsed)
+    for line in metrics.splitlines():
+        if line.startswith("admission_rejected_total"):
+            print(line)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""登录审计事件的写入和导出
+
+1. 按 JOB_BATCH_SIZE 分批写入 N 条合成事件，统计写入速度
+2. 流式导出全部事件（与 /admin/audit/export 走同一个 export()），统计速度和导出前后的
+   最大 RSS 增量；游标导出时 RSS 增量应当与 N 无关
+
+AUDIT_BACKEND=file（默认用临时目录）或 mongo（MONGODB_URL 指向测试库）。
+
+用法: AUDIT_BACKEND=file python -m benchmarks.audit_export [事件数，默认 1000000]
+"""
+import argparse
+import asyncio
+import resource
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.audit import audit_sink
+from app.config import AUDIT_BACKEND, JOB_BATCH_SIZE
+from app.db import close_db, init_db
+
+
+def max_rss_mb() -> float:
+    # Linux 上 ru_maxrss 的单位是 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def synthetic_events(total: int):
+    started_at = datetime.now(timezone.utc) - timedelta(seconds=total)
+    for i in range(total):
+        yield {
+            "at": started_at + timedelta(seconds=i),
+            "route": "/auth/google/callback",
+            "provider": "google",
+            "user_id": f"{i:024x}",
+            "ip": f"10.0.{i // 256 % 256}.{i % 256}",
+            "outcome": "success" if i % 20 else "invalid_state",
+            "stages_ms": {"token_exchange": 80.0, "profile_fetch": 40.0, "user_upsert": 3.0, "jwt_sign": 0.5},
+        }
+
+
+async def main(args):
+    await init_db()
+    try:
+        await audit_sink.create_collection()
+        started_at = time.perf_counter()
+        batch = []
+        for event in synthetic_events(args.total):
+            batch.append(event)
+            if len(batch) >= JOB_BATCH_SIZE:
+                await audit_sink.write(batch)
+                batch = []
+        if batch:
+            await audit_sink.write(batch)
+        elapsed = time.perf_counter() - started_at
+        print(f"{AUDIT_BACKEND} write: {args.total} events in {elapsed:.2f}s ({args.total / elapsed:,.0f} events/s)")
+
+        rss_before = max_rss_mb()
+        started_at = time.perf_counter()
+        exported = 0
+        async for _ in audit_sink.export({"outcome": "success"} if args.filtered else {}):
+            exported += 1
+        elapsed = time.perf_counter() - started_at
+        print(
+            f"{AUDIT_BACKEND} export: {exported} events in {elapsed:.2f}s ({exported / elapsed:,.0f} events/s), "
+            f"max RSS +{max_rss_mb() - rss_before:.1f}MB"
+        )
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Login audit sink write and streaming export throughput")
+    parser.add_argument("total", type=int, nargs="?", default=1_000_000)
+    parser.add_argument("--filtered", action="store_true", help="Export only successful logins")
+    asyncio.run(main(parser.parse_args()))
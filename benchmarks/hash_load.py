@@ -0,0 +1,72 @@
+"""在注册/登录流量下测量 /protected-route 的延迟
+
+后台持续发送注册和密码登录请求（每次都要做密码哈希），同时测量
+/protected-route 的 p50/p99 延迟。哈希移到线程池后 p99 应保持平稳。
+
+用法: python benchmarks/hash_load.py YOUR_ACCESS_TOKEN [秒数] [登录并发数]
+"""
+import asyncio
+import secrets
+import sys
+import time
+
+import httpx
+
+BASE_URL = "http://localhost:8000"
+
+
+def percentile(samples: list[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def login_traffic(client: httpx.AsyncClient, stop: asyncio.Event):
+    email = f"load-{secrets.token_hex(6)}@example.com"
+    password = secrets.token_urlsafe(12)
+    await client.post("/auth/register", json={"email": email, "password": password})
+    while not stop.is_set():
+        await client.post("/auth/jwt/login", data={"username": email, "password": password})
+
+
+async def probe(client: httpx.AsyncClient, token: str, stop: asyncio.Event) -> list[float]:
+    samples = []
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/protected-route", headers=headers)
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    return samples
+
+
+async def measure(client: httpx.AsyncClient, token: str, seconds: float, login_concurrency: int) -> list[float]:
+    stop = asyncio.Event()
+    workers = [asyncio.create_task(login_traffic(client, stop)) for _ in range(login_concurrency)]
+    probe_task = asyncio.create_task(probe(client, token, stop))
+    await asyncio.sleep(seconds)
+    stop.set()
+    samples = await probe_task
+    await asyncio.gather(*workers, return_exceptions=True)
+    return samples
+
+
+async def main(token: str, seconds: float, login_concurrency: int):
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=30) as client:
+        for label, concurrency in (("idle", 0), ("under login load", login_concurrency)):
+            samples = await measure(client, token, seconds, concurrency)
+            print(
+                f"{label:18s} n={len(samples)} "
+                f"p50={percentile(samples, 0.50) * 1000:.1f}ms "
+                f"p99={percentile(samples, 0.99) * 1000:.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(main(
+        sys.argv[1],
+        float(sys.argv[2]) if len(sys.argv) > 2 else 10,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 20,
+    ))
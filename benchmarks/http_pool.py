@@ -0,0 +1,66 @@
+"""对比每次新建 httpx.AsyncClient 与共享连接池的开销
+
+启动一个本地模拟的 userinfo 端点，然后分别用两种方式请求。
+用法: python -m benchmarks.http_pool [请求数]
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.http_client import get_http_client, close_http_client
+
+HOST = "127.0.0.1"
+PORT = 8765
+URL = f"http://{HOST}:{PORT}/userinfo"
+
+
+async def userinfo(request):
+    return JSONResponse({"id": "1", "email": "user@example.com", "given_name": "John", "family_name": "Doe"})
+
+
+mock_provider = Starlette(routes=[Route("/userinfo", userinfo)])
+
+
+async def per_call_client(total: int) -> float:
+    start = time.perf_counter()
+    for _ in range(total):
+        async with httpx.AsyncClient() as client:
+            response = await client.get(URL, headers={"Authorization": "Bearer token"})
+            response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def shared_client(total: int) -> float:
+    client = get_http_client()
+    start = time.perf_counter()
+    for _ in range(total):
+        response = await client.get(URL, headers={"Authorization": "Bearer token"})
+        response.raise_for_status()
+    elapsed = time.perf_counter() - start
+    await close_http_client()
+    return elapsed
+
+
+async def main(total: int):
+    server = uvicorn.Server(uvicorn.Config(mock_provider, host=HOST, port=PORT, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    try:
+        for name, bench in (("per-call AsyncClient", per_call_client), ("shared AsyncClient", shared_client)):
+            elapsed = await bench(total)
+            print(f"{name:22s} {total} requests in {elapsed:.2f}s ({elapsed / total * 1000:.2f} ms/request)")
+    finally:
+        server.should_exit = True
+        await task
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
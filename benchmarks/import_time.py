@@ -0,0 +1,58 @@
+"""冷启动导入耗时分析（python -X importtime）
+
+在新的子进程里多次导入目标模块，解析 -X importtime 的输出，打印总耗时中位数、
+导入的模块数、累计耗时最高的模块以及 app.* 各模块自身的耗时，用来确认启动
+路径没有变重。耗时受机器负载影响较大，模块数是更稳定的对比指标。
+
+用法: python -m benchmarks.import_time [--module app.main] [--runs 5] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+def profile_once(module: str, env: dict[str, str]) -> dict[str, tuple[int, int]]:
+    """返回 {模块名: (self_us, cumulative_us)}"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    runs = [profile_once(args.module, env) for _ in range(args.runs)]
+    totals = [run[args.module][1] for run in runs]
+    # 用耗时中位数的那次运行展示明细
+    median_run = sorted(runs, key=lambda run: run[args.module][1])[len(runs) // 2]
+
+    print(f"import {args.module}: median {statistics.median(totals) / 1000:.1f} ms, "
+          f"min {min(totals) / 1000:.1f} ms over {args.runs} runs, {len(median_run)} modules imported")
+    print(f"\ntop {args.top} modules by cumulative time:")
+    for name, (_, cumulative_us) in sorted(median_run.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+    print("\napp modules (self time):")
+    for name, (self_us, _) in sorted(median_run.items()):
+        if name == "app" or name.startswith("app."):
+            print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""端到端压测：通过模拟提供商走完整的 OAuth 登录，然后请求 /protected-route 并用 cookie 中的 refresh token 刷新
+
+准备:
+    python -m benchmarks.mock_provider 9000
+    OAUTH_MOCK_BASE_URL=http://127.0.0.1:9000 MONGODB_URL=mongomock:// uvicorn app.main:app
+    （MONGODB_URL 也可以指向真实的 MongoDB；mongomock 需要 pip install -r benchmarks/requirements.txt）
+    所有请求来自同一个 IP，压测时需要 RATE_LIMIT_ENABLED=false，否则大部分登录会被限流
+
+用法: python -m benchmarks.load [--logins N] [--requests N] [--concurrency N] [--providers google,linkedin,facebook]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import time
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+
+def summarize(name: str, samples: list[float], errors: int, elapsed: float):
+    if not samples:
+        print(f"{name}: no successful requests, errors={errors}")
+        return
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    print(
+        f"{name:16s} n={len(samples)} errors={errors} "
+        f"throughput={len(samples) / elapsed:.1f}/s "
+        f"p50={pct(0.50):.1f}ms p95={pct(0.95):.1f}ms p99={pct(0.99):.1f}ms"
+    )
+
+
+def cookie_header(*responses: httpx.Response) -> dict[str, str]:
+    """把响应设置的 cookie 显式带到下一跳
+
+    所有并发登录共用一个客户端，共享的 cookie jar 会让同名 cookie 互相覆盖；
+    Secure cookie 在 http 压测地址上也不会被 jar 发送。
+    """
+    cookies = {name: value for response in responses for name, value in response.cookies.items()}
+    return {"Cookie": "; ".join(f"{name}={value}" for name, value in cookies.items())} if cookies else {}
+
+
+async def follow_login(client: httpx.AsyncClient, provider: str) -> httpx.Response:
+    """login -> 模拟提供商 authorize -> callback，返回 callback 的重定向响应"""
+    login = await client.get(f"/auth/{provider}/login")
+    authorize = await client.get(login.headers["location"])
+    return await client.get(authorize.headers["location"], headers=cookie_header(login))
+
+
+def token_subject(token: str) -> str:
+    """不校验签名，只取出 JWT 里的用户 id"""
+    payload = token.split(".")[1]
+    return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))["sub"]
+
+
+async def run_stage(total: int, concurrency: int, request_fn) -> tuple[list[float], int, float, list]:
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: list[float] = []
+    results = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                results.append(await request_fn(i))
+                samples.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return samples, errors, time.perf_counter() - start, results
+
+
+async def main(args):
+    providers = args.providers.split(",")
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+        async def login(i: int) -> tuple[str, str | None]:
+            provider = providers[i % len(providers)]
+            # callback 重定向到 /auth-success，access token 在查询串里，refresh token 在 cookie 里
+            response = await follow_login(client, provider)
+            query = parse_qs(urlparse(response.headers.get("location", "")).query)
+            if not query.get("access_token"):
+                raise RuntimeError(f"Login failed: {response.headers.get('location')}")
+            return query["access_token"][0], response.cookies.get("refresh_token")
+
+        samples, errors, elapsed, logins = await run_stage(args.logins, args.concurrency, login)
+        summarize("oauth login", samples, errors, elapsed)
+        if not logins:
+            return
+        tokens = [access_token for access_token, _ in logins]
+        refresh_tokens = [refresh_token for _, refresh_token in logins if refresh_token]
+
+        async def protected(i: int):
+            response = await client.get(
+                "/protected-route", headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+            )
+            response.raise_for_status()
+
+        samples, errors, elapsed, _ = await run_stage(args.requests, args.concurrency, protected)
+        summarize("protected-route", samples, errors, elapsed)
+
+        # 头像代理：第一轮并发请求触发下载（同一图片只下载一次），之后走本地缓存
+        user_ids = sorted({token_subject(token) for token in tokens})
+
+        async def avatar(i: int):
+            response = await client.get(f"/avatars/{user_ids[i % len(user_ids)]}")
+            response.raise_for_status()
+
+        samples, errors, elapsed, _ = await run_stage(args.requests, args.concurrency, avatar)
+        summarize("avatar", samples, errors, elapsed)
+
+        async def refresh(i: int):
+            response = await client.post("/auth/jwt/refresh", headers={"Cookie": f"refresh_token={refresh_tokens[i]}"})
+            response.raise_for_status()
+
+        if refresh_tokens:
+            samples, errors, elapsed, _ = await run_stage(len(refresh_tokens), args.concurrency, refresh)
+            summarize("token refresh", samples, errors, elapsed)
+
+        # 模拟双击/客户端重试：同一个回调 URL（同一授权码）并发请求两次，两次都应登录成功
+        async def duplicate_callback(i: int):
+            provider = providers[i % len(providers)]
+            login = await client.get(f"/auth/{provider}/login")
+            response = await client.get(login.headers["location"])
+            callback_url = response.headers["location"]
+            headers = cookie_header(login)
+            responses = await asyncio.gather(client.get(callback_url, headers=headers), client.get(callback_url, headers=headers))
+            for response in responses:
+                if "/auth-success" not in response.headers.get("location", ""):
+                    raise RuntimeError(f"Duplicate callback failed: {response.headers.get('location')}")
+
+        samples, errors, elapsed, _ = await run_stage(args.logins, args.concurrency, duplicate_callback)
+        summarize("dup callback", samples, errors, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OAuth login and /protected-route load benchmark")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--providers", default="google,linkedin,facebook")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,66 @@
+"""/protected-route 日志开销的微基准
+
+对比旧写法 logger.info(f"User info: {user.dict()}") 与新写法（惰性参数、采样、
+队列 handler）每次请求的 CPU 耗时。输出被丢弃，只测量格式化和分发成本。
+
+用法: python -m benchmarks.logging_overhead [次数]
+"""
+import io
+import logging
+import sys
+import time
+
+from bson import ObjectId
+from pydantic import BaseModel
+
+from app.logging_config import SampledLogger, setup_logging, shutdown_logging
+
+
+class FakeUser(BaseModel):
+    id: str
+    email: str
+    hashed_password: str
+    first_name: str
+    last_name: str
+    picture: str
+    oauth_provider: str
+    is_active: bool = True
+    is_superuser: bool = False
+    is_verified: bool = False
+
+
+def per_call_us(fn, iterations: int) -> float:
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations * 1_000_000
+
+
+def main(iterations: int):
+    user = FakeUser(
+        id=str(ObjectId()), email="user@example.com", hashed_password="!oauth",
+        first_name="John", last_name="Doe", picture="https://example.com/a.png", oauth_provider="google",
+    )
+
+    # 旧配置：basicConfig + 同步 StreamHandler，每次请求都输出完整的用户文档
+    old_logger = logging.getLogger("bench.old")
+    old_logger.propagate = False
+    old_logger.addHandler(logging.StreamHandler(io.StringIO()))
+    old_logger.setLevel(logging.INFO)
+    old = per_call_us(lambda: old_logger.info(f"User info: {user.model_dump()}"), iterations)
+
+    # 新配置：队列 handler + 脱敏 + 1% 采样，只记录 id
+    stderr, sys.stderr = sys.stderr, io.StringIO()
+    setup_logging()
+    new_logger = SampledLogger(logging.getLogger("bench.new"), 0.01)
+    new = per_call_us(lambda: new_logger.info("Protected route accessed by user %s", user.id), iterations)
+    shutdown_logging()
+    sys.stderr = stderr
+
+    print(f"old f-string + user.dict(): {old:.2f} us/request")
+    print(f"lazy + sampled + queued:    {new:.2f} us/request")
+    print(f"saved:                      {old - new:.2f} us/request")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,196 @@
+"""本地模拟的 Google / LinkedIn / Facebook OAuth 提供商
+
+提供 authorize、token 和 userinfo（Facebook 为 /me）端点，用于压测时替代真实提供商。
+头像 URL 指向本服务的 /avatars/<n>.png，/stats 返回头像被下载的次数。
+授权时从 MOCK_USER_POOL 个虚拟用户中随机挑一个，因此既有新用户也有重复登录。
+Google 和 LinkedIn 还提供 OIDC discovery、JWKS，并在 token 响应中返回签名的 id_token。
+POST /faults 可以在运行时给 token 和 userinfo 端点注入故障，例如
+{"slow_rate": 0.1, "delay": 2, "error_rate": 0.2}：10% 的请求延迟 2 秒，20% 返回 503。
+
+启动: python -m benchmarks.mock_provider [端口]
+然后用 OAUTH_MOCK_BASE_URL=http://127.0.0.1:<端口> 启动应用。
+"""
+import asyncio
+import os
+import random
+import struct
+import sys
+import time
+import zlib
+from urllib.parse import urlencode
+
+import jwt
+import uvicorn
+from cryptography.hazmat.primitives.asymmetric import rsa
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, RedirectResponse, Response
+from starlette.routing import Route
+
+MOCK_USER_POOL = int(os.getenv("MOCK_USER_POOL", "1000"))
+OIDC_PROVIDERS = ("google", "linkedin")
+KEY_ID = "mock-key-1"
+
+signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+public_jwk = jwt.algorithms.RSAAlgorithm.to_jwk(signing_key.public_key(), as_dict=True)
+public_jwk.update({"kid": KEY_ID, "alg": "RS256", "use": "sig"})
+avatar_downloads = 0
+faults = {"slow_rate": 0.0, "delay": 0.0, "error_rate": 0.0}
+
+
+async def inject_fault() -> Response | None:
+    if random.random() < faults["slow_rate"]:
+        await asyncio.sleep(faults["delay"])
+    if random.random() < faults["error_rate"]:
+        return JSONResponse({"error": "temporarily_unavailable"}, status_code=503)
+    return None
+
+
+def issuer(request: Request, provider: str) -> str:
+    return f"{str(request.base_url).rstrip('/')}/{provider}"
+
+
+def user_profile(request: Request, user_number: str) -> dict:
+    return {
+        "id": f"mock-{user_number}",
+        "email": f"user{user_number}@example.com",
+        "given_name": "Mock",
+        "family_name": f"User{user_number}",
+        "picture": f"{str(request.base_url).rstrip('/')}/avatars/{user_number}.png",
+    }
+
+
+def user_from_token(request: Request) -> str | None:
+    authorization = request.headers.get("authorization", "")
+    token = authorization.removeprefix("Bearer ") or request.query_params.get("access_token", "")
+    if not token.startswith("token-"):
+        return None
+    return token.removeprefix("token-")
+
+
+async def authorize(request: Request):
+    params = request.query_params
+    code = f"code-{random.randrange(MOCK_USER_POOL)}"
+    query = urlencode({"code": code, "state": params.get("state", "")})
+    return RedirectResponse(url=f"{params['redirect_uri']}?{query}")
+
+
+async def token(request: Request):
+    if (fault := await inject_fault()) is not None:
+        return fault
+    form = await request.form()
+    code = form.get("code", "")
+    if not code.startswith("code-"):
+        return JSONResponse({"error": "invalid_grant"}, status_code=400)
+    user_number = code.removeprefix("code-")
+    body = {
+        "access_token": f"token-{user_number}",
+        "token_type": "Bearer",
+        "expires_in": 3600,
+    }
+    provider = request.path_params["provider"]
+    if provider in OIDC_PROVIDERS:
+        profile = user_profile(request, user_number)
+        now = int(time.time())
+        claims = {
+            "iss": issuer(request, provider),
+            "aud": form.get("client_id"),
+            "sub": profile.pop("id"),
+            "iat": now,
+            "exp": now + 3600,
+            **profile,
+        }
+        body["id_token"] = jwt.encode(claims, signing_key, algorithm="RS256", headers={"kid": KEY_ID})
+    return JSONResponse(body)
+
+
+async def discovery(request: Request):
+    provider = request.path_params["provider"]
+    base = issuer(request, provider)
+    return JSONResponse({
+        "issuer": base,
+        "authorization_endpoint": f"{base}/authorize",
+        "token_endpoint": f"{base}/token",
+        "userinfo_endpoint": f"{base}/userinfo",
+        "jwks_uri": f"{base}/jwks",
+        "id_token_signing_alg_values_supported": ["RS256"],
+    })
+
+
+async def jwks(request: Request):
+    return JSONResponse({"keys": [public_jwk]})
+
+
+async def oidc_userinfo(request: Request):
+    if (fault := await inject_fault()) is not None:
+        return fault
+    user_number = user_from_token(request)
+    if user_number is None:
+        return JSONResponse({"error": "invalid_token"}, status_code=401)
+    profile = user_profile(request, user_number)
+    if request.path_params["provider"] == "linkedin":
+        profile["sub"] = profile.pop("id")
+    return JSONResponse(profile)
+
+
+async def facebook_me(request: Request):
+    if (fault := await inject_fault()) is not None:
+        return fault
+    user_number = user_from_token(request)
+    if user_number is None:
+        return JSONResponse({"error": {"message": "Invalid OAuth access token"}}, status_code=401)
+    profile = user_profile(request, user_number)
+    return JSONResponse({
+        "id": profile["id"],
+        "email": profile["email"],
+        "first_name": profile["given_name"],
+        "last_name": profile["family_name"],
+        "picture": {"data": {"url": profile["picture"]}},
+    })
+
+
+def png_pixel(seed: int) -> bytes:
+    """每个用户一张不同颜色的 1x1 PNG"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    pixel = bytes([0, seed % 256, seed // 256 % 256, 128])
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(pixel))
+        + chunk(b"IEND", b"")
+    )
+
+
+async def avatar(request: Request):
+    global avatar_downloads
+    avatar_downloads += 1
+    return Response(png_pixel(request.path_params["user_number"]), media_type="image/png")
+
+
+async def stats(request: Request):
+    return JSONResponse({"avatar_downloads": avatar_downloads})
+
+
+async def set_faults(request: Request):
+    faults.update({key: float(value) for key, value in (await request.json()).items() if key in faults})
+    return JSONResponse(faults)
+
+
+app = Starlette(routes=[
+    Route("/{provider}/authorize", authorize),
+    Route("/{provider}/token", token, methods=["POST"]),
+    Route("/{provider}/userinfo", oidc_userinfo),
+    Route("/facebook/me", facebook_me),
+    Route("/{provider}/.well-known/openid-configuration", discovery),
+    Route("/{provider}/jwks", jwks),
+    Route("/avatars/{user_number:int}.png", avatar),
+    Route("/stats", stats),
+    Route("/faults", set_faults, methods=["POST"]),
+])
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 9000
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
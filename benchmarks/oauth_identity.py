@@ -0,0 +1,93 @@
+"""多提供商登录：按提供商身份查找用户，以及交替使用不同提供商登录时的写入次数
+
+先用 google 登录创建 N 个用户，再用 linkedin 第一次登录（按 email 找到并关联），
+然后交替用两个提供商登录 --rounds 轮。资料不变时交替登录不再改写 oauth_provider，
+background_jobs_total{kind="profile_sync"} 不应增加。
+连接真实 MongoDB 时打印身份查找的 explain（应当走 oauth_identity 索引，keys=1 docs=1）；
+mongomock 不支持 explain，不检查多键唯一索引，也不支持 pymongo 4.9+ 的
+bulk_write(UpdateOne)（后台批量写会失败），只能做冒烟测试。
+
+用法: python -m benchmarks.oauth_identity [用户数，默认 2000] [--rounds 2] [--concurrency 20]
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi_users.db import BeanieUserDatabase
+
+from app.auth import UserManager, identity_match, password_helper
+from app.db import close_db, get_users_collection, init_db
+from app.jobs import job_queue
+from app.metrics import render_metrics
+from app.models import User
+from benchmarks.load import summarize
+
+
+def profile(provider: str, i: int) -> dict:
+    return {
+        "account_id": f"{provider}-{i}",
+        "email": f"identity{i}@example.com",
+        "first_name": "Identity",
+        "last_name": f"User{i}",
+        "picture": f"https://example.com/avatars/{i}.png",
+    }
+
+
+async def run(name: str, manager: UserManager, provider: str, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: list[float] = []
+
+    async def one(i: int):
+        async with semaphore:
+            started_at = time.perf_counter()
+            await manager.upsert_oauth_user(provider, profile(provider, i))
+            samples.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    summarize(name, samples, 0, time.perf_counter() - started_at)
+
+
+def print_job_counts():
+    body, _ = render_metrics()
+    lines = [
+        line for line in body.decode().splitlines()
+        if line.startswith("background_jobs_total") and ("profile_sync" in line or "oauth_last_login" in line)
+    ]
+    print("\n".join(f"  {line}" for line in lines) or "  no profile_sync or oauth_last_login jobs")
+
+
+async def explain_identity_lookup() -> str:
+    query = {"oauth_accounts": identity_match("linkedin", "linkedin-0")}
+    try:
+        plan = await get_users_collection().find(query).limit(1).explain()
+    except Exception:
+        return "explain unavailable"
+    stats = plan.get("executionStats", {})
+    return f"keys={stats.get('totalKeysExamined')} docs={stats.get('totalDocsExamined')}"
+
+
+async def main(args):
+    await init_db()
+    manager = UserManager(BeanieUserDatabase(User), password_helper)
+    job_queue.start()
+    try:
+        await run("create (google)", manager, "google", args.total, args.concurrency)
+        await run("link (linkedin)", manager, "linkedin", args.total, args.concurrency)
+        print_job_counts()
+        for round_ in range(args.rounds):
+            for provider in ("google", "linkedin"):
+                await run(f"round {round_} {provider}", manager, provider, args.total, args.concurrency)
+        await job_queue.stop()
+        print_job_counts()
+        print(f"identity lookup: {await explain_identity_lookup()}")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provider-identity lookups and writes for users logging in with several providers")
+    parser.add_argument("total", type=int, nargs="?", default=2000)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
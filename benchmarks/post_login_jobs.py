@@ -0,0 +1,74 @@
+"""回调路径上的用户写入耗时：同步写入与后台队列对比
+
+先创建 N 个 OAuth 用户，然后对这些老用户分别测量 upsert_oauth_user 的耗时：
+    unchanged   资料没有变化（只读一次，不写）
+    changed     资料有变化，队列运行中（读一次，变化字段交给后台批量写）
+    inline      资料有变化，队列未启动（读一次后同步写入，即队列满时的退化路径）
+最后停止队列（会先写完剩余任务），打印 background_jobs_total。
+
+MONGODB_URL 指向测试库，或用 mongomock:// 做冒烟测试（mongomock 不支持
+pymongo 4.9+ 的 bulk_write(UpdateOne)，后台批量写会报错，只能看回调路径耗时）。
+
+用法: python -m benchmarks.post_login_jobs [用户数，默认 2000] [--concurrency 20]
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi_users.db import BeanieUserDatabase
+
+from app.auth import UserManager, password_helper
+from app.db import close_db, init_db
+from app.jobs import job_queue
+from app.metrics import render_metrics
+from app.models import User
+from benchmarks.load import summarize
+
+
+def profile(i: int, version: int) -> dict:
+    return {
+        "email": f"jobs{i}@example.com",
+        "first_name": "Jobs",
+        "last_name": f"User{i}",
+        "picture": f"https://example.com/avatars/{i}-{version}.png",
+    }
+
+
+async def run(name: str, manager: UserManager, total: int, concurrency: int, version: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: list[float] = []
+
+    async def one(i: int):
+        async with semaphore:
+            started_at = time.perf_counter()
+            await manager.upsert_oauth_user("google", profile(i, version))
+            samples.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    summarize(name, samples, 0, time.perf_counter() - started_at)
+
+
+async def main(args):
+    await init_db()
+    manager = UserManager(BeanieUserDatabase(User), password_helper)
+    try:
+        await run("create", manager, args.total, args.concurrency, version=0)
+        job_queue.start()
+        await run("unchanged", manager, args.total, args.concurrency, version=0)
+        await run("changed", manager, args.total, args.concurrency, version=1)
+        await job_queue.stop()
+        await run("inline", manager, args.total, args.concurrency, version=2)
+        body, _ = render_metrics()
+        for line in body.decode().splitlines():
+            if line.startswith("background_jobs_total"):
+                print(line)
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Callback-path user write latency with and without the job queue")
+    parser.add_argument("total", type=int, nargs="?", default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,44 @@
+"""简单的 /protected-route 吞吐量测试
+
+用法: python benchmarks/protected_route.py YOUR_ACCESS_TOKEN [总请求数] [并发数]
+
+在改动前后分别对运行中的服务执行，比较 requests/sec。
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+
+BASE_URL = "http://localhost:8000"
+
+
+async def run(token: str, total: int, concurrency: int):
+    headers = {"Authorization": f"Bearer {token}"}
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async with httpx.AsyncClient(base_url=BASE_URL, headers=headers) as client:
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                response = await client.get("/protected-route")
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+
+    print(f"requests: {total}, concurrency: {concurrency}, errors: {errors}")
+    print(f"elapsed: {elapsed:.2f}s, requests/sec: {total / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    token = sys.argv[1]
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    asyncio.run(run(token, total, concurrency))
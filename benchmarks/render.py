@@ -0,0 +1,67 @@
+"""/auth-success 页面渲染的微基准
+
+对比旧写法（每次请求拼接一个大 f-string，令牌未转义直接写进 <script>）与
+app.pages 中预编译模板 + 转义的渲染耗时，分别测量只生成响应体和构造完整
+响应对象（含内容协商）的 CPU 成本。
+
+用法: python -m benchmarks.render [次数]
+"""
+import secrets
+import sys
+import time
+
+from fastapi.responses import HTMLResponse
+from starlette.requests import Request
+
+from app.pages import render_auth_success, render_success_html
+
+
+def per_call_us(fn, iterations: int) -> float:
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations * 1_000_000
+
+
+def old_render(access_token: str) -> str:
+    return f"""
+    <html>
+        <head>
+            <title>Authentication Successful</title>
+        </head>
+        <body>
+            <h1>Authentication Successful</h1>
+            <p>Your access token is: {access_token}</p>
+            <script>
+                // 这里可以添加将令牌存储到localStorage的代码
+                localStorage.setItem('access_token', '{access_token}');
+            </script>
+        </body>
+    </html>
+    """
+
+
+def make_request(accept: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/auth-success", "headers": [(b"accept", accept.encode())]})
+
+
+def main(iterations: int):
+    access_token = secrets.token_urlsafe(180)
+    html_request = make_request("text/html,application/xhtml+xml;q=0.9,*/*;q=0.8")
+    json_request = make_request("application/json")
+
+    old_body = per_call_us(lambda: old_render(access_token), iterations)
+    new_body = per_call_us(lambda: render_success_html(access_token), iterations)
+    old = per_call_us(lambda: HTMLResponse(old_render(access_token)), iterations)
+    new_html = per_call_us(lambda: render_auth_success(html_request, access_token), iterations)
+    new_json = per_call_us(lambda: render_auth_success(json_request, access_token), iterations)
+
+    print(f"body only   old f-string:          {old_body:.2f} us/request")
+    print(f"body only   precompiled + escape:  {new_body:.2f} us/request")
+    print(f"response    old f-string:          {old:.2f} us/request")
+    print(f"response    negotiated HTML:       {new_html:.2f} us/request")
+    print(f"response    negotiated JSON:       {new_json:.2f} us/request")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,70 @@
+"""提供商变慢或出错时的登录表现：依次给模拟提供商注入不同故障，统计登录耗时和结果
+
+场景: healthy（正常）、slow tail（10% 请求慢 3 秒）、flaky（30% 返回 503）、
+outage（全部 503，熔断应当打开并快速失败）、recovered（恢复正常，先等待
+--breaker-reset 秒，熔断通过探测请求关闭）。最后打印 provider_* 指标。
+
+准备:
+    python -m benchmarks.mock_provider 9000
+    OAUTH_MOCK_BASE_URL=http://127.0.0.1:9000 MONGODB_URL=mongomock:// RATE_LIMIT_ENABLED=false \\
+        OIDC_ID_TOKEN_ENABLED=false uvicorn app.main:app
+    （关闭 id_token 后每次登录都会请求 userinfo；对比对冲请求加 PROVIDER_HEDGE_DELAY_SECONDS=0.2）
+
+用法: python -m benchmarks.resilience [--logins 100] [--concurrency 10] [--breaker-reset 30]
+                                     [--providers google,linkedin,facebook]
+（--breaker-reset 应与应用的 PROVIDER_BREAKER_RESET_SECONDS 一致）
+"""
+import argparse
+import asyncio
+from collections import Counter
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+from benchmarks.load import follow_login, run_stage, summarize
+
+SCENARIOS = [
+    ("healthy", {"slow_rate": 0, "delay": 0, "error_rate": 0}),
+    ("slow tail", {"slow_rate": 0.1, "delay": 3, "error_rate": 0}),
+    ("flaky", {"slow_rate": 0, "delay": 0, "error_rate": 0.3}),
+    ("outage", {"slow_rate": 0, "delay": 0, "error_rate": 1}),
+    ("recovered", {"slow_rate": 0, "delay": 0, "error_rate": 0}),
+]
+
+
+async def main(args):
+    providers = args.providers.split(",")
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        for name, faults in SCENARIOS:
+            if name == "recovered":
+                await asyncio.sleep(args.breaker_reset)
+            await client.post(f"{args.mock_url}/faults", json=faults)
+            outcomes: Counter[str] = Counter()
+
+            async def login(i: int):
+                response = await follow_login(client, providers[i % len(providers)])
+                query = parse_qs(urlparse(response.headers["location"]).query)
+                outcome = "success" if query.get("access_token") else query.get("error", ["unknown"])[0]
+                outcomes[outcome] += 1
+
+            samples, errors, elapsed, _ = await run_stage(args.logins, args.concurrency, login)
+            summarize(name, samples, errors, elapsed)
+            print(f"{'':16s} outcomes: {dict(outcomes)}")
+
+        await client.post(f"{args.mock_url}/faults", json=SCENARIOS[0][1])
+        metrics = (await client.get("/metrics")).text
+    for line in metrics.splitlines():
+        if line.startswith("provider_") and not line.startswith("provider_calls_created"):
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OAuth login behaviour under provider faults")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--mock-url", default="http://127.0.0.1:9000")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--breaker-reset", type=float, default=30)
+    parser.add_argument("--providers", default="google,linkedin,facebook")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,101 @@
+"""GET /users 列表的分页性能：游标分页与 skip/limit 在深页上的对比
+
+先导入 N 个合成用户（提供商、是否启用交替分布），然后：
+    1. 各种筛选组合的第一页耗时
+    2. 用游标连续翻 --pages 页，记录第一页和最后一页的耗时
+    3. 用 skip 直接跳到同一深度，对比耗时
+连接真实 MongoDB 时还会打印 explain 的 totalKeysExamined / totalDocsExamined，
+游标分页每页都应当只有约 limit 个。mongomock 不支持 explain，只能做冒烟测试。
+
+用法: python -m benchmarks.user_listing [用户数，默认 2000000] [--pages 200] [--limit 50] [--skip-seed]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.bulk import import_users
+from app.db import close_db, get_users_collection, init_db
+from app.user_listing import build_query, list_users
+
+PROVIDERS = ("google", "linkedin", "facebook", None)
+FILTERS = [
+    ("no filter", {}),
+    ("provider", {"oauth_provider": "linkedin"}),
+    ("active", {"is_active": False}),
+    ("provider+active", {"oauth_provider": "google", "is_active": True}),
+    ("email prefix", {"email_prefix": "list0001"}),
+    ("prefix+provider", {"email_prefix": "list00", "oauth_provider": "facebook"}),
+    ("prefix+active", {"email_prefix": "list00", "is_active": False}),
+    ("prefix+both", {"email_prefix": "list00", "oauth_provider": "google", "is_active": True}),
+]
+
+
+def synthetic_users(total: int):
+    for i in range(total):
+        yield json.dumps({
+            "email": f"list{i:08d}@example.com",
+            "first_name": "List",
+            "last_name": f"User{i}",
+            "oauth_provider": PROVIDERS[i % len(PROVIDERS)],
+            "is_active": i % 10 != 0,
+        })
+
+
+async def timed(fn):
+    started_at = time.perf_counter()
+    result = await fn()
+    return result, (time.perf_counter() - started_at) * 1000
+
+
+async def explain(filters: dict, limit: int, cursor: str | None = None) -> str:
+    query, sort, hint, _ = build_query(
+        filters.get("oauth_provider"), filters.get("is_active"), filters.get("email_prefix"), cursor,
+    )
+    try:
+        plan = await get_users_collection().find(query, {"email": 1}).sort(sort).hint(hint).limit(limit + 1).explain()
+    except Exception:
+        return "explain unavailable"
+    stats = plan.get("executionStats", {})
+    return f"keys={stats.get('totalKeysExamined')} docs={stats.get('totalDocsExamined')}"
+
+
+async def main(args):
+    await init_db()
+    try:
+        if not args.skip_seed:
+            stats = await import_users(synthetic_users(args.total))
+            print(f"seed: {json.dumps(stats)}")
+
+        for name, filters in FILTERS:
+            page, ms = await timed(lambda: list_users(limit=args.limit, **filters))
+            print(f"first page {name:16s} {ms:8.1f}ms items={len(page['items'])} {await explain(filters, args.limit)}")
+
+        cursor = None
+        page_times = []
+        for _ in range(args.pages):
+            page, ms = await timed(lambda: list_users(limit=args.limit, cursor=cursor))
+            page_times.append(ms)
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        print(
+            f"keyset: {len(page_times)} pages, first={page_times[0]:.1f}ms last={page_times[-1]:.1f}ms "
+            f"{await explain({}, args.limit, cursor)}"
+        )
+
+        offset = (len(page_times) - 1) * args.limit
+        _, ms = await timed(lambda: get_users_collection().find({}, {"email": 1}).sort("_id", -1)
+                            .skip(offset).limit(args.limit).to_list(length=args.limit))
+        print(f"skip/limit at offset {offset}: {ms:.1f}ms (scans every skipped index entry)")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keyset vs offset pagination over the users collection")
+    parser.add_argument("total", type=int, nargs="?", default=2_000_000)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse users from a previous run")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,168 @@
+"""单进程 uvicorn 与 app.server 多 worker 的吞吐量对比
+
+依次启动两种模式（单进程: uvicorn app.main:app；多 worker: python -m app.server），
+等 /health/ready 就绪后，用多个客户端进程在固定时间内压测同一个接口，再发送
+SIGTERM 验证优雅退出。默认压测 /protected-route：设置了 MONGODB_URL 时先注册并登录一个
+压测用户，之后每个请求校验 token 并从 user_cache 读取用户；没有设置时用 mongomock，它在
+多个 worker 间不共享数据，于是开启 JWT_CLAIMS_ONLY 并在本地签发带用户资料的 token，
+不依赖登录流程和数据库。
+
+用法: python -m benchmarks.workers [--workers N] [--seconds 10] [--clients 4] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+from bson import ObjectId
+from fastapi_users.jwt import generate_jwt
+
+from benchmarks.load import summarize
+
+SECRET_KEY = "benchmark-secret-benchmark-secret-0000"
+BENCH_USER = {"email": "bench@example.com", "password": "benchmark-password"}
+
+
+def server_env() -> dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("MONGODB_URL", "mongomock://")
+    env.setdefault("SECRET_KEY", SECRET_KEY)
+    env.setdefault("GOOGLE_CLIENT_ID", "benchmark")
+    env.setdefault("OIDC_ID_TOKEN_ENABLED", "false")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    if env["MONGODB_URL"].startswith("mongomock"):
+        env.setdefault("JWT_CLAIMS_ONLY", "true")
+    return env
+
+
+def mint_token(secret: str) -> str:
+    """claims-only 模式下的压测 token，用户资料都在 claims 里"""
+    claims = {
+        "sub": str(ObjectId()),
+        "aud": ["fastapi-users:auth"],
+        "email": BENCH_USER["email"],
+        "first_name": "Bench",
+        "last_name": "User",
+        "picture": None,
+        "oauth_provider": "google",
+        "is_active": True,
+    }
+    return generate_jwt(claims, secret, 3600)
+
+
+def login_token(base_url: str) -> str:
+    """注册（已存在时忽略）并登录压测用户，返回 access token"""
+    httpx.post(f"{base_url}/auth/register", json=BENCH_USER, timeout=30)
+    response = httpx.post(
+        f"{base_url}/auth/jwt/login",
+        data={"username": BENCH_USER["email"], "password": BENCH_USER["password"]},
+        timeout=30,
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def start_server(mode: str, port: int, workers: int) -> subprocess.Popen:
+    if mode == "single":
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-m", "app.server", "--workers", str(workers), "--port", str(port)]
+    return subprocess.Popen(command, env=server_env(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+
+def wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"server exited during startup:\n{process.stderr.read()[-2000:]}")
+        try:
+            if httpx.get(f"{base_url}/health/ready", timeout=1).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit("server did not become ready in time")
+
+
+async def drive(base_url: str, path: str, token: str | None, seconds: float, concurrency: int) -> tuple[list[float], int, float]:
+    samples: list[float] = []
+    errors = 0
+    started_at = time.perf_counter()
+    deadline = started_at + seconds
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=30) as client:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    response.raise_for_status()
+                    samples.append(time.perf_counter() - start)
+                except Exception:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, errors, time.perf_counter() - started_at
+
+
+def client_process(args: tuple) -> tuple[list[float], int, float]:
+    return asyncio.run(drive(*args))
+
+
+def run_mode(mode: str, args) -> None:
+    base_url = f"http://127.0.0.1:{args.port}"
+    process = start_server(mode, args.port, args.workers)
+    try:
+        wait_ready(base_url, process)
+        token = None
+        if args.path == "/protected-route":
+            env = server_env()
+            claims_only = env.get("JWT_CLAIMS_ONLY", "").lower() in ("1", "true", "yes")
+            token = mint_token(env["SECRET_KEY"]) if claims_only else login_token(base_url)
+        # 客户端本身也会吃满 CPU，分到多个进程里，避免压测端成为瓶颈
+        with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+            results = pool.map(
+                client_process,
+                [(base_url, args.path, token, args.seconds, args.concurrency)] * args.clients,
+            )
+        # 不把客户端进程的启动时间算进去
+        elapsed = max(result[2] for result in results)
+        samples = [sample for result in results for sample in result[0]]
+        errors = sum(result[1] for result in results)
+        label = "single process" if mode == "single" else f"{args.workers} workers"
+        summarize(label, samples, errors, elapsed)
+    finally:
+        drain_started_at = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=60)
+            print(f"{'':16s} SIGTERM -> exit {process.returncode} in {time.perf_counter() - drain_started_at:.1f}s")
+        except subprocess.TimeoutExpired:
+            process.kill()
+            print(f"{'':16s} did not exit within 60s after SIGTERM, killed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-process vs multi-worker throughput")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--path", default="/protected-route")
+    parser.add_argument("--port", type=int, default=8200)
+    args = parser.parse_args()
+
+    print(f"cpus={os.cpu_count()} path={args.path} clients={args.clients}x{args.concurrency} seconds={args.seconds}")
+    for mode in ("single", "workers"):
+        run_mode(mode, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""测试环境：mongomock 代替 MongoDB，benchmarks/mock_provider 代替三个 OAuth 提供商
+
+应用和模拟提供商都在进程内通过 ASGI 调用，不监听端口。配置在导入 app 之前写入环境变量。
+
+运行: pip install -r requirements.txt -r tests/requirements.txt && python -m pytest
+"""
+import os
+import tempfile
+
+os.environ.update({
+    "MONGODB_URL": "mongomock://",
+    "SECRET_KEY": "test-secret-test-secret-test-secret-0000",
+    "APP_BASE_URL": "https://testserver",
+    "GOOGLE_CLIENT_ID": "mock-google",
+    "LINKEDIN_CLIENT_ID": "mock-linkedin",
+    "FACEBOOK_CLIENT_ID": "mock-facebook",
+    "OAUTH_MOCK_BASE_URL": "http://mock-provider",
+    "RATE_LIMIT_ENABLED": "false",
+    "AVATAR_CACHE_DIR": tempfile.mkdtemp(prefix="avatar-cache-"),
+    "LOG_LEVEL": "WARNING",
+})
+
+from urllib.parse import parse_qs, urlparse  # noqa: E402
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+from app import http_client  # noqa: E402
+from app.cache import user_cache  # noqa: E402
+from app.db import get_client, get_users_collection  # noqa: E402
+from app.main import app  # noqa: E402
+from app.refresh_tokens import REFRESH_TOKEN_COLLECTION  # noqa: E402
+from benchmarks import mock_provider  # noqa: E402
+
+APP_URL = "https://testserver"
+
+
+class HostTransport(httpx.AsyncBaseTransport):
+    """按主机名把请求分给应用或模拟提供商"""
+
+    def __init__(self):
+        self.transports = {
+            "testserver": httpx.ASGITransport(app=app),
+            "mock-provider": httpx.ASGITransport(app=mock_provider.app),
+        }
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.transports[request.url.host].handle_async_request(request)
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def started_app(anyio_backend):
+    # 应用对提供商的调用（换 token、userinfo、JWKS、头像）也走进程内的模拟提供商
+    http_client._client = httpx.AsyncClient(transport=HostTransport())
+    async with app.router.lifespan_context(app):
+        yield app
+
+
+@pytest.fixture
+async def client(started_app):
+    async with httpx.AsyncClient(transport=HostTransport(), base_url=APP_URL) as client:
+        yield client
+    await get_users_collection().delete_many({})
+    await get_client()["fastapi_oauth_db"][REFRESH_TOKEN_COLLECTION].delete_many({})
+    user_cache.clear()
+
+
+async def oauth_login(client: httpx.AsyncClient, provider: str) -> dict[str, str]:
+    """走完 login -> 模拟提供商 authorize -> callback 的重定向链
+
+    返回 /auth-success 查询串里的 access token，以及 callback 通过 cookie 下发的 refresh token。
+    """
+    response = await client.get(f"/auth/{provider}/login", follow_redirects=True, headers={"accept": "application/json"})
+    assert urlparse(str(response.url)).path == "/auth-success", response.url
+    tokens = {key: values[0] for key, values in parse_qs(urlparse(str(response.url)).query).items()}
+    for hop in response.history:
+        if "refresh_token" in hop.cookies:
+            tokens["refresh_token"] = hop.cookies["refresh_token"]
+    return tokens
+
+
+async def register_and_login(client: httpx.AsyncClient, email: str, password: str = "correct-horse-battery") -> str:
+    response = await client.post("/auth/register", json={"email": email, "password": password})
+    assert response.status_code == 201, response.text
+    response = await client.post("/auth/jwt/login", data={"username": email, "password": password})
+    assert response.status_code == 200, response.text
+    return response.json()["access_token"]
+
+
+async def superuser_login(client: httpx.AsyncClient, email: str = "admin@example.com") -> dict[str, str]:
+    """注册一个用户并直接在数据库里提升为超级用户，返回带 token 的请求头"""
+    token = await register_and_login(client, email)
+    await get_users_collection().update_one({"email": email}, {"$set": {"is_superuser": True}})
+    user_cache.clear()
+    return {"Authorization": f"Bearer {token}"}
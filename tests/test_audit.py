@@ -0,0 +1,112 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from app import audit
+from app.audit import FileAuditSink, MongoAuditSink
+from app.jobs import job_queue
+from tests.conftest import superuser_login
+
+pytestmark = pytest.mark.anyio
+
+EVENTS = [
+    {"at": datetime(2026, 1, 1, hour, tzinfo=timezone.utc), "provider": "audit-test", "outcome": f"event-{hour}"}
+    for hour in (9, 10, 11)
+]
+
+
+@pytest.fixture(params=["mongo", "file"])
+async def sink(request, tmp_path, monkeypatch):
+    if request.param == "file":
+        monkeypatch.setattr(audit, "audit_sink", FileAuditSink(str(tmp_path / "audit.ndjson"), 1024 * 1024, 2))
+    await audit.audit_sink.write([dict(event) for event in EVENTS])
+    yield audit.audit_sink
+    if request.param == "mongo":
+        await audit.audit_sink._collection().delete_many({"provider": "audit-test"})
+
+
+async def export(client, headers=None, **params) -> list[dict]:
+    headers = headers or await superuser_login(client)
+    response = await client.get("/admin/audit/export", params={"provider": "audit-test", **params}, headers=headers)
+    assert response.status_code == 200, response.text
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.mark.parametrize("since, until", [
+    ("2026-01-01T10:00:00+00:00", "2026-01-01T11:00:00Z"),
+    # 同一时间段的其他写法：+08:00 偏移和不带时区（按 UTC）
+    ("2026-01-01T18:00:00+08:00", "2026-01-01T19:00:00+08:00"),
+    ("2026-01-01T10:00:00", "2026-01-01T11:00:00"),
+])
+async def test_export_range_compares_times_across_timezones(client, sink, since, until):
+    events = await export(client, since=since, until=until)
+    assert [event["outcome"] for event in events] == ["event-10"]
+    assert events[0]["at"] == "2026-01-01T10:00:00+00:00"
+
+
+async def test_export_rejects_malformed_times(client, sink):
+    headers = await superuser_login(client)
+    response = await client.get("/admin/audit/export", params={"since": "yesterday"}, headers=headers)
+    assert response.status_code == 400
+
+
+async def test_export_filters_by_field_and_open_ended_range(client, sink):
+    headers = await superuser_login(client)
+    events = await export(client, headers, since="2026-01-01T10:00:00Z")
+    assert [event["outcome"] for event in events] == ["event-10", "event-11"]
+    events = await export(client, headers, until="2026-01-01T10:00:00Z", outcome="event-9")
+    assert [event["outcome"] for event in events] == ["event-9"]
+    assert await export(client, headers, outcome="event-10", until="2026-01-01T10:00:00Z") == []
+
+
+async def test_queued_login_events_are_written_in_one_batch(client, monkeypatch):
+    writes = []
+    write = MongoAuditSink.write
+
+    async def recording_write(self, events):
+        writes.append([event for event in events if event["provider"] == "audit-test"])
+        await write(self, events)
+
+    monkeypatch.setattr(MongoAuditSink, "write", recording_write)
+    for event in EVENTS:
+        assert job_queue.submit("login_audit", dict(event))
+    await asyncio.sleep(0.2)
+    # 同一批里可能还有其他测试留下的登录事件，这里只看本测试提交的
+    assert [len(batch) for batch in writes if batch] == [len(EVENTS)]
+    assert await audit.audit_sink._collection().count_documents({"provider": "audit-test"}) == len(EVENTS)
+    await audit.audit_sink._collection().delete_many({"provider": "audit-test"})
+
+
+async def test_mongo_sink_creates_a_capped_collection(monkeypatch):
+    created = {}
+
+    class Database:
+        async def list_collection_names(self):
+            return []
+
+        async def create_collection(self, name, **options):
+            created[name] = options
+
+        def __getitem__(self, name):
+            return Collection()
+
+    class Collection:
+        async def create_index(self, keys, name):
+            created["index"] = (keys, name)
+
+    monkeypatch.setattr(audit, "MONGODB_URL", "mongodb://audit-db")
+    monkeypatch.setattr(audit, "get_client", lambda: {audit.DATABASE_NAME: Database()})
+    await MongoAuditSink().create_collection()
+    assert created["login_audit"] == {"capped": True, "size": audit.AUDIT_COLLECTION_MAX_BYTES}
+    assert created["index"] == ([("at", 1)], "at")
+
+
+async def test_file_sink_rotates_and_exports_oldest_first(tmp_path):
+    sink = FileAuditSink(str(tmp_path / "audit.ndjson"), max_bytes=200, backups=5)
+    for event in EVENTS:
+        await sink.write([dict(event)])
+    assert (tmp_path / "audit.ndjson.1").exists()
+    exported = [event async for event in sink.export({})]
+    assert [event["outcome"] for event in exported] == ["event-9", "event-10", "event-11"]
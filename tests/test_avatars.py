@@ -0,0 +1,77 @@
+import os
+
+import httpx
+import pytest
+
+from app import avatars
+from app.avatars import AvatarCache, AvatarError
+
+pytestmark = pytest.mark.anyio
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"0" * 32
+
+
+@pytest.fixture
+def requested(monkeypatch):
+    """上游：/hop/<n> 重定向 n 次后返回图片，/downgrade 重定向到内网 http 地址"""
+    urls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        urls.append(str(request.url))
+        path = request.url.path
+        if path.startswith("/hop/"):
+            hops = int(path.rsplit("/", 1)[1])
+            if hops == 0:
+                return httpx.Response(200, content=PNG, headers={"content-type": "image/png"})
+            return httpx.Response(302, headers={"location": f"/hop/{hops - 1}"})
+        if path == "/downgrade":
+            return httpx.Response(302, headers={"location": "http://169.254.169.254/latest/meta-data/"})
+        return httpx.Response(404)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(avatars, "get_http_client", lambda: client)
+    return urls
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AvatarCache(str(tmp_path), max_bytes=1024 * 1024, max_image_bytes=1024, max_redirects=2)
+
+
+async def test_redirects_within_the_limit_are_followed(cache, requested):
+    content, content_type = await cache.fetch("https://cdn.example/hop/2")
+    assert content == PNG
+    assert content_type == "image/png"
+    assert requested == ["https://cdn.example/hop/2", "https://cdn.example/hop/1", "https://cdn.example/hop/0"]
+
+
+async def test_too_many_redirects_are_rejected(cache, requested):
+    with pytest.raises(AvatarError):
+        await cache.fetch("https://cdn.example/hop/3")
+    assert len(requested) == 3
+
+
+async def test_redirect_to_a_non_https_url_is_not_followed(cache, requested):
+    with pytest.raises(AvatarError):
+        await cache.fetch("https://cdn.example/downgrade")
+    assert requested == ["https://cdn.example/downgrade"]
+
+
+def test_concurrent_writes_to_the_same_path_use_separate_temp_files(tmp_path, monkeypatch):
+    # 让两次写入交错：第一次写完临时文件、还没 rename 时，第二次写入开始
+    path = str(tmp_path / "ab" / "blob")
+    replace = os.replace
+    pending = []
+
+    def interleaved_replace(src, dst):
+        if not pending:
+            pending.append(src)
+            AvatarCache._write_atomic(path, b"second")
+            assert os.path.exists(src)
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", interleaved_replace)
+    AvatarCache._write_atomic(path, b"first")
+    with open(path, "rb") as f:
+        assert f.read() == b"first"
+    assert os.listdir(tmp_path / "ab") == ["blob"]
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+from beanie import PydanticObjectId
+
+from app.bulk import _invalidate_cached_users, import_users
+from app.cache import user_cache
+from app.db import get_users_collection
+from tests.conftest import register_and_login, superuser_login
+
+pytestmark = pytest.mark.anyio
+
+
+def lines(*users: dict) -> list[str]:
+    return [json.dumps(user) for user in users]
+
+
+async def test_import_inserts_users_with_defaults(client):
+    stats = await import_users(lines({"email": "a@example.com", "first_name": "A"}, {"email": "b@example.com"}))
+    assert stats["inserted"] == 2
+    user = await get_users_collection().find_one({"email": "a@example.com"})
+    assert user["first_name"] == "A"
+    assert user["is_active"] is True
+    assert user["hashed_password"] == "!oauth"
+
+
+async def test_duplicates_are_skipped_by_default(client):
+    await import_users(lines({"email": "a@example.com", "first_name": "A"}))
+    stats = await import_users(lines({"email": "a@example.com", "first_name": "B"}, {"email": "b@example.com"}))
+    assert stats["inserted"] == 1
+    assert stats["duplicates"] == 1
+    assert (await get_users_collection().find_one({"email": "a@example.com"}))["first_name"] == "A"
+
+
+async def test_rows_with_plaintext_passwords_or_bad_json_are_counted_invalid(client):
+    stats = await import_users(["{not json", json.dumps({"email": "a@example.com", "password": "secret"}), "   "])
+    assert stats["invalid"] == 2
+    assert stats["inserted"] == 0
+    assert [rejection["line"] for rejection in stats["rejected"]] == [1, 2]
+
+
+@pytest.mark.parametrize("row", [
+    {"email": "not-an-email@"},
+    {"email": "a@example.com", "is_active": "yes"},
+    {"email": "a@example.com", "is_superuser": 1},
+    {"email": "a@example.com", "first_name": 42},
+    {"email": "a@example.com", "hashed_password": ""},
+    {"first_name": "No email"},
+    ["a@example.com"],
+])
+async def test_rows_failing_the_import_schema_are_rejected_with_reason(client, row):
+    stats = await import_users(lines({"email": "ok@example.com"}, row))
+    assert stats["inserted"] == 1
+    assert stats["invalid"] == 1
+    assert stats["rejected"][0]["line"] == 2
+    assert stats["rejected"][0]["error"]
+    assert await get_users_collection().count_documents({}) == 1
+
+
+async def test_updated_users_are_evicted_from_the_cache(client):
+    token = await register_and_login(client, "cached@example.com")
+    response = await client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+    user_id = PydanticObjectId(response.json()["id"])
+    assert user_cache.get(user_id) is not None
+    # update 模式的 bulk_write 在 mongomock 上不可用，这里直接验证写入后调用的淘汰逻辑
+    await _invalidate_cached_users([{"email": "cached@example.com"}])
+    assert user_cache.get(user_id) is None
+
+
+async def test_export_streams_without_password_hashes(client):
+    await import_users(lines({"email": "a@example.com", "hashed_password": "$2b$12$hash"}))
+    headers = await superuser_login(client)
+    response = await client.get("/admin/users/export", headers=headers)
+    assert response.status_code == 200
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert {user["email"] for user in exported} == {"a@example.com", "admin@example.com"}
+    assert all("hashed_password" not in user for user in exported)
+    response = await client.get("/admin/users/export", params={"fields": "email,hashed_password"}, headers=headers)
+    assert response.status_code == 400
+
+
+async def test_admin_routes_require_superuser(client):
+    assert (await client.get("/admin/users/export")).status_code == 401
+    assert (await client.post("/admin/users/import", content=b"")).status_code == 401
+
+
+async def test_non_utf8_upload_is_rejected_with_the_line_number(client):
+    headers = await superuser_login(client)
+    body = json.dumps({"email": "a@example.com"}).encode() + b"\n" + b'{"email": "caf\xe9@example.com"}\n'
+    response = await client.post("/admin/users/import", content=body, headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Line 2 is not valid UTF-8"
@@ -0,0 +1,69 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from beanie import PydanticObjectId
+
+from app import bulk
+from app.bulk import import_users
+from app.cache import user_cache
+from tests.conftest import register_and_login
+
+pytestmark = pytest.mark.anyio
+
+
+async def cached_user_id(client, token: str) -> PydanticObjectId:
+    response = await client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+    user_id = PydanticObjectId(response.json()["id"])
+    assert user_cache.get(user_id) is not None
+    return user_id
+
+
+async def test_profile_update_replaces_the_cached_user(client):
+    token = await register_and_login(client, "patched@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = await cached_user_id(client, token)
+
+    response = await client.patch("/users/me", json={"email": "renamed@example.com"}, headers=headers)
+    assert response.status_code == 200
+    assert user_cache.get(user_id).email == "renamed@example.com"
+    assert (await client.get("/protected-route", headers=headers)).json()["email"] == "renamed@example.com"
+
+
+class UpsertOneByOne:
+    """mongomock 的 bulk_write 不接受 pymongo 新版 UpdateOne 的参数，这里逐条执行同样的 upsert"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def bulk_write(self, requests, ordered=True):
+        modified = upserted = 0
+        for request in requests:
+            result = await self.collection.update_one(request._filter, request._doc, upsert=request._upsert)
+            modified += result.modified_count
+            upserted += result.upserted_id is not None
+        return SimpleNamespace(modified_count=modified, upserted_count=upserted)
+
+
+async def test_bulk_update_evicts_imported_users_from_the_cache(client, monkeypatch):
+    get_users_collection = bulk.get_users_collection
+    monkeypatch.setattr(bulk, "get_users_collection", lambda: UpsertOneByOne(get_users_collection()))
+    token = await register_and_login(client, "imported@example.com")
+    user_id = await cached_user_id(client, token)
+
+    stats = await import_users([json.dumps({"email": "imported@example.com", "first_name": "Imported"})], on_duplicate="update")
+    assert stats["updated"] == 1
+    assert user_cache.get(user_id) is None
+    response = await client.get("/protected-route", headers={"Authorization": f"Bearer {token}"})
+    assert response.json()["first_name"] == "Imported"
+
+
+async def test_bulk_skip_leaves_cached_users_alone(client):
+    token = await register_and_login(client, "skipped@example.com")
+    user_id = await cached_user_id(client, token)
+    stats = await import_users([json.dumps({"email": "skipped@example.com", "first_name": "Ignored"})])
+    assert stats["duplicates"] == 1
+    assert user_cache.get(user_id) is not None
@@ -0,0 +1,33 @@
+import pytest
+from fastapi import HTTPException
+from fastapi_users.password import PasswordHelper
+
+from app import hashing
+from app.hashing import hash_password, verify_and_update_password
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_full_queue_is_rejected_with_retry_after(monkeypatch):
+    monkeypatch.setattr(hashing, "HASH_MAX_QUEUE", 0)
+    with pytest.raises(HTTPException) as exc_info:
+        await hash_password(PasswordHelper(), "correct-horse-battery")
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers == {"Retry-After": "1"}
+
+
+async def test_process_executor_hashes_and_verifies(monkeypatch):
+    hashing.shutdown_executor()
+    monkeypatch.setattr(hashing, "HASH_EXECUTOR", "process")
+    monkeypatch.setattr(hashing, "HASH_MAX_WORKERS", 1)
+    helper = PasswordHelper()
+    try:
+        hashed = await hash_password(helper, "correct-horse-battery")
+        assert type(hashing.get_executor()).__name__ == "ProcessPoolExecutor"
+        verified, _ = await verify_and_update_password(helper, "correct-horse-battery", hashed)
+        assert verified
+        verified, _ = await verify_and_update_password(helper, "wrong-password", hashed)
+        assert not verified
+    finally:
+        # 恢复默认的线程池，后续测试重新创建
+        hashing.shutdown_executor()
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from fastapi_users.db import BeanieUserDatabase
+
+from app import auth
+from app.auth import UserManager, password_helper
+from app.db import get_users_collection
+from app.jobs import JobQueue
+from app.models import User
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def queue():
+    batches = []
+
+    async def handler(payloads):
+        batches.append(payloads)
+
+    jobs = JobQueue(max_size=100, batch_size=3, flush_interval=0.05)
+    jobs.register("test", handler)
+    jobs.start()
+    jobs.batches = batches
+    yield jobs
+    await jobs.stop()
+
+
+async def test_jobs_are_batched_up_to_the_batch_size(queue):
+    for i in range(7):
+        assert queue.submit("test", i)
+    await asyncio.sleep(0.2)
+    assert queue.batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+async def test_partial_batch_is_flushed_after_the_interval(queue):
+    queue.flush_interval = 0.2
+    queue.submit("test", "a")
+    await asyncio.sleep(0.02)
+    queue.submit("test", "b")
+    assert queue.batches == []
+    await asyncio.sleep(0.4)
+    assert queue.batches == [["a", "b"]]
+    queue.submit("test", "c")
+    await asyncio.sleep(0.4)
+    assert queue.batches == [["a", "b"], ["c"]]
+
+
+async def test_stop_drains_queued_jobs_without_waiting_for_the_interval(queue):
+    queue.flush_interval = 60
+    for i in range(5):
+        queue.submit("test", i)
+    await asyncio.wait_for(queue.stop(), 5)
+    assert [payload for batch in queue.batches for payload in batch] == [0, 1, 2, 3, 4]
+    assert not queue.submit("test", 5)
+
+
+async def test_full_queue_rejects_jobs():
+    handled = []
+
+    async def handler(payloads):
+        handled.extend(payloads)
+
+    jobs = JobQueue(max_size=1, batch_size=10, flush_interval=0)
+    jobs.register("test", handler)
+    jobs.start()
+    # submit 不让出事件循环，消费协程还没取走第一个任务
+    assert jobs.submit("test", 1)
+    assert not jobs.submit("test", 2)
+    await jobs.stop()
+    assert handled == [1]
+
+
+async def test_profile_sync_is_written_inline_when_the_queue_is_full(client, monkeypatch):
+    user_manager = UserManager(BeanieUserDatabase(User), password_helper)
+    profile = {"account_id": "jobs-1", "email": "jobs@example.com", "first_name": "Old"}
+    await user_manager.upsert_oauth_user("google", profile)
+
+    # 队列满：资料变更不能丢，同步写入
+    monkeypatch.setattr(auth.job_queue, "submit", lambda kind, payload: False)
+    user = await user_manager.upsert_oauth_user("google", {**profile, "first_name": "New"})
+    assert user.first_name == "New"
+    assert (await get_users_collection().find_one({"email": "jobs@example.com"}))["first_name"] == "New"
@@ -0,0 +1,92 @@
+import time
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from bson import ObjectId
+
+from app.auth import current_active_token_user, current_active_user, jwt_strategy
+from app.cache import user_cache
+from app.jwt_strategy import CachedJWTStrategy
+from app.db import get_users_collection
+from app.main import app
+from tests.conftest import oauth_login, register_and_login
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cached_claims_expire_with_the_token():
+    strategy = CachedJWTStrategy(secret="secret", lifetime_seconds=2)
+    token = await strategy.write_token(SimpleNamespace(id=ObjectId()))
+    assert strategy.decode(token) is not None
+    expires_at, _ = strategy.token_cache._data[token]
+    # 缓存的默认 TTL 比 token 寿命长，条目必须在 exp 之前过期
+    assert strategy.token_cache.ttl_seconds > 2
+    assert expires_at - time.monotonic() <= 2
+
+
+async def test_expired_token_is_not_served_from_the_cache(monkeypatch):
+    strategy = CachedJWTStrategy(secret="secret", lifetime_seconds=60)
+    token = await strategy.write_token(SimpleNamespace(id=ObjectId()))
+    assert strategy.decode(token) is not None
+    monkeypatch.setattr(time, "time", lambda: 10**10)
+    assert strategy.decode(token) is None
+    assert token not in strategy.token_cache._data
+
+
+async def test_logout_evicts_the_cached_claims(client):
+    token = await register_and_login(client, "logout@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    assert (await client.get("/protected-route", headers=headers)).status_code == 200
+    assert token in jwt_strategy.token_cache._data
+
+    assert (await client.post("/auth/jwt/logout", headers=headers)).status_code == 204
+    assert token not in jwt_strategy.token_cache._data
+    assert (await client.get("/protected-route", headers=headers)).status_code == 401
+
+
+def claims_of(token: str) -> dict:
+    return jwt.decode(token, options={"verify_signature": False})
+
+
+@pytest.fixture
+def claims_only(monkeypatch):
+    """等同于 JWT_CLAIMS_ONLY=true：签发带资料的 token，/protected-route 使用 claims-only 依赖"""
+    monkeypatch.setattr(jwt_strategy, "profile_claims", True)
+    app.dependency_overrides[current_active_user] = current_active_token_user
+    yield
+    app.dependency_overrides.pop(current_active_user)
+
+
+async def test_claims_only_token_is_served_without_loading_the_user(client, claims_only):
+    token = await register_and_login(client, "claims@example.com")
+    assert claims_of(token)["email"] == "claims@example.com"
+
+    # 用户从数据库和缓存里都删掉，只读接口仍然只靠签名的 claims 返回资料
+    await get_users_collection().delete_many({})
+    user_cache.clear()
+    response = await client.get("/protected-route", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()["email"] == "claims@example.com"
+
+
+async def test_oauth_callback_token_stays_minimal_in_claims_only_mode(client, claims_only):
+    tokens = await oauth_login(client, "google")
+    assert set(claims_of(tokens["access_token"])) == {"sub", "aud", "exp"}
+
+    # 没有资料的 token 回退到按 sub 加载用户
+    response = await client.get("/protected-route", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert response.status_code == 200
+    user = await get_users_collection().find_one({"email": response.json()["email"]})
+    assert user["oauth_provider"] == "google"
+
+    # refresh 在响应体里返回的 token 带资料
+    response = await client.post("/auth/jwt/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert claims_of(response.json()["access_token"])["email"] == user["email"]
+
+
+async def test_claims_only_rejects_inactive_and_invalid_tokens(client, claims_only):
+    inactive = SimpleNamespace(id=ObjectId(), email="inactive@example.com", is_active=False)
+    token = await jwt_strategy.write_token(inactive)
+    assert (await client.get("/protected-route", headers={"Authorization": f"Bearer {token}"})).status_code == 401
+    assert (await client.get("/protected-route", headers={"Authorization": "Bearer not-a-token"})).status_code == 401
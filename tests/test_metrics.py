@@ -0,0 +1,25 @@
+import pytest
+
+from app.metrics import render_metrics
+
+pytestmark = pytest.mark.anyio
+
+
+def request_routes() -> set[str]:
+    content, _ = render_metrics()
+    return {
+        line.split('route="', 1)[1].split('"', 1)[0]
+        for line in content.decode().splitlines()
+        if line.startswith("http_request_duration_seconds_count")
+    }
+
+
+async def test_request_latency_is_labelled_with_the_full_route_template(client):
+    await client.get("/auth/google/callback")
+    await client.get("/auth/facebook/callback")
+    await client.get("/users")
+    routes = request_routes()
+    assert {"/auth/google/callback", "/auth/facebook/callback", "/users"} <= routes
+    # 子路由的相对路径不能单独出现，否则各提供商的回调会合并成一个标签
+    assert "/callback" not in routes
+    assert "" not in routes
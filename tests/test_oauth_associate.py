@@ -0,0 +1,58 @@
+import pytest
+
+from app.db import get_users_collection
+from app.auth import get_oauth_associate_router
+from app.providers import OAuthProvider, providers
+from tests.conftest import register_and_login
+
+pytestmark = pytest.mark.anyio
+
+
+async def associate(client, provider: str, token: str):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = await client.get(f"/auth/{provider}/associate/authorize", headers=headers)
+    assert response.status_code == 200, response.text
+    # 模拟提供商的 authorize 直接重定向回关联回调，带上 code 和 state
+    redirect = await client.get(response.json()["authorization_url"])
+    assert redirect.status_code == 307
+    return await client.get(redirect.headers["location"], headers=headers)
+
+
+@pytest.mark.parametrize("provider", ["google", "linkedin", "facebook"])
+async def test_associate_callback_links_provider_account(client, provider):
+    token = await register_and_login(client, f"{provider}-owner@example.com")
+    response = await associate(client, provider, token)
+    assert response.status_code == 200, response.text
+    accounts = response.json()["oauth_accounts"]
+    assert [account["provider"] for account in accounts] == [provider]
+    assert accounts[0]["account_id"].startswith("mock-")
+
+    user = await get_users_collection().find_one({"email": f"{provider}-owner@example.com"})
+    assert [account["account_id"] for account in user["oauth_accounts"]] == [accounts[0]["account_id"]]
+
+
+async def test_associate_requires_login(client):
+    assert (await client.get("/auth/google/associate/authorize")).status_code == 401
+
+
+def test_building_the_router_does_not_create_the_oauth_client(monkeypatch):
+    def client_factory():
+        raise AssertionError("client created while building routes")
+
+    monkeypatch.setitem(providers, "lazy", OAuthProvider("lazy", client_factory, fetch_profile=None))
+    router = get_oauth_associate_router("lazy")
+    assert {route.name for route in router.routes} == {"oauth-associate:lazy.authorize", "oauth-associate:lazy.callback"}
+
+
+async def test_protected_route_reports_the_registration_and_linked_providers(client):
+    token = await register_and_login(client, "linked@example.com")
+    await associate(client, "linkedin", token)
+    await associate(client, "google", token)
+
+    response = await client.get("/protected-route", headers={"Authorization": f"Bearer {token}"})
+    body = response.json()
+    assert body["oauth_provider"] == "Email"
+    assert body["linked_providers"] == ["google", "linkedin"]
+    assert body["additional_info"] == (
+        "You registered with Email authentication. Linked sign-in providers: google, linkedin."
+    )
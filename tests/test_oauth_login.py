@@ -0,0 +1,68 @@
+import jwt
+import pytest
+from bson import ObjectId
+
+from app.db import get_users_collection
+from tests.conftest import oauth_login
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("provider", ["google", "linkedin", "facebook"])
+async def test_oauth_login_creates_user_and_issues_tokens(client, provider):
+    tokens = await oauth_login(client, provider)
+    assert tokens["access_token"] and tokens["refresh_token"]
+
+    response = await client.get("/protected-route", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert response.status_code == 200
+    user = await get_users_collection().find_one({"email": response.json()["email"]})
+    assert user["oauth_provider"] == provider
+    assert [account["provider"] for account in user["oauth_accounts"]] == [provider]
+
+
+async def test_access_token_carries_no_profile_data(client):
+    tokens = await oauth_login(client, "google")
+    claims = jwt.decode(tokens["access_token"], options={"verify_signature": False})
+    assert set(claims) == {"sub", "aud", "exp"}
+
+    # 资料只从已认证的接口返回
+    response = await client.get("/protected-route", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    user = await get_users_collection().find_one({"_id": ObjectId(claims["sub"])})
+    assert response.json()["email"] == user["email"]
+    assert response.json()["first_name"] == user["first_name"]
+
+
+async def test_repeated_login_resolves_the_same_user(client):
+    for _ in range(3):
+        await oauth_login(client, "google")
+    emails = [user["email"] async for user in get_users_collection().find({}, {"email": 1})]
+    assert len(emails) == len(set(emails))
+
+
+@pytest.mark.parametrize("state", ["forged.state", "e30.é"])
+async def test_callback_rejects_forged_state(client, state):
+    response = await client.get("/auth/google/callback", params={"code": "code-1", "state": state})
+    assert response.status_code == 307
+    assert "error=invalid_state" in response.headers["location"]
+
+
+async def test_callback_requires_code(client):
+    response = await client.get("/auth/google/callback")
+    assert "error=missing_code" in response.headers["location"]
+
+
+async def test_state_from_another_browser_is_rejected(client):
+    login = await client.get("/auth/google/login")
+    assert "httponly" in login.headers["set-cookie"].lower()
+    authorize = await client.get(login.headers["location"])
+    callback_url = authorize.headers["location"]
+
+    # 截获的回调地址在没有 state cookie 或 cookie 不匹配的浏览器里无效
+    client.cookies.clear()
+    response = await client.get(callback_url)
+    assert "error=invalid_state" in response.headers["location"]
+    response = await client.get(callback_url, headers={"Cookie": "oauth_state=someone-else"})
+    assert "error=invalid_state" in response.headers["location"]
+
+    response = await client.get(callback_url, headers={"Cookie": f"oauth_state={login.cookies['oauth_state']}"})
+    assert response.headers["location"].startswith("/auth-success?")
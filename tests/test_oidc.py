@@ -0,0 +1,57 @@
+import httpx
+import pytest
+
+from app import oidc, resilience
+from app.oidc import OIDCProvider
+from app.providers import OAuthProvider
+from app.resilience import ProviderResilience, ProviderUnavailable, login_deadline
+
+pytestmark = pytest.mark.anyio
+
+DISCOVERY_URL = "https://idp.example/.well-known/openid-configuration"
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(resilience, "PROVIDER_RETRY_BASE_DELAY_SECONDS", 0)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """discovery 正常返回，JWKS 前 jwks_failures 次返回 503"""
+    state = {"jwks_failures": 0, "jwks_calls": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/.well-known/openid-configuration":
+            return httpx.Response(200, json={"issuer": "https://idp.example", "jwks_uri": "https://idp.example/jwks"})
+        state["jwks_calls"] += 1
+        if state["jwks_calls"] <= state["jwks_failures"]:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"keys": [{"kid": "k1", "kty": "oct", "k": "c2VjcmV0"}]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(oidc, "get_http_client", lambda: client)
+    return state
+
+
+def test_provider_shares_its_resilience_with_the_oidc_cache():
+    provider = OAuthProvider("test", lambda: None, fetch_profile=None, oidc=OIDCProvider(DISCOVERY_URL))
+    assert provider.oidc.resilience is provider.resilience
+    assert provider.oidc.discovery.resilience is provider.resilience
+
+
+async def test_jwks_fetch_is_retried_on_5xx(upstream):
+    upstream["jwks_failures"] = 1
+    provider = OIDCProvider(DISCOVERY_URL, resilience=ProviderResilience("test"))
+    key = await provider.get_signing_key("k1")
+    assert key.key_id == "k1"
+    assert upstream["jwks_calls"] == 2
+    assert provider.jwks.resilience is provider.resilience
+
+
+async def test_jwks_fetch_respects_the_login_deadline(upstream):
+    provider = OIDCProvider(DISCOVERY_URL, resilience=ProviderResilience("test"))
+    await provider.discovery.get()
+    with login_deadline(0), pytest.raises(ProviderUnavailable):
+        await provider.get_signing_key("k1")
+    assert upstream["jwks_calls"] == 0
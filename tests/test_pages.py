@@ -0,0 +1,52 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+HTML = {"accept": "text/html,application/xhtml+xml"}
+
+
+async def test_error_page_escapes_error_and_description(client):
+    params = {"error": "<script>alert(1)</script>", "description": '"><img src=x onerror=alert(2)>'}
+    response = await client.get("/auth-error", params=params, headers=HTML)
+    assert response.headers["content-type"].startswith("text/html")
+    assert "<script>alert(1)" not in response.text
+    assert "<img" not in response.text
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in response.text
+    assert "&quot;&gt;&lt;img src=x onerror=alert(2)&gt;" in response.text
+
+
+async def test_success_page_escapes_the_token_in_text_and_attribute(client):
+    response = await client.get("/auth-success", params={"access_token": 'a"b<c'}, headers=HTML)
+    assert 'data-access-token="a&quot;b&lt;c"' in response.text
+    assert '<code id="access-token">a&quot;b&lt;c</code>' in response.text
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/auth-success", {"access_token": "token-1"}),
+    ("/auth-error", {"error": "invalid_state", "description": "Invalid or expired state"}),
+])
+async def test_pages_negotiate_html_or_json_and_are_never_stored(client, path, params):
+    html = await client.get(path, params=params, headers=HTML)
+    assert html.headers["content-type"].startswith("text/html")
+    for accept in ("application/json", "*/*", None):
+        response = await client.get(path, params=params, headers={"accept": accept} if accept else {})
+        assert response.headers["content-type"] == "application/json"
+        assert set(params.values()) <= set(response.json().values())
+        assert response.headers["cache-control"] == "no-store"
+    assert html.headers["cache-control"] == "no-store"
+
+
+async def test_auth_success_script_is_cacheable_and_revalidates_with_etag(client):
+    response = await client.get("/static/auth-success.js")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/javascript")
+    assert "max-age" in response.headers["cache-control"]
+    etag = response.headers["etag"]
+
+    response = await client.get("/static/auth-success.js", headers={"if-none-match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = await client.get("/static/auth-success.js", headers={"if-none-match": '"stale"'})
+    assert response.status_code == 200
@@ -0,0 +1,96 @@
+import ipaddress
+
+import pytest
+from fastapi import HTTPException, Request
+
+from app import ratelimit
+from app.config import Settings
+from app.ratelimit import ConcurrencyLimiter, MemoryRateLimitBackend, RateLimiter, client_ip
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_bucket_allows_burst_then_asks_to_wait():
+    backend = MemoryRateLimitBackend(max_keys=10)
+    for _ in range(3):
+        assert await backend.take("ip:1", rate=1, burst=3) == 0
+    assert await backend.take("ip:1", rate=1, burst=3) > 0
+    # 其他 key 有自己的桶
+    assert await backend.take("ip:2", rate=1, burst=3) == 0
+
+
+async def test_bucket_refills_over_time(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.ratelimit.time.monotonic", lambda: now[0])
+    backend = MemoryRateLimitBackend(max_keys=10)
+    assert await backend.take("ip:1", rate=2, burst=1) == 0
+    assert await backend.take("ip:1", rate=2, burst=1) == pytest.approx(0.5)
+    now[0] += 0.5
+    assert await backend.take("ip:1", rate=2, burst=1) == 0
+
+
+async def test_least_recently_used_buckets_are_evicted():
+    backend = MemoryRateLimitBackend(max_keys=2)
+    for key in ("a", "b", "c"):
+        await backend.take(key, rate=1, burst=1)
+    assert list(backend._buckets) == ["b", "c"]
+
+
+async def test_rate_limiter_raises_429_with_retry_after():
+    limiter = RateLimiter(MemoryRateLimitBackend(max_keys=10))
+    await limiter.check("oauth", "ip", "1.2.3.4", rate=0.5, burst=1)
+    with pytest.raises(HTTPException) as error:
+        await limiter.check("oauth", "ip", "1.2.3.4", rate=0.5, burst=1)
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == "2"
+
+
+def test_concurrency_limiter_rejects_over_limit():
+    limiter = ConcurrencyLimiter("oauth", limit=1)
+    limiter.acquire()
+    with pytest.raises(HTTPException) as error:
+        limiter.acquire()
+    assert error.value.status_code == 503
+    limiter.release()
+    limiter.acquire()
+
+
+def make_request(peer: str, *forwarded_for: str) -> Request:
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded_for]
+    return Request({"type": "http", "client": (peer, 50000), "headers": headers})
+
+
+@pytest.fixture
+def trusted_proxies(monkeypatch):
+    networks = tuple(ipaddress.ip_network(proxy) for proxy in ("10.0.0.0/8", "127.0.0.1"))
+    monkeypatch.setattr(ratelimit, "TRUSTED_PROXY_NETWORKS", networks)
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies():
+    assert client_ip(make_request("203.0.113.9", "198.51.100.1")) == "203.0.113.9"
+
+
+def test_forwarded_for_from_an_untrusted_peer_is_ignored(trusted_proxies):
+    assert client_ip(make_request("203.0.113.9", "198.51.100.1")) == "203.0.113.9"
+
+
+@pytest.mark.parametrize("forwarded_for, expected", [
+    (["198.51.100.1"], "198.51.100.1"),
+    # 客户端自己带的 X-Forwarded-For 在最左边，取最右边的不受信任地址
+    (["1.1.1.1, 198.51.100.1"], "198.51.100.1"),
+    (["1.1.1.1, 198.51.100.1, 10.0.0.7"], "198.51.100.1"),
+    (["1.1.1.1", "198.51.100.1, 10.0.0.7"], "198.51.100.1"),
+    (["10.0.0.8, 10.0.0.7"], "10.0.0.8"),
+    ([], "10.0.0.5"),
+    (["not-an-ip, 10.0.0.7"], "10.0.0.7"),
+])
+def test_client_ip_is_the_rightmost_untrusted_forwarded_hop(trusted_proxies, forwarded_for, expected):
+    assert client_ip(make_request("10.0.0.5", *forwarded_for)) == expected
+
+
+def test_trusted_proxies_setting_is_parsed_and_validated(monkeypatch):
+    monkeypatch.setenv("TRUSTED_PROXIES", "10.0.0.0/8, 127.0.0.1")
+    assert Settings.from_env().TRUSTED_PROXIES == ("10.0.0.0/8", "127.0.0.1")
+    monkeypatch.setenv("TRUSTED_PROXIES", "10.0.0.0/8,proxy.internal")
+    with pytest.raises(ValueError, match="TRUSTED_PROXIES"):
+        Settings.from_env()
@@ -0,0 +1,66 @@
+import pytest
+
+from app.refresh_tokens import RefreshTokenError, issue_refresh_token, rotate_refresh_token
+from tests.conftest import oauth_login
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_rotation_returns_a_new_token_for_the_same_user(client):
+    token = await issue_refresh_token("user-1")
+    user_id, new_token = await rotate_refresh_token(token)
+    assert user_id == "user-1"
+    assert new_token != token
+    user_id, _ = await rotate_refresh_token(new_token)
+    assert user_id == "user-1"
+
+
+async def test_reusing_a_rotated_token_revokes_the_family(client):
+    token = await issue_refresh_token("user-1")
+    _, new_token = await rotate_refresh_token(token)
+    with pytest.raises(RefreshTokenError):
+        await rotate_refresh_token(token)
+    # 重放旧 token 后，同一 family 里还没用过的新 token 也失效
+    with pytest.raises(RefreshTokenError):
+        await rotate_refresh_token(new_token)
+
+
+async def test_unknown_token_is_rejected(client):
+    with pytest.raises(RefreshTokenError):
+        await rotate_refresh_token("not-a-token")
+
+
+async def test_refresh_and_revoke_endpoints(client):
+    tokens = await oauth_login(client, "google")
+    response = await client.post("/auth/jwt/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    refreshed = response.json()
+    assert refreshed["refresh_token"] != tokens["refresh_token"]
+
+    response = await client.get("/protected-route", headers={"Authorization": f"Bearer {refreshed['access_token']}"})
+    assert response.status_code == 200
+
+    assert (await client.post("/auth/jwt/revoke", json={"refresh_token": refreshed["refresh_token"]})).status_code == 204
+    response = await client.post("/auth/jwt/refresh", json={"refresh_token": refreshed["refresh_token"]})
+    assert response.status_code == 401
+
+
+async def test_oauth_login_delivers_the_refresh_token_in_an_http_only_cookie(client):
+    response = await client.get("/auth/google/login", follow_redirects=True)
+    assert "refresh_token" not in str(response.url)
+    callback = response.history[-1]
+    set_cookie = callback.headers["set-cookie"].lower()
+    for attribute in ("httponly", "secure", "samesite=strict", "path=/auth/jwt"):
+        assert attribute in set_cookie
+
+    # 不带请求体时用 cookie 里的 refresh token，轮换后的新 token 写回 cookie
+    response = await client.post("/auth/jwt/refresh")
+    assert response.status_code == 200
+    assert "refresh_token" not in response.json()
+    rotated = response.cookies["refresh_token"]
+    assert rotated != callback.cookies["refresh_token"]
+    response = await client.get("/protected-route", headers={"Authorization": f"Bearer {response.json()['access_token']}"})
+    assert response.status_code == 200
+
+    assert (await client.post("/auth/jwt/revoke")).status_code == 204
+    assert (await client.post("/auth/jwt/refresh", json={"refresh_token": rotated})).status_code == 401
@@ -0,0 +1,94 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import resilience
+from app.resilience import ProviderResilience, ProviderTimeout, ProviderUnavailable, login_deadline
+
+pytestmark = pytest.mark.anyio
+
+
+def status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://provider.example/userinfo")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status_code, request=request))
+
+
+class Flaky:
+    """前 failures 次调用抛出 error，之后返回 "ok" """
+
+    def __init__(self, failures: int, error: Exception):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return "ok"
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(resilience, "PROVIDER_RETRY_BASE_DELAY_SECONDS", 0)
+
+
+async def test_idempotent_call_is_retried_on_5xx():
+    call = Flaky(2, status_error(503))
+    assert await ProviderResilience("test").call("userinfo", call) == "ok"
+    assert call.calls == 3
+
+
+async def test_non_idempotent_call_is_not_retried_after_the_request_was_sent():
+    call = Flaky(1, status_error(503))
+    with pytest.raises(httpx.HTTPStatusError):
+        await ProviderResilience("test").call("token_exchange", call, idempotent=False)
+    assert call.calls == 1
+
+
+async def test_connect_errors_are_retried_even_when_not_idempotent():
+    call = Flaky(1, httpx.ConnectError("refused"))
+    assert await ProviderResilience("test").call("token_exchange", call, idempotent=False) == "ok"
+
+
+async def test_client_errors_are_not_retried():
+    call = Flaky(1, status_error(400))
+    with pytest.raises(httpx.HTTPStatusError):
+        await ProviderResilience("test").call("userinfo", call)
+    assert call.calls == 1
+
+
+async def test_breaker_opens_after_consecutive_failures_and_probes_after_reset(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(resilience, "PROVIDER_MAX_RETRIES", 0)
+    provider = ProviderResilience("test")
+    failing = Flaky(100, status_error(502))
+    for _ in range(provider.breaker.failure_threshold):
+        with pytest.raises(httpx.HTTPStatusError):
+            await provider.call("userinfo", failing)
+    assert provider.breaker.state == "open"
+    with pytest.raises(ProviderUnavailable):
+        await provider.call("userinfo", Flaky(0, None))
+
+    now[0] += provider.breaker.reset_seconds
+    assert await provider.call("userinfo", Flaky(0, None)) == "ok"
+    assert provider.breaker.state == "closed"
+
+
+async def test_exhausted_login_deadline_fails_without_calling():
+    call = Flaky(0, None)
+    with login_deadline(0):
+        with pytest.raises(ProviderUnavailable):
+            await ProviderResilience("test").call("userinfo", call)
+    assert call.calls == 0
+
+
+async def test_slow_call_times_out_within_the_deadline():
+    async def slow():
+        await asyncio.sleep(1)
+
+    with login_deadline(0.05):
+        with pytest.raises(ProviderTimeout):
+            await ProviderResilience("test").call("userinfo", slow, idempotent=False)
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_calls_share_one_execution():
+    group = SingleFlight("test")
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(group.do("key", load) for _ in range(5)))
+    assert results == [1] * 5
+    assert group.in_flight() == 0
+    # 完成后不缓存，下一次调用重新执行
+    assert await group.do("key", load) == 2
+
+
+async def test_errors_reach_every_waiter():
+    group = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(*(group.do("key", fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_cancelling_one_waiter_does_not_cancel_the_others():
+    group = SingleFlight("test")
+
+    async def load():
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    first = asyncio.ensure_future(group.do("key", load))
+    second = asyncio.ensure_future(group.do("key", load))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == "ok"
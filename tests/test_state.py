@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from app import state
+from app.state import MemoryStateBackend, OAuthStateStore, _b64encode
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_minted_state_verifies_for_its_provider_only():
+    store = OAuthStateStore("secret", 60)
+    state = await store.mint("google")
+    assert await store.verify(state, "google")
+    assert not await store.verify(state, "facebook")
+
+
+async def test_state_signed_with_another_secret_is_rejected():
+    state = await OAuthStateStore("other-secret", 60).mint("google")
+    assert not await OAuthStateStore("secret", 60).verify(state, "google")
+
+
+async def test_tampered_payload_is_rejected():
+    store = OAuthStateStore("secret", 60)
+    payload, signature = (await store.mint("google")).rsplit(".", 1)
+    assert not await store.verify(f"{payload[:-2]}AA.{signature}", "google")
+
+
+async def test_expired_state_is_rejected(monkeypatch):
+    store = OAuthStateStore("secret", 60)
+    state = await store.mint("google")
+    monkeypatch.setattr(time, "time", lambda: 10**10)
+    assert not await store.verify(state, "google")
+
+
+@pytest.mark.parametrize("state", [None, "", "no-separator", "!!!.signature", "e30.é", "é.signature"])
+async def test_malformed_state_is_rejected(state):
+    assert not await OAuthStateStore("secret", 60).verify(state, "google")
+
+
+async def test_backend_makes_state_single_use():
+    store = OAuthStateStore("secret", 60, MemoryStateBackend())
+    state = await store.mint("google")
+    assert await store.verify(state, "google")
+    assert not await store.verify(state, "google")
+
+
+@pytest.mark.parametrize("payload", [b"not json", b"[]", b'{"p":"google","e":"soon"}'])
+async def test_signed_but_malformed_payload_is_rejected(payload):
+    store = OAuthStateStore("secret", 60)
+    assert not await store.verify(f"{_b64encode(payload)}.{store._sign(payload)}", "google")
+
+
+async def test_state_is_bound_to_the_browser_nonce():
+    store = OAuthStateStore("secret", 60)
+    state = await store.mint("google", "browser-nonce")
+    assert await store.verify(state, "google", "browser-nonce")
+    assert not await store.verify(state, "google", "other-nonce")
+
+
+def test_state_store_requires_a_secret_key(monkeypatch):
+    monkeypatch.setattr(state, "SECRET_KEY", None)
+    with pytest.raises(ValueError, match="SECRET_KEY"):
+        state.build_state_store()
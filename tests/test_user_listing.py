@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from app.bulk import import_users
+from app.models import User
+from app.user_listing import InvalidCursor, build_query, encode_cursor, filters_fingerprint, list_users
+from tests.conftest import register_and_login, superuser_login
+
+pytestmark = pytest.mark.anyio
+
+PROVIDERS = ("google", "linkedin", None)
+
+
+async def seed(total: int):
+    await import_users(
+        json.dumps({
+            "email": f"list{i:03d}@example.com",
+            "oauth_provider": PROVIDERS[i % len(PROVIDERS)],
+            "is_active": i % 4 != 0,
+        })
+        for i in range(total)
+    )
+
+
+async def all_pages(**filters) -> list[dict]:
+    items, cursor = [], None
+    while True:
+        page = await list_users(cursor=cursor, limit=7, **filters)
+        items.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+
+async def test_keyset_pages_cover_every_user_once_newest_first(client):
+    await seed(30)
+    items = await all_pages()
+    assert len(items) == 30
+    assert [item["id"] for item in items] == sorted((item["id"] for item in items), reverse=True)
+
+
+async def test_filters_apply_across_pages(client):
+    await seed(30)
+    items = await all_pages(oauth_provider="google", is_active=True)
+    expected = [i for i in range(30) if i % 3 == 0 and i % 4 != 0]
+    assert sorted(item["email"] for item in items) == [f"list{i:03d}@example.com" for i in expected]
+
+
+async def test_email_prefix_pages_in_email_order(client):
+    await seed(30)
+    items = await all_pages(email_prefix="list01")
+    assert [item["email"] for item in items] == [f"list{i:03d}@example.com" for i in range(10, 20)]
+
+
+@pytest.mark.parametrize("oauth_provider", ["google", None])
+@pytest.mark.parametrize("is_active", [True, False, None])
+async def test_email_prefix_with_filters_pages_in_email_order(client, oauth_provider, is_active):
+    await seed(30)
+    items = await all_pages(email_prefix="list0", oauth_provider=oauth_provider, is_active=is_active)
+    expected = [
+        f"list{i:03d}@example.com" for i in range(30)
+        if oauth_provider in (None, PROVIDERS[i % len(PROVIDERS)]) and is_active in (None, i % 4 != 0)
+    ]
+    assert [item["email"] for item in items] == expected
+
+
+@pytest.mark.parametrize("email_prefix", ["list", None])
+@pytest.mark.parametrize("oauth_provider", ["google", None])
+@pytest.mark.parametrize("is_active", [True, None])
+def test_every_filter_combination_uses_an_index_matching_all_its_fields(email_prefix, oauth_provider, is_active):
+    query, sort, hint, _ = build_query(oauth_provider, is_active, email_prefix, None)
+    indexes = {index.document["name"]: list(index.document["key"]) for index in User.Settings.indexes}
+    indexes["_id_"] = ["_id"]
+    # 等值字段是索引前缀，排序字段紧随其后：扫描范围只包含要返回的文档
+    equality_fields = {field for field in query if field != "email"}
+    key = indexes[hint]
+    assert set(key[:len(equality_fields)]) == equality_fields
+    assert key[len(equality_fields)] == sort[0][0]
+
+
+async def test_cursor_from_other_filters_is_rejected(client):
+    await seed(10)
+    page = await list_users(limit=3)
+    headers = await superuser_login(client)
+    response = await client.get("/users", params={"email_prefix": "list", "cursor": page["next_cursor"]}, headers=headers)
+    assert response.status_code == 400
+
+
+async def test_cursor_replayed_under_another_email_prefix_is_rejected(client):
+    await seed(10)
+    page = await list_users(email_prefix="list00", limit=3)
+    headers = await superuser_login(client)
+    for params in ({"email_prefix": "list"}, {"email_prefix": "list00", "oauth_provider": "google"}):
+        response = await client.get("/users", params={**params, "cursor": page["next_cursor"]}, headers=headers)
+        assert response.status_code == 400
+    response = await client.get("/users", params={"email_prefix": "list00", "cursor": page["next_cursor"]}, headers=headers)
+    assert response.status_code == 200
+
+
+def test_email_cursor_keeps_both_prefix_bounds():
+    cursor = encode_cursor(filters_fingerprint(None, None, "list"), "list005@example.com")
+    query, _, _, _ = build_query(None, None, "list", cursor)
+    assert query["email"] == {"$gt": "list005@example.com", "$lt": "lisu"}
+
+    # 伪造一个落在前缀之外的游标也不能把扫描范围扩大到前缀之外
+    cursor = encode_cursor(filters_fingerprint(None, None, "list"), "a")
+    with pytest.raises(InvalidCursor):
+        build_query(None, None, "list", cursor)
+
+
+async def test_listing_requires_superuser(client):
+    token = await register_and_login(client, "plain@example.com")
+    assert (await client.get("/users")).status_code == 401
+    assert (await client.get("/users", headers={"Authorization": f"Bearer {token}"})).status_code == 403
+
+
+async def test_listing_never_returns_password_hashes(client):
+    headers = await superuser_login(client)
+    response = await client.get("/users", params={"fields": "email,hashed_password"}, headers=headers)
+    assert response.status_code == 400